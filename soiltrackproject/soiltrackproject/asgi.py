@@ -2,6 +2,8 @@
 ASGI config for soiltrackproject project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn soiltrackproject.asgi:application``)
+for the buffered ingestion endpoint.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
@@ -13,4 +15,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'soiltrackproject.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up (it loads models).
+from tracker.buffer import lifespan  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """
+    Django for HTTP; lifespan events flush the ingest buffer on shutdown.
+    """
+    if scope["type"] == "lifespan":
+        await lifespan(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -31,6 +31,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its wall time covers the rest (tracker.perf).
+    "tracker.perf.PerfMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -44,7 +46,8 @@ ROOT_URLCONF = "soiltrackproject.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # Django templates, with render time recorded per view (tracker.perf).
+        "BACKEND": "tracker.perf.TimedDjangoTemplates",
 
         # Global templates folder (where base.html lives)
         "DIRS": [BASE_DIR / "templates"],
@@ -77,6 +80,19 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Per-process memory cache; point at a FileBasedCache / Redis in production
+# so all workers share dashboard stats and reference data.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "soiltrack",
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -132,4 +148,76 @@ MEDIA_ROOT = BASE_DIR / "media"
 # Default primary key field type
 # https://docs.djangoproject.com/en/6.0/ref/settings/#default-auto-field
 
-DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
\ No newline at end of file
+DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# SoilTrack sensor ingestion
+# Readings per bulk_create batch for the ingestion API and ingest_readings command.
+SOILTRACK_INGEST_BATCH_SIZE = 1000
+
+# When set, gateways must send this value in the X-Ingest-Token header.
+SOILTRACK_INGEST_TOKEN = ""
+
+# Rows fetched per database round trip (and per Parquet row group) by exports.
+SOILTRACK_EXPORT_CHUNK_SIZE = 5000
+
+# Seconds the home dashboard counters are served from cache.
+SOILTRACK_DASHBOARD_STATS_TTL = 60
+
+# Seconds the filter dropdown lists (cooperatives, fields, sensors) stay
+# cached; saves and deletes clear them sooner.
+SOILTRACK_REFERENCE_CACHE_TTL = 300
+
+# Days of readings the insight engine (generate_insights) scores per field.
+SOILTRACK_ANALYSIS_WINDOW_DAYS = 14
+
+# Crops recommended per field and season when insights are generated.
+SOILTRACK_CROP_TOP_K = 3
+
+# Sensor health (evaluate_sensor_health): a sensor is offline when not seen
+# for OFFLINE_HOURS, stale when not seen for STALE_MINUTES or when it sent
+# fewer than MIN_DAILY_READINGS readings in the last 24 hours, and low on
+# battery below LOW_BATTERY percent.
+SOILTRACK_SENSOR_STALE_MINUTES = 120
+SOILTRACK_SENSOR_OFFLINE_HOURS = 24
+SOILTRACK_SENSOR_MIN_DAILY_READINGS = 6
+SOILTRACK_SENSOR_LOW_BATTERY = 20
+
+# Leave readings flagged by the ingest-time anomaly detector out of
+# rollups, downsampled aggregates and insight analysis.
+SOILTRACK_EXCLUDE_ANOMALIES = True
+
+# Buffered ingestion (api/readings/buffered/, served over ASGI): readings
+# waiting to be written before gateways get 429 (and before the gateway
+# listener drops messages), and the longest a reading waits in the buffer
+# when batches fill slowly.
+SOILTRACK_INGEST_BUFFER_SIZE = 50000
+SOILTRACK_INGEST_FLUSH_SECONDS = 1.0
+
+# Gateway listener (run_gateway_listener): MQTT broker and the topic prefix
+# gateways publish under (<prefix>/<cooperative id>/sensors/<sensor id>).
+SOILTRACK_MQTT_HOST = "localhost"
+SOILTRACK_MQTT_PORT = 1883
+SOILTRACK_MQTT_TOPIC_PREFIX = "soiltrack"
+
+# Readings older than this many days (rounded down to whole months) are
+# moved into compressed monthly archive segments by archive_readings.
+SOILTRACK_ARCHIVE_AFTER_DAYS = 365
+
+# Columnar copy of the readings for analytics scans, kept up to date by
+# sync_column_store (tracker.columnstore).
+SOILTRACK_COLUMN_STORE_DIR = BASE_DIR / "columnstore"
+
+# Seconds analytics API results stay cached; new readings and insights
+# invalidate them sooner.
+SOILTRACK_ANALYTICS_CACHE_TTL = 300
+
+# Per-view request profiling (tracker.perf): seconds between writes of a
+# process's histograms to the database, and how often one statement must
+# run in a request, with different parameters, to be flagged as N+1.
+SOILTRACK_PERF_ENABLED = True
+SOILTRACK_PERF_FLUSH_SECONDS = 30
+SOILTRACK_PERF_REPEAT_THRESHOLD = 5
+
+# When set, /metrics requires "Authorization: Bearer <token>".
+SOILTRACK_METRICS_TOKEN = ""
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.urls import path
+from django.views.generic import TemplateView
 from tracker import views
 
 urlpatterns = [
@@ -10,4 +11,22 @@ urlpatterns = [
     path("sensors/", views.sensor_page, name="sensor"),
     path("history/", views.history, name="history"),
     path("crops/", views.crops, name="crops"),
+    path("cooperatives/", views.cooperatives, name="cooperatives"),
+    path("cooperatives/<int:coop_id>/", views.cooperative_detail, name="cooperative_detail"),
+
+    path("portal/", TemplateView.as_view(template_name="tracker/admin_dashboard.html"), name="admin_dashboard"),
+    path("portal/users/", TemplateView.as_view(template_name="tracker/admin_user_management.html"), name="admin_users"),
+    path("portal/sensors/", views.admin_sensor_network, name="admin_sensors"),
+    path("portal/analytics/", TemplateView.as_view(template_name="tracker/admin_analytics.html"), name="admin_analytics"),
+    path("portal/fields/", TemplateView.as_view(template_name="tracker/admin_fields.html"), name="admin_fields"),
+    path("portal/notifications/", views.admin_notifications, name="admin_notifications"),
+    path("portal/settings/", TemplateView.as_view(template_name="tracker/admin_settings.html"), name="admin_settings"),
+
+    path("api/readings/", views.ingest_readings, name="ingest_readings"),
+    path("api/readings/buffered/", views.ingest_readings_buffered, name="ingest_readings_buffered"),
+    path("api/readings/export/", views.export_readings, name="export_readings"),
+    path("api/readings/download/", views.download_readings, name="download_readings"),
+    path("api/conditions/", views.current_conditions, name="current_conditions"),
+    path("api/analytics/<str:metric>/", views.analytics, name="analytics"),
+    path("metrics", views.metrics, name="metrics"),
 ]
\ No newline at end of file
@@ -1,5 +1,8 @@
 from django.contrib import admin
+from .rollups import rebuild_rollups
 from .models import (
+    AlertRule,
+    Notification,
     AdminProfile,
     Cooperative,
     Farmer,
@@ -7,7 +10,15 @@ from .models import (
     Sensor,
     SensorReading,
     AIInsight,
+    CropProfile,
     CropRecommendation,
+    SensorHealth,
+    SensorRollup,
+    SensorCurrentReading,
+    FieldCurrentReading,
+    ReadingAggregate,
+    QueryPattern,
+    ViewTiming,
 )
 
 
@@ -20,6 +31,17 @@ class AdminProfileAdmin(admin.ModelAdmin):
 class CooperativeAdmin(admin.ModelAdmin):
     list_display = ("name", "district", "sector", "member_count", "field_count")
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_counts()
+
+    @admin.display(description="Members", ordering="member_total")
+    def member_count(self, obj):
+        return obj.member_count
+
+    @admin.display(description="Fields", ordering="field_total")
+    def field_count(self, obj):
+        return obj.field_count
+
 
 @admin.register(Farmer)
 class FarmerAdmin(admin.ModelAdmin):
@@ -44,6 +66,21 @@ class SensorReadingAdmin(admin.ModelAdmin):
     list_display = ("sensor", "recorded_at", "ph", "moisture", "temperature")
     list_filter = ("sensor__sensor_type",)
 
+    # Ingest only ever adds to the rollups: recompute those of the sensors
+    # whose readings are edited or deleted here.
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        rebuild_rollups({obj.sensor_id, form.initial.get("sensor", obj.sensor_id)})
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        rebuild_rollups([obj.sensor_id])
+
+    def delete_queryset(self, request, queryset):
+        sensor_ids = set(queryset.values_list("sensor_id", flat=True))
+        super().delete_queryset(request, queryset)
+        rebuild_rollups(sensor_ids)
+
 
 @admin.register(AIInsight)
 class AIInsightAdmin(admin.ModelAdmin):
@@ -51,7 +88,71 @@ class AIInsightAdmin(admin.ModelAdmin):
     list_filter = ("field__cooperative",)
 
 
+@admin.register(CropProfile)
+class CropProfileAdmin(admin.ModelAdmin):
+    list_display = ("name", "season", "ph_min", "ph_max", "moisture_min", "moisture_max", "is_active")
+    list_filter = ("season", "is_active")
+
+
 @admin.register(CropRecommendation)
 class CropRecommendationAdmin(admin.ModelAdmin):
     list_display = ("crop_name", "field", "suitability_score", "is_top_choice", "season")
-    list_filter = ("is_top_choice", "season", "field__cooperative")
\ No newline at end of file
+    list_filter = ("is_top_choice", "season", "field__cooperative")
+
+
+@admin.register(SensorRollup)
+class SensorRollupAdmin(admin.ModelAdmin):
+    list_display = ("sensor", "reading_count", "last_reading_at", "updated_at")
+    list_select_related = ("sensor",)
+
+
+@admin.register(SensorCurrentReading)
+class SensorCurrentReadingAdmin(admin.ModelAdmin):
+    list_display = ("sensor", "recorded_at", "ph", "moisture", "temperature", "updated_at")
+    list_select_related = ("sensor",)
+
+
+@admin.register(FieldCurrentReading)
+class FieldCurrentReadingAdmin(admin.ModelAdmin):
+    list_display = ("field", "sensor", "recorded_at", "ph", "moisture", "temperature", "updated_at")
+    list_filter = ("cooperative",)
+    list_select_related = ("field", "sensor")
+
+
+@admin.register(ReadingAggregate)
+class ReadingAggregateAdmin(admin.ModelAdmin):
+    list_display = ("sensor", "resolution", "bucket_start", "reading_count", "ph_mean", "moisture_mean")
+    list_filter = ("resolution",)
+    list_select_related = ("sensor",)
+
+
+@admin.register(SensorHealth)
+class SensorHealthAdmin(admin.ModelAdmin):
+    list_display = ("sensor", "status", "battery_level", "last_seen", "recent_readings", "checked_at")
+    list_filter = ("status",)
+    list_select_related = ("sensor",)
+
+
+@admin.register(AlertRule)
+class AlertRuleAdmin(admin.ModelAdmin):
+    list_display = ("name", "describe", "severity", "cooperative", "field", "sensor", "is_active")
+    list_filter = ("severity", "measurement", "is_active")
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ("title", "category", "severity", "triggered_at", "is_resolved")
+    list_filter = ("category", "severity", "is_resolved")
+    list_select_related = ("rule", "sensor")
+
+
+@admin.register(ViewTiming)
+class ViewTimingAdmin(admin.ModelAdmin):
+    list_display = ("view_name", "metric", "bucket", "count", "total", "updated_at")
+    list_filter = ("metric", "view_name")
+
+
+@admin.register(QueryPattern)
+class QueryPatternAdmin(admin.ModelAdmin):
+    list_display = ("view_name", "kind", "requests", "max_repeats", "last_seen")
+    list_filter = ("kind", "view_name")
@@ -0,0 +1,223 @@
+"""
+Threshold alerting, evaluated on each ingested batch.
+
+Active AlertRules are compiled once per process into (low, high) bounds
+indexed by scope, and the engine keeps, per (rule, sensor), how many
+consecutive readings have breached the rule. A rule fires once when the
+streak reaches its ``consecutive_readings`` and again only after a
+reading back inside the limits resets it, so nothing is ever re-read from
+the readings table. With SOILTRACK_EXCLUDE_ANOMALIES (the default) a value
+flagged by the anomaly detector is a sensor fault, not a field condition:
+it neither extends nor resets a streak.
+
+Streaks live in process memory: a restart (or a sensor's readings
+arriving at another worker) starts them afresh. A batch's streak changes
+are applied only once its transaction commits, so a batch that rolls
+back and is retried is not counted twice. Rule edits bump a version
+in the cache, and each process recompiles its rules on its next batch.
+"""
+import logging
+import math
+import time
+from collections import ChainMap
+from dataclasses import dataclass
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .anomalies import exclude_anomalies
+from .models import AlertRule, Notification, SensorReading
+
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "tracker:alerts:version"
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    rule_id: int
+    measurement: str
+    low: float           # breached when value < low ...
+    high: float          # ... or value > high
+    needed: int
+    severity: str
+    description: str
+    name: str
+
+
+def compile_rule(rule):
+    """
+    Bounds of ``rule``; ValueError if they make no sense (an "outside"
+    rule saved without a usable upper threshold).
+    """
+    if rule.operator == "below":
+        low, high = rule.threshold, math.inf
+    elif rule.operator == "above":
+        low, high = -math.inf, rule.threshold
+    else:
+        low, high = rule.threshold, rule.upper_threshold
+        if high is None or not low < high:
+            raise ValueError(f"rule {rule.pk} ({rule.name}): outside range needs upper_threshold > threshold")
+    return CompiledRule(
+        rule_id=rule.pk,
+        measurement=rule.measurement,
+        low=low,
+        high=high,
+        needed=max(rule.consecutive_readings, 1),
+        severity=rule.severity,
+        description=rule.describe(),
+        name=rule.name,
+    )
+
+
+def _scope(rule):
+    if rule.sensor_id:
+        return ("sensor", rule.sensor_id)
+    if rule.field_id:
+        return ("field", rule.field_id)
+    if rule.cooperative_id:
+        return ("coop", rule.cooperative_id)
+    return ("all", None)
+
+
+class AlertEngine:
+    def __init__(self, rules, version=None, streaks=None):
+        self.version = version
+        self.by_scope = {}
+        for rule in rules:
+            try:
+                compiled = compile_rule(rule)
+            except ValueError as exc:
+                # One broken rule must not fail every ingest batch.
+                logger.warning("alerts: skipping invalid rule: %s", exc)
+                continue
+            self.by_scope.setdefault(_scope(rule), []).append(compiled)
+        rule_ids = {compiled.rule_id for scoped in self.by_scope.values() for compiled in scoped}
+        # (rule id, sensor pk) -> consecutive breaches; only breaching pairs are kept.
+        self.streaks = {
+            key: count for key, count in (streaks or {}).items() if key[0] in rule_ids
+        }
+        self._sensor_rules = {}
+        self.evaluated = 0
+
+    def __bool__(self):
+        return bool(self.by_scope)
+
+    def rules_for(self, reading):
+        rules = self._sensor_rules.get(reading.sensor_id)
+        if rules is None:
+            rules = []
+            for scope in (
+                ("all", None),
+                ("coop", reading.cooperative_id),
+                ("field", reading.field_id),
+                ("sensor", reading.sensor_id),
+            ):
+                rules.extend(self.by_scope.get(scope, ()))
+            self._sensor_rules[reading.sensor_id] = rules
+        return rules
+
+    def evaluate(self, readings):
+        """
+        Feed a batch of SensorReadings through the rules. Returns unsaved
+        Notifications for the alerts that fired and the batch's streak
+        changes, for apply() once the batch is stored.
+        """
+        changes = {}  # (rule id, sensor pk) -> new streak, 0 for a reset
+        if not self.by_scope:
+            return [], changes
+
+        fired = []
+        streaks = ChainMap(changes, self.streaks)
+        skip_flagged = exclude_anomalies()
+        evaluated = 0
+        for reading in sorted(readings, key=lambda r: (r.sensor_id, r.recorded_at)):
+            for rule in self.rules_for(reading):
+                value = getattr(reading, rule.measurement)
+                if value is None:
+                    continue
+                if skip_flagged and reading.anomaly_flags & SensorReading.anomaly_bit(rule.measurement):
+                    continue
+                evaluated += 1
+                key = (rule.rule_id, reading.sensor_id)
+                if rule.low <= value <= rule.high:
+                    if streaks.get(key):
+                        streaks[key] = 0
+                    continue
+                streak = streaks.get(key, 0) + 1
+                streaks[key] = streak
+                if streak == rule.needed:
+                    fired.append(self._notification(rule, reading, value))
+        self.evaluated += evaluated
+        return fired, changes
+
+    def apply(self, changes):
+        for key, streak in changes.items():
+            if streak:
+                self.streaks[key] = streak
+            else:
+                self.streaks.pop(key, None)
+
+    def _notification(self, rule, reading, value):
+        return Notification(
+            category="threshold",
+            severity=rule.severity,
+            title=f"{rule.name}: {reading.sensor.sensor_id}",
+            message=f"{rule.description} (last value {value:g}).",
+            rule_id=rule.rule_id,
+            sensor_id=reading.sensor_id,
+            field_id=reading.field_id,
+            value=value,
+            triggered_at=reading.recorded_at,
+        )
+
+
+_engine = None
+
+
+def get_alert_engine():
+    """
+    This process's engine, recompiled when the rules changed since it was
+    built. Costs one cache lookup per call and one query after a change.
+    """
+    global _engine
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = invalidate_alert_rules()
+    if _engine is None or _engine.version != version:
+        _engine = AlertEngine(
+            AlertRule.objects.filter(is_active=True),
+            version=version,
+            streaks=_engine.streaks if _engine is not None else None,
+        )
+    return _engine
+
+
+def invalidate_alert_rules():
+    version = time.time_ns()
+    cache.set(VERSION_KEY, version, None)
+    return version
+
+
+def reset_alert_engine():
+    """
+    Drop the engine and its streaks (tests, or after a bulk backfill).
+    """
+    global _engine
+    _engine = None
+
+
+def evaluate_alerts(readings):
+    """
+    Run new readings through the rules and store the alerts that fired.
+    Call inside the ingest transaction; the streaks advance when it
+    commits. Returns the number created.
+    """
+    engine = get_alert_engine()
+    notifications, changes = engine.evaluate(readings)
+    if notifications:
+        Notification.objects.bulk_create(notifications)
+    if changes:
+        transaction.on_commit(lambda: engine.apply(changes))
+    return len(notifications)
@@ -0,0 +1,385 @@
+"""
+Batch soil analysis: turns recent sensor readings into AIInsight scores.
+
+Readings for a chunk of fields are pulled in one query into NumPy arrays,
+grouped per field with bincount, and scored with array arithmetic, so the
+cost per field is a handful of vector operations rather than Python loops
+over readings. Needs NumPy.
+"""
+import time
+from dataclasses import dataclass, field as dataclass_field
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .analytics import invalidate_analytics
+from .anomalies import exclude_anomalies
+from .models import AIInsight, FieldAnalysisState, FieldPlot, SensorReading, SensorRollup
+from .stats import invalidate_dashboard_stats
+
+
+MEASUREMENTS = SensorReading.MEASUREMENTS
+COLUMN = {name: index for index, name in enumerate(MEASUREMENTS)}
+
+DEFAULT_WINDOW = timedelta(days=14)
+DEFAULT_CHUNK_SIZE = 2000
+
+# (low, high, tolerance): 100 inside [low, high], falling linearly to 0
+# at ``tolerance`` beyond either edge.
+IDEAL_RANGES = {
+    "ph": (6.0, 7.0, 1.5),
+    "nitrogen": (100.0, 150.0, 80.0),
+    "phosphorus": (30.0, 50.0, 30.0),
+    "potassium": (150.0, 200.0, 100.0),
+    "moisture": (25.0, 40.0, 15.0),
+    "moisture_std": (0.0, 5.0, 10.0),
+    "drainage_moisture": (0.0, 35.0, 15.0),
+    "conductivity": (0.0, 1.0, 1.0),
+}
+
+SUITABILITY_WEIGHTS = {
+    "ph": 0.3,
+    "nutrient": 0.3,
+    "water_retention": 0.2,
+    "drainage": 0.2,
+}
+
+
+def get_window():
+    days = getattr(settings, "SOILTRACK_ANALYSIS_WINDOW_DAYS", None)
+    return timedelta(days=days) if days else DEFAULT_WINDOW
+
+
+@dataclass
+class SoilFeatures:
+    """
+    Per-field aggregates of a reading window, one array entry per field.
+    """
+    field_ids: np.ndarray
+    reading_counts: np.ndarray
+    means: np.ndarray        # (fields, measurements), NaN when never measured
+    moisture_std: np.ndarray
+
+    def mean(self, name):
+        return self.means[:, COLUMN[name]]
+
+
+@dataclass
+class InsightRun:
+    fields_considered: int = 0
+    fields_recomputed: int = 0
+    fields_skipped: int = 0
+    insights_created: int = 0
+    recommendations_created: int = 0
+    readings_used: int = 0
+    elapsed: float = 0.0
+    insights: list = dataclass_field(default_factory=list)
+
+
+# =========================
+# LOADING
+# =========================
+def _to_float_array(rows, width):
+    if not rows:
+        return np.empty((0, width))
+    values = np.array(rows, dtype=object)
+    values[values == None] = np.nan  # noqa: E711 (elementwise on object arrays)
+    return values.astype(float)
+
+
+def load_features(field_ids, start, end):
+    """
+    One query for every reading of ``field_ids`` in [start, end), reduced
+    to per-field means with bincount.
+    """
+    rows = list(
+        SensorReading.objects
+        .filter(field_id__in=field_ids, recorded_at__gte=start, recorded_at__lt=end)
+        .order_by()
+        .values_list("field_id", "anomaly_flags", *MEASUREMENTS)
+    )
+    data = _to_float_array(rows, 2 + len(MEASUREMENTS))
+    values = data[:, 2:]
+    if exclude_anomalies():
+        # Flagged measurements count as missing.
+        flags = data[:, 1].astype(np.int64)
+        values[(flags[:, None] >> np.arange(len(MEASUREMENTS))) & 1 == 1] = np.nan
+    return features_from_array(data[:, 0].astype(np.int64), values)
+
+
+def features_from_array(field_column, values):
+    """
+    Group a (readings, measurements) array by field id.
+    """
+    field_ids, group = np.unique(field_column, return_inverse=True)
+    groups = len(field_ids)
+
+    present = ~np.isnan(values)
+    filled = np.where(present, values, 0.0)
+
+    columns = range(values.shape[1])
+    counts = np.stack(
+        [np.bincount(group, weights=present[:, i], minlength=groups) for i in columns], axis=1
+    )
+    sums = np.stack(
+        [np.bincount(group, weights=filled[:, i], minlength=groups) for i in columns], axis=1
+    )
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+        moisture = COLUMN["moisture"]
+        squares = np.bincount(group, weights=filled[:, moisture] ** 2, minlength=groups)
+        variance = squares / counts[:, moisture] - means[:, moisture] ** 2
+
+    return SoilFeatures(
+        field_ids=field_ids,
+        reading_counts=np.bincount(group, minlength=groups),
+        means=means,
+        moisture_std=np.sqrt(np.clip(variance, 0, None)),
+    )
+
+
+# =========================
+# SCORING
+# =========================
+def band_score(values, low, high, tolerance):
+    """
+    100 inside [low, high], linear fall-off to 0 at ``tolerance`` outside;
+    NaN stays NaN.
+    """
+    below = np.clip((low - values) / tolerance, 0, 1)
+    above = np.clip((values - high) / tolerance, 0, 1)
+    return 100.0 * (1.0 - np.maximum(below, above))
+
+
+def _band(values, name):
+    return band_score(values, *IDEAL_RANGES[name])
+
+
+def weighted_mean(parts):
+    """
+    Weighted mean of score arrays, ignoring NaN parts per element.
+    ``parts`` is a list of (scores, weight).
+    """
+    scores = np.stack([scores for scores, _ in parts])
+    weights = np.array([weight for _, weight in parts])[:, None] * ~np.isnan(scores)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.nansum(scores * weights, axis=0) / weights.sum(axis=0)
+
+
+def score_features(features):
+    """
+    Vectorized scores for every field in ``features``.
+    Returns a dict of float arrays (NaN where there is no data).
+    """
+    ph = _band(features.mean("ph"), "ph")
+    nutrient = weighted_mean([
+        (_band(features.mean("nitrogen"), "nitrogen"), 1),
+        (_band(features.mean("phosphorus"), "phosphorus"), 1),
+        (_band(features.mean("potassium"), "potassium"), 1),
+    ])
+    water_retention = weighted_mean([
+        (_band(features.mean("moisture"), "moisture"), 0.7),
+        (_band(features.moisture_std, "moisture_std"), 0.3),
+    ])
+    drainage = weighted_mean([
+        (_band(features.mean("moisture"), "drainage_moisture"), 0.7),
+        (_band(features.mean("conductivity"), "conductivity"), 0.3),
+    ])
+    suitability = weighted_mean([
+        (ph, SUITABILITY_WEIGHTS["ph"]),
+        (nutrient, SUITABILITY_WEIGHTS["nutrient"]),
+        (water_retention, SUITABILITY_WEIGHTS["water_retention"]),
+        (drainage, SUITABILITY_WEIGHTS["drainage"]),
+    ])
+    return {
+        "ph": ph,
+        "nutrient": nutrient,
+        "water_retention": water_retention,
+        "drainage": drainage,
+        "suitability": suitability,
+    }
+
+
+def _as_score(value):
+    return None if np.isnan(value) else int(round(float(value)))
+
+
+def build_summary(count, window_days, ph, moisture, scores):
+    parts = [f"Based on {count} readings over the last {window_days} days"]
+    conditions = []
+    if not np.isnan(ph):
+        conditions.append(f"pH {ph:.1f}")
+    if not np.isnan(moisture):
+        conditions.append(f"moisture {moisture:.0f}%")
+    if conditions:
+        parts[0] += " (" + ", ".join(conditions) + ")"
+
+    advice = []
+    if scores["ph"] is not None and scores["ph"] < 60:
+        advice.append("correct soil pH (lime if acidic)" if ph < 6.0 else "lower soil pH with organic matter")
+    if scores["nutrient"] is not None and scores["nutrient"] < 60:
+        advice.append("apply fertilizer to restore N-P-K balance")
+    if scores["water_retention"] is not None and scores["water_retention"] < 60:
+        advice.append("adjust irrigation to keep moisture steady")
+    if scores["drainage"] is not None and scores["drainage"] < 60:
+        advice.append("improve drainage to avoid waterlogging")
+
+    summary = f"{parts[0]}: overall suitability {scores['suitability']}/100."
+    if advice:
+        summary += " Recommended: " + "; ".join(advice) + "."
+    return summary
+
+
+def build_insights(features, window_days):
+    """
+    Unsaved AIInsight rows for every field in ``features`` that has data.
+    """
+    scores = score_features(features)
+
+    insights = []
+    for i, field_id in enumerate(features.field_ids):
+        if np.isnan(scores["suitability"][i]):
+            continue
+        field_scores = {name: _as_score(values[i]) for name, values in scores.items()}
+        insights.append(AIInsight(
+            field_id=int(field_id),
+            summary=build_summary(
+                int(features.reading_counts[i]),
+                window_days,
+                features.mean("ph")[i],
+                features.mean("moisture")[i],
+                field_scores,
+            ),
+            suitability_score=field_scores["suitability"],
+            nutrient_score=field_scores["nutrient"],
+            water_retention_score=field_scores["water_retention"],
+            drainage_score=field_scores["drainage"],
+        ))
+    return insights
+
+
+# =========================
+# WATERMARKS
+# =========================
+def latest_readings(field_ids=None):
+    """
+    {field id: newest recorded_at} from the sensor rollups kept on ingest,
+    so finding new data never scans the readings table.
+    """
+    rollups = SensorRollup.objects.filter(last_reading_at__isnull=False)
+    if field_ids is not None:
+        rollups = rollups.filter(sensor__field_id__in=field_ids)
+    return dict(
+        rollups.order_by()
+        .values_list("sensor__field_id")
+        .annotate(latest=Max("last_reading_at"))
+    )
+
+
+def dirty_fields(field_ids=None):
+    """
+    Fields with readings newer than their watermark (or none yet), as
+    {field id: newest recorded_at}.
+    """
+    latest = latest_readings(field_ids)
+    watermarks = FieldAnalysisState.objects.all()
+    if field_ids is not None:
+        watermarks = watermarks.filter(field_id__in=field_ids)
+    watermarks = dict(watermarks.values_list("field_id", "analysed_until"))
+    return {
+        field_id: recorded_at
+        for field_id, recorded_at in latest.items()
+        if field_id not in watermarks or recorded_at > watermarks[field_id]
+    }
+
+
+def advance_watermarks(latest):
+    FieldAnalysisState.objects.bulk_create(
+        [
+            FieldAnalysisState(field_id=field_id, analysed_until=recorded_at)
+            for field_id, recorded_at in latest.items()
+        ],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["field"],
+        update_fields=["analysed_until", "updated_at"],
+    )
+
+
+# =========================
+# GENERATION
+# =========================
+def generate_insights(
+    field_ids=None,
+    window=None,
+    now=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    recommend=True,
+    top_k=None,
+    incremental=True,
+):
+    """
+    Score the fields in ``field_ids`` (default: all fields) over the last
+    ``window`` of readings and bulk-create one AIInsight per field that
+    had readings. With ``recommend``, each such field's crop
+    recommendations are replaced by its ``top_k`` catalog matches in the
+    same transaction.
+
+    With ``incremental``, only fields whose sensors reported after the
+    field's watermark are recomputed; the rest are counted as skipped.
+    """
+    from .matching import build_crop_index, match_crops, replace_recommendations
+
+    started = time.perf_counter()
+    window = window or get_window()
+    end = now or timezone.now()
+    start = end - window
+    crop_index = build_crop_index() if recommend else None
+
+    scope = None if field_ids is None else list(field_ids)
+    if field_ids is None:
+        field_ids = FieldPlot.objects.order_by("pk").values_list("pk", flat=True)
+    field_ids = list(field_ids)
+
+    run = InsightRun(fields_considered=len(field_ids))
+    if incremental:
+        latest = dirty_fields(scope)
+        field_ids = [field_id for field_id in field_ids if field_id in latest]
+    else:
+        latest = latest_readings(scope)
+    run.fields_recomputed = len(field_ids)
+    run.fields_skipped = run.fields_considered - run.fields_recomputed
+
+    for offset in range(0, len(field_ids), chunk_size):
+        chunk = field_ids[offset:offset + chunk_size]
+        features = load_features(chunk, start, end)
+        insights = build_insights(features, window.days)
+        with transaction.atomic():
+            AIInsight.objects.bulk_create(insights, batch_size=1000)
+            if crop_index is not None:
+                recommendations = match_crops(
+                    features,
+                    crop_index,
+                    top_k,
+                    insights={insight.field_id: insight for insight in insights},
+                )
+                run.recommendations_created += replace_recommendations(
+                    features.field_ids.tolist(), recommendations
+                )
+            advance_watermarks({
+                field_id: latest[field_id] for field_id in chunk if field_id in latest
+            })
+        run.insights.extend(insights)
+        run.readings_used += int(features.reading_counts.sum())
+
+    run.insights_created = len(run.insights)
+    if run.insights:
+        # Insights and recommendations are bulk created: no signals.
+        transaction.on_commit(lambda: (invalidate_analytics("insights"), invalidate_dashboard_stats()))
+    run.elapsed = time.perf_counter() - started
+    return run
@@ -0,0 +1,309 @@
+"""
+Analytics for the admin portal, as JSON-ready dicts.
+
+Metrics are grouped SQL aggregations (TruncDay / TruncWeek buckets with
+Avg / Count), so Python only sees one row per bucket. Reading metrics
+take the buckets the downsampling job has already closed from
+ReadingAggregate and truncate only the raw readings after its watermark.
+
+Results are cached per (metric, cooperative, days, bucket). Cache keys
+carry a generation number per data source that invalidate_analytics()
+bumps: ingest and archiving do it for readings, insight generation for
+insights. Stale entries then simply stop being read and expire with the
+TTL; no key listing is needed, so any cache backend works.
+
+Windows end now and reach back ``days``, widened to whole buckets.
+Archived months (tracker.archive) are covered only where they were
+downsampled before archiving.
+
+RESPONSE_TARGETS are the response times each metric should meet with a
+year of 1M readings across 10 cooperatives, a 90-day window and
+downsample_readings running on schedule; ``manage.py benchmark
+analytics`` checks them.
+"""
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncDay, TruncWeek
+from django.utils import timezone
+
+from .anomalies import clean_condition, exclude_anomalies
+from .models import AIInsight, DownsampleState, ReadingAggregate, Sensor, SensorReading
+
+
+DEFAULT_TTL = 300
+DEFAULT_DAYS = 30
+MAX_DAYS = 366
+
+BUCKETS = {
+    "day": TruncDay,
+    "week": TruncWeek,
+}
+
+TREND_MEASUREMENTS = ("ph", "moisture")
+
+SCORE_BAND = 10
+
+# Milliseconds: a cache miss (the aggregation itself) and a hit.
+RESPONSE_TARGETS = {
+    "cold": 500,
+    "cached": 5,
+}
+
+
+class AnalyticsError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Window:
+    """
+    What a metric is computed over; also its cache identity.
+    """
+    coop_id: int = None
+    days: int = DEFAULT_DAYS
+    bucket: str = "day"
+
+    def bounds(self, now=None):
+        end = now or timezone.now()
+        return end - timedelta(days=self.days), end
+
+    def key(self):
+        return f"{self.coop_id or 'all'}:{self.days}:{self.bucket}"
+
+
+def get_ttl():
+    return getattr(settings, "SOILTRACK_ANALYTICS_CACHE_TTL", DEFAULT_TTL)
+
+
+def make_window(coop=None, days=None, bucket=None):
+    """
+    Validate raw query parameters into a Window.
+    """
+    if coop and not str(coop).isdigit():
+        raise AnalyticsError("coop must be an id")
+    try:
+        days = int(days) if days else DEFAULT_DAYS
+    except ValueError:
+        raise AnalyticsError("days must be a number")
+    if not 1 <= days <= MAX_DAYS:
+        raise AnalyticsError(f"days must be between 1 and {MAX_DAYS}")
+    bucket = bucket or "day"
+    if bucket not in BUCKETS:
+        raise AnalyticsError(f"bucket must be one of {', '.join(BUCKETS)}")
+    return Window(int(coop) if coop else None, days, bucket)
+
+
+def _readings_sources(window, raw, downsampled):
+    """
+    Grouped rows for the window's buckets, by cooperative and bucket:
+    those the downsampling job has closed (tracker.downsampling) from
+    ReadingAggregate rows of the bucket's resolution, the rest from raw
+    readings truncated with TruncDay / TruncWeek. ``raw`` and
+    ``downsampled`` map output names to aggregates over each source.
+
+    The two are separate queries rather than a UNION, which would read
+    every bucket with the first query's time zone conversion.
+    """
+    from .downsampling import floor_bucket
+
+    start, end = window.bounds()
+    start = floor_bucket(start, window.bucket)
+    watermark = Subquery(
+        DownsampleState.objects.filter(resolution=window.bucket).values("processed_until")[:1]
+    )
+
+    closed = (
+        ReadingAggregate.objects
+        .filter(resolution=window.bucket, bucket_start__gte=start, bucket_start__lt=watermark)
+        .annotate(coop=F("sensor__field__cooperative_id"), bucket=F("bucket_start"))
+    )
+    if window.coop_id:
+        closed = closed.filter(sensor__field__cooperative_id=window.coop_id)
+    closed = closed.order_by().values("coop", "bucket").annotate(**downsampled)
+
+    recent = (
+        SensorReading.objects
+        .filter(recorded_at__gte=start, recorded_at__lt=end)
+        .alias(watermark=Coalesce(watermark, start))
+        .filter(recorded_at__gte=F("watermark"))
+    )
+    if window.coop_id:
+        recent = recent.filter(cooperative_id=window.coop_id)
+    recent = (
+        recent.order_by()
+        .annotate(
+            coop=F("cooperative_id"),
+            bucket=BUCKETS[window.bucket]("recorded_at", tzinfo=timezone.get_current_timezone()),
+        )
+        .values("coop", "bucket")
+        .annotate(**raw)
+    )
+    # The watermark is a bucket boundary, so each bucket comes from one
+    # source only.
+    return sorted([*closed, *recent], key=lambda row: (row["coop"], row["bucket"]))
+
+
+# =========================
+# METRICS
+# =========================
+def soil_trends(window):
+    """
+    Mean pH and moisture per cooperative and bucket.
+    """
+    raw = {"readings": Count("id")}
+    downsampled = {"readings": Sum("reading_count")}
+    for name in TREND_MEASUREMENTS:
+        clean = clean_condition(name) if exclude_anomalies() else None
+        raw[f"{name}_total"] = Sum(name, filter=clean)
+        raw[f"{name}_count"] = Count(name, filter=clean)
+        # Aggregates were built with the same anomaly setting.
+        downsampled[f"{name}_total"] = Sum(F(f"{name}_mean") * F(f"{name}_count"))
+        downsampled[f"{name}_count"] = Sum(f"{name}_count")
+
+    return [
+        {
+            "cooperative": row["coop"],
+            "bucket": timezone.localtime(row["bucket"]).isoformat(),
+            "readings": row["readings"],
+            **{
+                name: row[f"{name}_total"] / row[f"{name}_count"] if row[f"{name}_count"] else None
+                for name in TREND_MEASUREMENTS
+            },
+        }
+        for row in _readings_sources(window, raw, downsampled)
+    ]
+
+
+def sensor_uptime(window):
+    """
+    Share of each cooperative's active sensors that reported in a bucket.
+    The active sensor totals are a second, small grouped query: as a
+    correlated subquery they would be re-run for every reading.
+    """
+    rows = _readings_sources(
+        window,
+        raw={"reporting": Count("sensor", distinct=True)},
+        downsampled={"reporting": Count("sensor", distinct=True)},
+    )
+    active = Sensor.objects.filter(is_active=True)
+    if window.coop_id:
+        active = active.filter(field__cooperative_id=window.coop_id)
+    totals = dict(
+        active.order_by().values("field__cooperative_id").annotate(total=Count("pk"))
+        .values_list("field__cooperative_id", "total")
+    )
+
+    results = []
+    for row in rows:
+        sensors = totals.get(row["coop"], 0)
+        results.append({
+            "cooperative": row["coop"],
+            "bucket": timezone.localtime(row["bucket"]).isoformat(),
+            "reporting": row["reporting"],
+            "sensors": sensors,
+            # Sensors deactivated since still count as having reported.
+            "uptime": round(min(row["reporting"] / sensors, 1.0), 4) if sensors else None,
+        })
+    return results
+
+
+def insight_scores(window):
+    """
+    Suitability scores of the insights created in the window, counted in
+    bands of SCORE_BAND points per cooperative, with the mean sub-scores
+    of each band.
+    """
+    start, end = window.bounds()
+    insights = AIInsight.objects.filter(
+        created_at__gte=start, created_at__lt=end, suitability_score__isnull=False,
+    )
+    if window.coop_id:
+        insights = insights.filter(field__cooperative_id=window.coop_id)
+
+    rows = (
+        insights
+        .order_by()
+        .annotate(band=F("suitability_score") / SCORE_BAND * SCORE_BAND)
+        .values("field__cooperative_id", "band")
+        .annotate(
+            insights=Count("id"),
+            nutrient=Avg("nutrient_score"),
+            water_retention=Avg("water_retention_score"),
+            drainage=Avg("drainage_score"),
+        )
+        .order_by("field__cooperative_id", "band")
+    )
+    return [
+        {
+            "cooperative": row["field__cooperative_id"],
+            "band": [row["band"], row["band"] + SCORE_BAND - 1],
+            "insights": row["insights"],
+            "nutrient": row["nutrient"],
+            "water_retention": row["water_retention"],
+            "drainage": row["drainage"],
+        }
+        for row in rows
+    ]
+
+
+# name -> (function, data source it is invalidated by)
+METRICS = {
+    "trends": (soil_trends, "readings"),
+    "uptime": (sensor_uptime, "readings"),
+    "scores": (insight_scores, "insights"),
+}
+
+
+# =========================
+# CACHE
+# =========================
+def _generation_key(source):
+    return f"tracker:analytics:generation:{source}"
+
+
+def _generation(source):
+    key = _generation_key(source)
+    cache.add(key, 1, None)
+    return cache.get(key, 1)
+
+
+def invalidate_analytics(source):
+    """
+    Drop every cached result computed from ``source`` ("readings" or
+    "insights").
+    """
+    try:
+        cache.incr(_generation_key(source))
+    except ValueError:
+        cache.set(_generation_key(source), 2, None)
+
+
+def compute_metric(name, window):
+    function, _ = METRICS[name]
+    return {
+        "metric": name,
+        "cooperative": window.coop_id,
+        "days": window.days,
+        "bucket": window.bucket,
+        "computed_at": timezone.now().isoformat(),
+        "results": function(window),
+    }
+
+
+def get_metric(name, window):
+    """
+    Cached result of metric ``name`` over ``window``.
+    """
+    if name not in METRICS:
+        raise AnalyticsError(f"metric must be one of {', '.join(METRICS)}")
+    _, source = METRICS[name]
+    key = f"tracker:analytics:{source}:{_generation(source)}:{name}:{window.key()}"
+    data = cache.get(key)
+    if data is None:
+        data = compute_metric(name, window)
+        cache.set(key, data, get_ttl())
+    return data
@@ -0,0 +1,156 @@
+"""
+Streaming anomaly detection for incoming readings.
+
+Each sensor keeps, per measurement, an exponentially weighted mean and
+variance, a sample count and a run of consecutive outliers, packed into
+a 154-byte SensorAnomalyState row. Every new value is checked against
+physical limits and a z-score on that baseline, then folded in, so the
+cost per reading is constant and history is never re-read.
+
+Flagged values are recorded as bits in SensorReading.anomaly_flags and
+are left out of the baseline. A run of RESET_AFTER outliers is taken as
+a real level shift (the probe was moved, the field irrigated...) and
+restarts the baseline at the new level.
+
+With SOILTRACK_EXCLUDE_ANOMALIES (the default) rollups, downsampled
+aggregates, insight analysis and alert rules skip flagged values.
+"""
+import math
+import struct
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.lookups import Exact
+
+from .models import SensorAnomalyState, SensorReading
+
+
+MEASUREMENTS = SensorReading.MEASUREMENTS
+
+ALPHA = 0.1          # EWMA weight of a new value once warmed up
+WARMUP = 10          # values before z-scores are trusted
+Z_LIMIT = 4.0
+RESET_AFTER = 5      # consecutive outliers that make a new baseline
+
+# Values outside these can't be real measurements.
+PHYSICAL_LIMITS = {
+    "ph": (0.5, 14.0),
+    "moisture": (0.0, 100.0),
+    "temperature": (-20.0, 70.0),
+    "nitrogen": (0.0, math.inf),
+    "phosphorus": (0.0, math.inf),
+    "potassium": (0.0, math.inf),
+    "conductivity": (0.0, math.inf),
+}
+
+# Floor on the standard deviation, so a very steady sensor isn't flagged
+# for ordinary jitter.
+MIN_STD = {
+    "ph": 0.1,
+    "moisture": 1.0,
+    "temperature": 0.5,
+    "nitrogen": 5.0,
+    "phosphorus": 3.0,
+    "potassium": 5.0,
+    "conductivity": 0.05,
+}
+
+# mean, variance, count, outlier run per measurement.
+_PACKED = struct.Struct("<" + "ddIH" * len(MEASUREMENTS))
+
+
+def exclude_anomalies():
+    return getattr(settings, "SOILTRACK_EXCLUDE_ANOMALIES", True)
+
+
+def clean_condition(name):
+    """
+    Boolean expression "this reading's ``name`` was not flagged", for
+    aggregate filters.
+    """
+    return Exact(F("anomaly_flags").bitand(SensorReading.anomaly_bit(name)), 0)
+
+
+class Baseline:
+    """
+    Unpacked detector state of one sensor.
+    """
+    __slots__ = ("values",)
+
+    def __init__(self, values=None):
+        self.values = values or [0.0, 0.0, 0, 0] * len(MEASUREMENTS)
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(list(_PACKED.unpack(bytes(data))))
+
+    def to_bytes(self):
+        return _PACKED.pack(*self.values)
+
+    def observe(self, index, value):
+        """
+        Fold ``value`` into measurement ``index``; True if it is an anomaly.
+        """
+        name = MEASUREMENTS[index]
+        low, high = PHYSICAL_LIMITS[name]
+        if not low <= value <= high:
+            return True
+
+        offset = index * 4
+        mean, variance, count, run = self.values[offset:offset + 4]
+        if count >= WARMUP:
+            std = max(math.sqrt(variance), MIN_STD[name])
+            if abs(value - mean) / std > Z_LIMIT:
+                run += 1
+                if run < RESET_AFTER:
+                    self.values[offset + 3] = run
+                    return True
+                mean, variance, count = value, 0.0, 0
+        run = 0
+
+        weight = max(ALPHA, 1.0 / (count + 1))
+        diff = value - mean
+        mean += weight * diff
+        variance = (1.0 - weight) * (variance + weight * diff * diff)
+        self.values[offset:offset + 4] = [mean, variance, min(count + 1, 0xFFFFFFFF), run]
+        return False
+
+
+def _stored_baseline(sensor):
+    state = getattr(sensor, "anomaly_state", None)
+    return Baseline.from_bytes(state.state) if state is not None else Baseline()
+
+
+def flag_readings(readings):
+    """
+    Set anomaly_flags on a batch of unsaved readings, in time order per
+    sensor. Baselines come from ``reading.sensor.anomaly_state`` (select it
+    with the sensors). Returns ({sensor pk: Baseline}, flagged count).
+    """
+    baselines = {}
+    flagged = 0
+    for reading in sorted(readings, key=lambda r: (r.sensor_id, r.recorded_at)):
+        baseline = baselines.get(reading.sensor_id)
+        if baseline is None:
+            baseline = baselines[reading.sensor_id] = _stored_baseline(reading.sensor)
+        flags = 0
+        for index, name in enumerate(MEASUREMENTS):
+            value = getattr(reading, name)
+            if value is not None and baseline.observe(index, value):
+                flags |= 1 << index
+        reading.anomaly_flags = flags
+        flagged += bool(flags)
+    return baselines, flagged
+
+
+def save_baselines(baselines):
+    SensorAnomalyState.objects.bulk_create(
+        [
+            SensorAnomalyState(sensor_id=sensor_pk, state=baseline.to_bytes())
+            for sensor_pk, baseline in baselines.items()
+        ],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["sensor"],
+        update_fields=["state", "updated_at"],
+    )
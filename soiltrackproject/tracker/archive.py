@@ -0,0 +1,340 @@
+"""
+Archival of old readings.
+
+archive_readings() moves every reading older than the archive horizon
+(SOILTRACK_ARCHIVE_AFTER_DAYS, rounded down to the start of a month) out
+of the readings table into ArchiveSegment rows, one per sensor and month,
+each holding that month's readings as compressed columns. A batch of
+sensors is copied and deleted in one transaction, so a reading is always
+in exactly one of the two places.
+
+With the old rows gone, everything that reads SensorReading (history
+pages, the latest reading, health counts, insight windows) only touches
+the recent months. iter_readings() reads both, for exports and anything
+else that needs the full history. Rollups keep counting archived readings
+and downsampled aggregates of archived months are kept.
+
+Segment layout: the ARCHIVE_COLUMNS one after the other, each
+``reading_count`` values long. ids and timestamps (microseconds since the
+epoch) are delta-encoded int64, measurements float64 with NaN for
+missing, flags uint16. Every column is byte-shuffled (all first bytes,
+then all second bytes, ...) before the whole is zlib-compressed, which
+roughly halves the size again for slowly changing sensor values.
+Needs NumPy.
+"""
+import time
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .analytics import invalidate_analytics
+from .anomalies import exclude_anomalies
+from .exports import export_queryset, iter_rows
+from .models import ArchiveSegment, SensorReading
+
+
+MEASUREMENTS = SensorReading.MEASUREMENTS
+
+DEFAULT_ARCHIVE_AFTER_DAYS = 365
+
+ARCHIVE_COLUMNS = (
+    ("id", np.int64),
+    ("recorded_at", np.int64),
+    *((name, np.float64) for name in MEASUREMENTS),
+    ("anomaly_flags", np.uint16),
+)
+DELTA_COLUMNS = ("id", "recorded_at")
+
+# Bytes a reading takes uncompressed in a segment, for the ratio reported.
+RAW_READING_BYTES = sum(np.dtype(dtype).itemsize for _, dtype in ARCHIVE_COLUMNS)
+
+_READ_FIELDS = (
+    "sensor_id", "field_id", "cooperative_id", "id", "recorded_at",
+) + MEASUREMENTS + ("anomaly_flags",)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def get_horizon():
+    return timedelta(days=getattr(settings, "SOILTRACK_ARCHIVE_AFTER_DAYS", DEFAULT_ARCHIVE_AFTER_DAYS))
+
+
+def month_start(moment):
+    """
+    Start of the calendar month containing ``moment``, in the current
+    time zone.
+    """
+    return timezone.localtime(moment).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(start):
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def archive_cutoff(now=None):
+    """
+    Readings before this are due for archiving.
+    """
+    return month_start((now or timezone.now()) - get_horizon())
+
+
+def archived_until():
+    """
+    End of the newest archived month, or None if nothing is archived.
+    """
+    latest = ArchiveSegment.objects.aggregate(month=Max("month"))["month"]
+    if latest is None:
+        return None
+    return next_month(timezone.make_aware(datetime(latest.year, latest.month, 1)))
+
+
+# =========================
+# SEGMENT ENCODING
+# =========================
+def _shuffle(values):
+    return np.ascontiguousarray(values).view(np.uint8).reshape(len(values), -1).T.tobytes()
+
+
+def _unshuffle(raw, dtype, count):
+    itemsize = np.dtype(dtype).itemsize
+    return np.frombuffer(raw, np.uint8).reshape(itemsize, count).T.copy().view(dtype).reshape(count)
+
+
+def encode_segment(columns):
+    """
+    Compressed bytes for {column: array} (every ARCHIVE_COLUMNS entry,
+    all the same length).
+    """
+    parts = []
+    for name, dtype in ARCHIVE_COLUMNS:
+        values = np.asarray(columns[name], dtype=dtype)
+        if name in DELTA_COLUMNS:
+            values = np.diff(values, prepend=dtype(0))
+        parts.append(_shuffle(values))
+    return zlib.compress(b"".join(parts), 6)
+
+
+def decode_segment(data, count):
+    raw = zlib.decompress(bytes(data))
+    columns = {}
+    offset = 0
+    for name, dtype in ARCHIVE_COLUMNS:
+        size = count * np.dtype(dtype).itemsize
+        values = _unshuffle(raw[offset:offset + size], dtype, count)
+        if name in DELTA_COLUMNS:
+            np.cumsum(values, out=values)
+        columns[name] = values
+        offset += size
+    return columns
+
+
+def _segment_totals(columns):
+    """
+    {measurement: [sum, count]} over the values rollups count.
+    """
+    skip_flagged = exclude_anomalies()
+    totals = {}
+    for index, name in enumerate(MEASUREMENTS):
+        values = columns[name]
+        counted = ~np.isnan(values)
+        if skip_flagged:
+            counted &= (columns["anomaly_flags"] & (1 << index)) == 0
+        totals[name] = [float(values[counted].sum()), int(counted.sum())]
+    return totals
+
+
+def _build_segment(month, rows):
+    """
+    An unsaved ArchiveSegment from one sensor's rows (_READ_FIELDS order,
+    oldest first).
+    """
+    values = list(zip(*rows))
+    columns = {
+        "id": np.array(values[3], dtype=np.int64),
+        "recorded_at": np.array([(moment - EPOCH) // MICROSECOND for moment in values[4]], dtype=np.int64),
+        "anomaly_flags": np.array(values[-1], dtype=np.uint16),
+    }
+    for offset, name in enumerate(MEASUREMENTS, start=5):
+        columns[name] = np.array(values[offset], dtype=np.float64)   # None -> NaN
+    sensor_id, field_id, cooperative_id = rows[0][:3]
+    return ArchiveSegment(
+        sensor_id=sensor_id,
+        field_id=field_id,
+        cooperative_id=cooperative_id,
+        month=month,
+        first_recorded_at=values[4][0],
+        last_recorded_at=values[4][-1],
+        reading_count=len(rows),
+        totals=_segment_totals(columns),
+        data=encode_segment(columns),
+    )
+
+
+# =========================
+# ARCHIVING
+# =========================
+@dataclass
+class ArchiveRun:
+    months: int = 0
+    segments: int = 0
+    readings: int = 0
+    stored_bytes: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def ratio(self):
+        if not self.stored_bytes:
+            return 0.0
+        return self.readings * RAW_READING_BYTES / self.stored_bytes
+
+
+def _delete_readings(ids):
+    table = connection.ops.quote_name(SensorReading._meta.db_table)
+    batch_size = 500
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            cursor.execute(
+                f"DELETE FROM {table} WHERE {connection.ops.quote_name('id')} IN "
+                f"({', '.join(['%s'] * len(batch))})",
+                batch,
+            )
+
+
+def archive_month(start, end, sensors_per_batch=25):
+    """
+    Move the readings in [start, end) into segments. Returns an ArchiveRun.
+    """
+    run = ArchiveRun(months=1)
+    in_month = SensorReading.objects.filter(recorded_at__gte=start, recorded_at__lt=end).order_by()
+    sensor_ids = sorted(set(in_month.values_list("sensor_id", flat=True)))
+    month = start.date()
+
+    for first in range(0, len(sensor_ids), sensors_per_batch):
+        batch = sensor_ids[first:first + sensors_per_batch]
+        with transaction.atomic():
+            rows = list(
+                in_month.filter(sensor_id__in=batch)
+                .order_by("sensor_id", "recorded_at", "id")
+                .values_list(*_READ_FIELDS)
+            )
+            segments = []
+            group_start = 0
+            for i in range(1, len(rows) + 1):
+                if i == len(rows) or rows[i][0] != rows[group_start][0]:
+                    segments.append(_build_segment(month, rows[group_start:i]))
+                    group_start = i
+            ArchiveSegment.objects.bulk_create(segments)
+            # Exactly the rows copied: readings arriving meanwhile stay for the next run.
+            _delete_readings([row[3] for row in rows])
+
+        run.segments += len(segments)
+        run.readings += len(rows)
+        run.stored_bytes += sum(len(segment.data) for segment in segments)
+    return run
+
+
+def archive_readings(before=None, now=None, sensors_per_batch=25, progress=None):
+    """
+    Archive every reading recorded before ``before`` (default: the archive
+    cutoff), a month at a time. ``progress(month start, ArchiveRun)`` is
+    called after each month.
+    """
+    started = time.perf_counter()
+    before = before or archive_cutoff(now)
+    total = ArchiveRun()
+    first = (
+        SensorReading.objects.filter(recorded_at__lt=before)
+        .order_by("recorded_at")
+        .values_list("recorded_at", flat=True)
+        .first()
+    )
+    month = month_start(first) if first else before
+    while month < before:
+        end = min(next_month(month), before)
+        run = archive_month(month, end, sensors_per_batch)
+        if run.readings:
+            total.months += 1
+            total.segments += run.segments
+            total.readings += run.readings
+            total.stored_bytes += run.stored_bytes
+            if progress:
+                progress(month, run)
+        month = end
+    if total.readings:
+        transaction.on_commit(lambda: invalidate_analytics("readings"))
+    total.elapsed = time.perf_counter() - started
+    return total
+
+
+# =========================
+# READING
+# =========================
+def _month_rows(segments, start=None, end=None):
+    """
+    Export rows from one month's segments, ordered by (recorded_at, id).
+    """
+    devices, fields, coops, columns = [], [], [], []
+    for device_id, field_id, coop_id, count, data in segments:
+        devices.append(device_id)
+        fields.append(field_id)
+        coops.append(coop_id)
+        columns.append(decode_segment(data, count))
+    if not columns:
+        return
+
+    merged = {name: np.concatenate([c[name] for c in columns]) for name, _ in ARCHIVE_COLUMNS}
+    owner = np.concatenate([np.full(len(c["id"]), i) for i, c in enumerate(columns)])
+    keep = np.ones(len(owner), dtype=bool)
+    if start is not None:
+        keep &= merged["recorded_at"] >= (start - EPOCH) // MICROSECOND
+    if end is not None:
+        keep &= merged["recorded_at"] < (end - EPOCH) // MICROSECOND
+    selected = np.flatnonzero(keep)
+    order = selected[np.lexsort((merged["id"][selected], merged["recorded_at"][selected]))]
+
+    ids = merged["id"][order].tolist()
+    moments = merged["recorded_at"][order].tolist()
+    owners = owner[order].tolist()
+    values = [
+        [None if value != value else value for value in merged[name][order].tolist()]
+        for name in MEASUREMENTS
+    ]
+    for i, (pk, micros, segment) in enumerate(zip(ids, moments, owners)):
+        yield (
+            pk,
+            devices[segment],
+            fields[segment],
+            coops[segment],
+            EPOCH + timedelta(microseconds=micros),
+        ) + tuple(column[i] for column in values)
+
+
+def iter_readings(coop_id=None, field_id=None, sensor_id=None, start=None, end=None, chunk_size=None):
+    """
+    Every reading in the scope, archived or not, as export rows
+    (tracker.exports.EXPORT_COLUMNS order): archived months oldest first,
+    then the readings table oldest first. Decodes one month at a time.
+    """
+    segments = ArchiveSegment.objects.for_scope(coop_id, field_id, sensor_id)
+    if start is not None:
+        segments = segments.filter(last_recorded_at__gte=start)
+    if end is not None:
+        segments = segments.filter(first_recorded_at__lt=end)
+    months = list(segments.order_by("month").values_list("month", flat=True).distinct())
+    for month in months:
+        yield from _month_rows(
+            segments.filter(month=month).values_list(
+                "sensor__sensor_id", "field_id", "cooperative_id", "reading_count", "data"
+            ),
+            start,
+            end,
+        )
+    yield from iter_rows(export_queryset(coop_id, field_id, sensor_id, start, end), chunk_size)
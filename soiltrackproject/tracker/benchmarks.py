@@ -0,0 +1,849 @@
+"""
+Synthetic-data benchmarks, run with ``manage.py benchmark <name>``.
+
+Each benchmark runs against a throwaway test database (never the real one)
+seeded with generated cooperatives, fields, sensors and readings.
+"""
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+
+from .models import Cooperative, Farmer, FieldPlot, Sensor, SensorAnomalyState, SensorReading
+
+
+BENCHMARKS = {}
+
+
+def benchmark(name, default_rows, shared_database=False):
+    """
+    Register a benchmark function taking (out, rows).
+
+    ``shared_database`` benchmarks start other processes, so on SQLite
+    they get a file test database instead of the in-memory one.
+    """
+    def register(func):
+        BENCHMARKS[name] = (func, default_rows, shared_database)
+        return func
+    return register
+
+
+# =========================
+# SEED DATA
+# =========================
+def seed_network(cooperatives=10, fields_per_coop=20, sensors_per_field=2):
+    """
+    Create cooperatives, one farmer per field, fields and sensors.
+    Returns the sensors.
+    """
+    coops = Cooperative.objects.bulk_create(
+        [Cooperative(name=f"Coop {i:03d}", district="Bench") for i in range(cooperatives)]
+    )
+    farmers = Farmer.objects.bulk_create([
+        Farmer(cooperative=coop, full_name=f"Farmer {coop.pk}-{i}", village="Bench")
+        for coop in coops
+        for i in range(fields_per_coop)
+    ])
+    fields = FieldPlot.objects.bulk_create([
+        FieldPlot(
+            cooperative_id=farmer.cooperative_id,
+            farmer=farmer,
+            name=f"Field {farmer.pk}",
+            code=f"BF-{farmer.pk}",
+        )
+        for farmer in farmers
+    ])
+    sensors = Sensor.objects.bulk_create([
+        Sensor(field=field, sensor_id=f"BS-{field.pk}-{i}", sensor_type="npk")
+        for field in fields
+        for i in range(sensors_per_field)
+    ])
+    return sensors
+
+
+def reading_values(rng):
+    return {
+        "ph": round(rng.gauss(6.4, 0.4), 2),
+        "moisture": round(rng.uniform(15, 45), 1),
+        "temperature": round(rng.gauss(21, 3), 1),
+        "nitrogen": round(rng.uniform(80, 160)),
+        "phosphorus": round(rng.uniform(25, 60)),
+        "potassium": round(rng.uniform(120, 220)),
+        "conductivity": round(rng.uniform(0.2, 1.5), 2),
+    }
+
+
+def seed_readings(sensors, rows, span=timedelta(days=365), batch_size=5000, seed=42):
+    """
+    Spread ``rows`` readings evenly over ``span`` ending now, round-robin
+    over the sensors.
+    """
+    rng = random.Random(seed)
+    end = timezone.now()
+    step = span / max(rows, 1)
+    batch = []
+    for i in range(rows):
+        sensor = sensors[i % len(sensors)]
+        batch.append(SensorReading(
+            sensor_id=sensor.pk,
+            field_id=sensor.field_id,
+            cooperative_id=sensor.field.cooperative_id,
+            recorded_at=end - span + step * i,
+            **reading_values(rng),
+        ))
+        if len(batch) >= batch_size:
+            SensorReading.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        SensorReading.objects.bulk_create(batch)
+
+
+# =========================
+# MEASURING
+# =========================
+def timed(func, repeat=5):
+    """
+    Run ``func`` ``repeat`` times; return (median ms, last result).
+    """
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), result
+
+
+def explain(queryset):
+    return queryset.explain()
+
+
+def analyze():
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+# =========================
+# BENCHMARKS
+# =========================
+@benchmark("ingest", default_rows=100_000)
+def bench_ingest(out, rows):
+    """
+    Throughput of the bulk ingestion path (tracker.ingest).
+    """
+    from .ingest import get_batch_size, ingest_records
+
+    sensors = seed_network()
+    rng = random.Random(1)
+    now = timezone.now()
+    records = [
+        {
+            "sensor_id": sensors[i % len(sensors)].sensor_id,
+            "recorded_at": (now - timedelta(seconds=rows - i)).isoformat(),
+            **reading_values(rng),
+        }
+        for i in range(rows)
+    ]
+    total, batches = ingest_records(records)
+    out(f"{len(batches)} batches of {get_batch_size()}: {total.accepted} rows "
+        f"in {total.elapsed:.2f}s = {total.rows_per_sec:,.0f} rows/s")
+
+
+@benchmark("history", default_rows=1_000_000)
+def bench_history(out, rows):
+    """
+    History page filters: joining through Sensor -> FieldPlot versus the
+    denormalized field / cooperative keys and composite indexes.
+    Run with --rows 10000000 for the 10M-row figures.
+    """
+    sensors = seed_network(cooperatives=20, fields_per_coop=50, sensors_per_field=2)
+    started = time.perf_counter()
+    seed_readings(sensors, rows)
+    analyze()
+    out(f"seeded {rows:,} readings in {time.perf_counter() - started:.1f}s")
+
+    sensor = sensors[len(sensors) // 2]
+    base = (
+        SensorReading.objects
+        .select_related("sensor", "sensor__field", "sensor__field__cooperative")
+        .order_by("-recorded_at")
+    )
+    cases = [
+        ("unfiltered", base),
+        ("coop via join", base.filter(sensor__field__cooperative_id=sensor.field.cooperative_id)),
+        ("coop denormalized", base.filter(cooperative_id=sensor.field.cooperative_id)),
+        ("field via join", base.filter(sensor__field_id=sensor.field_id)),
+        ("field denormalized", base.filter(field_id=sensor.field_id)),
+        ("sensor", base.filter(sensor_id=sensor.pk)),
+    ]
+    for label, queryset in cases:
+        page = queryset[:200]
+        sql_ms, _ = timed(lambda: list(page.values_list("pk", flat=True)))
+        page_ms, result = timed(lambda: list(page.all()))
+        out(f"\n{label}: {len(result)} rows, query {sql_ms:.2f} ms, "
+            f"with model instances {page_ms:.2f} ms (medians)")
+        for line in explain(page).splitlines():
+            out(f"    {line}")
+
+
+@benchmark("history_pages", default_rows=1_000_000)
+def bench_history_pages(out, rows):
+    """
+    Keyset pagination: fetching a deep page should cost the same as page 1.
+    """
+    from .pagination import keyset_paginate
+
+    sensors = seed_network(cooperatives=5, fields_per_coop=20, sensors_per_field=2)
+    seed_readings(sensors, rows)
+    analyze()
+
+    coop_id = sensors[0].field.cooperative_id
+    for label, readings in (
+        ("all readings", SensorReading.objects.all()),
+        ("one cooperative", SensorReading.objects.filter(cooperative_id=coop_id)),
+    ):
+        cursor, page_number = None, 0
+        samples = {}
+        targets = {1, 10, 100, 1000}
+        while page_number < max(targets):
+            page_number += 1
+            ms, page = timed(lambda: keyset_paginate(readings, cursor, 50), repeat=3)
+            if page_number in targets:
+                samples[page_number] = ms
+            cursor = page.next_cursor
+            if not cursor:
+                break
+        summary = ", ".join(f"page {n}: {ms:.2f} ms" for n, ms in samples.items())
+        out(f"{label}: {summary}")
+        offset_page = readings.order_by("-recorded_at", "-id")[50 * (page_number - 1):50 * page_number]
+        offset_ms, _ = timed(lambda: list(offset_page.all()), repeat=3)  # .all(): a fresh query each run
+        out(f"    offset pagination at page {page_number}: {offset_ms:.2f} ms")
+
+
+@benchmark("export", default_rows=500_000)
+def bench_export(out, rows):
+    """
+    Streaming export: throughput and peak Python memory should stay flat
+    as the row count grows.
+    """
+    import tracemalloc
+
+    from .exports import ExportUnavailable, export_queryset, stream_export
+
+    sensors = seed_network()
+    seed_readings(sensors, rows)
+
+    for export_format in ("csv", "parquet"):
+        tracemalloc.start()
+        started = time.perf_counter()
+        size = 0
+        try:
+            for chunk in stream_export(export_queryset(), export_format):
+                size += len(chunk)
+        except ExportUnavailable as exc:
+            out(f"{export_format}: skipped ({exc})")
+            tracemalloc.stop()
+            continue
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        out(f"{export_format}: {rows / elapsed:,.0f} rows/s, {size / 1e6:.1f} MB, "
+            f"peak Python memory {peak / 1e6:.1f} MB")
+
+
+@benchmark("cooperative_detail", default_rows=50_000)
+def bench_cooperative_detail(out, rows):
+    """
+    /cooperatives/<id>/ for a 5,000-farmer cooperative (one field and two
+    sensors per farmer): query count and render latency.
+    """
+    from django.db import connection
+    from django.test import RequestFactory
+    from django.test.utils import CaptureQueriesContext
+
+    from .views import cooperative_detail
+
+    sensors = seed_network(cooperatives=1, fields_per_coop=5000, sensors_per_field=2)
+    seed_readings(sensors, rows)
+    analyze()
+    coop_id = sensors[0].field.cooperative_id
+
+    request = RequestFactory().get(f"/cooperatives/{coop_id}/")
+    with CaptureQueriesContext(connection) as queries:
+        response = cooperative_detail(request, coop_id)
+    ms, _ = timed(lambda: cooperative_detail(request, coop_id), repeat=3)
+    db_ms = sum(float(query["time"]) for query in queries) * 1000
+    out(f"5,000 farmers, {len(sensors):,} sensors, {rows:,} readings: "
+        f"{len(queries)} queries ({db_ms:.0f} ms in the database), "
+        f"{ms:.0f} ms median per request, {len(response.content) / 1e6:.1f} MB HTML")
+    for query in queries:
+        out(f"    {float(query['time']) * 1000:7.1f} ms  {query['sql'][:90]}")
+
+
+@benchmark("insights", default_rows=500_000)
+def bench_insights(out, rows):
+    """
+    Batch insight generation for 10,000 fields (one sensor each) from the
+    last 14 days of readings, then an incremental rerun.
+    """
+    from .analysis import generate_insights
+    from .ingest import ingest_batch
+    from .rollups import rebuild_rollups
+
+    sensors = seed_network(cooperatives=50, fields_per_coop=200, sensors_per_field=1)
+    seed_readings(sensors, rows, span=timedelta(days=13))
+    analyze()
+
+    rebuild_rollups()
+
+    run = generate_insights(window=timedelta(days=14), recommend=False)
+    out(f"{run.fields_considered:,} fields, {run.readings_used:,} readings: "
+        f"{run.insights_created:,} insights in {run.elapsed:.2f}s "
+        f"= {run.fields_considered / run.elapsed:,.0f} fields/s")
+
+    # Incremental rerun after 5% of the sensors reported again.
+    rng = random.Random(7)
+    ingest_batch([
+        {"sensor_id": sensor.sensor_id, **reading_values(rng)}
+        for sensor in sensors[::20]
+    ])
+    run = generate_insights(window=timedelta(days=14), recommend=False)
+    out(f"incremental: {run.fields_recomputed:,} recomputed, {run.fields_skipped:,} skipped "
+        f"in {run.elapsed:.2f}s")
+
+
+@benchmark("crop_matching", default_rows=500_000)
+def bench_crop_matching(out, rows):
+    """
+    Nightly regeneration for 10,000 fields: insights plus top-3 crops per
+    season from the profile catalog, with the score matrix timed alone.
+    """
+    from .analysis import generate_insights, load_features
+    from .matching import build_crop_index, score_matrix, soil_vectors
+
+    sensors = seed_network(cooperatives=50, fields_per_coop=200, sensors_per_field=1)
+    seed_readings(sensors, rows, span=timedelta(days=13))
+    analyze()
+
+    index = build_crop_index()
+    end = timezone.now()
+    features = load_features([sensor.field_id for sensor in sensors], end - timedelta(days=14), end)
+    vectors = soil_vectors(features)
+    ms, scores = timed(lambda: score_matrix(vectors, index))
+    out(f"score matrix {scores.shape[0]:,} fields x {scores.shape[1]} crop profiles: {ms:.1f} ms")
+
+    run = generate_insights(window=timedelta(days=14))
+    out(f"{run.insights_created:,} insights and {run.recommendations_created:,} recommendations "
+        f"in {run.elapsed:.2f}s")
+
+
+@benchmark("parallel_insights", default_rows=500_000, shared_database=True)
+def bench_parallel_insights(out, rows):
+    """
+    Full analysis of 10,000 fields in 50 cooperatives with the process-pool
+    runner at 1, 2, 4 and 8 workers.
+    """
+    import os
+
+    from .parallel import run_parallel
+
+    sensors = seed_network(cooperatives=50, fields_per_coop=200, sensors_per_field=1)
+    seed_readings(sensors, rows, span=timedelta(days=13))
+    analyze()
+    out(f"{os.cpu_count()} CPUs available")
+
+    baseline = None
+    for workers in (1, 2, 4, 8):
+        run = run_parallel(workers=workers, incremental=False, window=timedelta(days=14))
+        baseline = baseline or run.elapsed
+        out(f"{workers} workers: {run.insights_created:,} insights, "
+            f"{run.recommendations_created:,} recommendations in {run.elapsed:.2f}s "
+            f"(x{baseline / run.elapsed:.2f}, {len(run.failed)} failed shards, "
+            f"{run.retries} retries)")
+
+
+@benchmark("sensor_health", default_rows=500_000)
+def bench_sensor_health(out, rows):
+    """
+    Health evaluation for 100,000 sensors: elapsed time and query count
+    (which must not grow with the sensor count).
+    """
+    from django.db.models import F, Max, OuterRef, Subquery
+    from django.test.utils import CaptureQueriesContext
+
+    from .health import HealthThresholds, evaluate_sensor_health
+
+    sensors = seed_network(cooperatives=50, fields_per_coop=1000, sensors_per_field=2)
+    seed_readings(sensors, rows, span=timedelta(days=1))
+    Sensor.objects.update(last_seen=Subquery(
+        SensorReading.objects.filter(sensor=OuterRef("pk"))
+        .order_by().values("sensor").annotate(latest=Max("recorded_at")).values("latest")
+    ))
+    Sensor.objects.alias(bucket=F("pk") % 10).filter(bucket=0).update(battery_level=12)
+    Sensor.objects.alias(bucket=F("pk") % 13).filter(bucket=0).update(
+        last_seen=timezone.now() - timedelta(days=3)
+    )
+    analyze()
+
+    for label in ("first run", "rerun"):
+        with CaptureQueriesContext(connection) as queries:
+            # About 5 readings per sensor per day are seeded; expect 3.
+            run = evaluate_sensor_health(thresholds=HealthThresholds(min_daily_readings=3))
+        counts = ", ".join(f"{count:,} {status}" for status, count in run.counts.items())
+        out(f"{label}: {run.total:,} sensors in {run.elapsed:.2f}s, "
+            f"{len(queries)} queries ({counts})")
+
+
+@benchmark("alerts", default_rows=200_000)
+def bench_alerts(out, rows):
+    """
+    Alert rule throughput: rule checks per second in the engine alone,
+    and ingest throughput with and without rules.
+    """
+    from .alerts import AlertEngine, invalidate_alert_rules, reset_alert_engine
+    from .ingest import ingest_records
+    from .models import AlertRule
+
+    sensors = seed_network()
+    fields = sorted({sensor.field_id for sensor in sensors})
+    rules = [
+        AlertRule(name="pH out of range", measurement="ph", operator="outside", threshold=5.5, upper_threshold=7.5),
+        AlertRule(name="Dry soil", measurement="moisture", operator="below", threshold=20, consecutive_readings=3),
+        AlertRule(name="Hot soil", measurement="temperature", operator="above", threshold=27),
+        AlertRule(name="Salty soil", measurement="conductivity", operator="above", threshold=1.4),
+    ] + [
+        AlertRule(name=f"Low N on {field_id}", measurement="nitrogen", operator="below",
+                  threshold=90, consecutive_readings=2, field_id=field_id)
+        for field_id in fields
+    ]
+    AlertRule.objects.bulk_create(rules)
+
+    rng = random.Random(3)
+    now = timezone.now()
+    readings = [
+        SensorReading(
+            sensor=sensors[i % len(sensors)],
+            field_id=sensors[i % len(sensors)].field_id,
+            cooperative_id=sensors[i % len(sensors)].field.cooperative_id,
+            recorded_at=now - timedelta(seconds=rows - i),
+            **reading_values(rng),
+        )
+        for i in range(rows)
+    ]
+    engine = AlertEngine(AlertRule.objects.all())
+    started = time.perf_counter()
+    fired = []
+    for start in range(0, rows, 1000):
+        notifications, changes = engine.evaluate(readings[start:start + 1000])
+        engine.apply(changes)
+        fired += notifications
+    elapsed = time.perf_counter() - started
+    out(f"engine: {engine.evaluated:,} rule checks on {rows:,} readings in {elapsed:.2f}s "
+        f"= {engine.evaluated / elapsed:,.0f} checks/s, {len(fired):,} alerts")
+
+    records = [
+        {
+            "sensor_id": sensors[i % len(sensors)].sensor_id,
+            "recorded_at": (now + timedelta(seconds=i)).isoformat(),
+            **reading_values(rng),
+        }
+        for i in range(rows)
+    ]
+    half = rows // 2
+    AlertRule.objects.update(is_active=False)
+    reset_alert_engine()
+    without_rules, _ = ingest_records(records[:half])
+    AlertRule.objects.update(is_active=True)
+    invalidate_alert_rules()
+    with_rules, _ = ingest_records(records[half:])
+    out(f"ingest without rules: {without_rules.rows_per_sec:,.0f} rows/s; "
+        f"with {len(rules)} rules: {with_rules.rows_per_sec:,.0f} rows/s, {with_rules.alerts:,} alerts")
+
+
+@benchmark("anomalies", default_rows=200_000)
+def bench_anomalies(out, rows):
+    """
+    Anomaly detector cost per reading and how many injected probe faults
+    (1 in 200 readings) it catches.
+    """
+    from .anomalies import flag_readings
+
+    sensors = seed_network()
+    rng = random.Random(5)
+    now = timezone.now()
+    readings, injected = [], set()
+    for i in range(rows):
+        sensor = sensors[i % len(sensors)]
+        values = reading_values(rng)
+        if rng.random() < 0.005:
+            values["ph" if rng.random() < 0.5 else "moisture"] = rng.choice([0.0, 150.0, 14.5])
+            injected.add(i)
+        readings.append(SensorReading(
+            sensor=sensor,
+            field_id=sensor.field_id,
+            recorded_at=now - timedelta(seconds=rows - i),
+            **values,
+        ))
+
+    started = time.perf_counter()
+    for start in range(0, rows, 1000):
+        baselines, _ = flag_readings(readings[start:start + 1000])
+        for sensor in sensors:
+            baseline = baselines.get(sensor.pk)
+            if baseline is not None:
+                sensor.anomaly_state = SensorAnomalyState(state=baseline.to_bytes())
+    elapsed = time.perf_counter() - started
+
+    flagged = {i for i, reading in enumerate(readings) if reading.anomaly_flags}
+    out(f"{rows / elapsed:,.0f} readings/s through the detector "
+        f"({elapsed / rows * 1e6:.1f} us each, {len(baseline.to_bytes())} bytes of state per sensor)")
+    out(f"injected {len(injected):,} faults: caught {len(injected & flagged):,}, "
+        f"{len(flagged - injected):,} other readings flagged "
+        f"({len(flagged - injected) / rows:.3%} of normal traffic)")
+
+
+@benchmark("buffered_ingest", default_rows=100_000)
+def bench_buffered_ingest(out, rows):
+    """
+    Simulated gateways posting through the ASGI application in-process:
+    the synchronous endpoint (one transaction per request) against the
+    buffered one, then the buffered one with a small buffer to show 429
+    backpressure.
+    """
+    import logging
+
+    from asgiref.sync import async_to_sync
+    from django.core.asgi import get_asgi_application
+    from django.urls import reverse
+
+    from .buffer import IngestBuffer, reset_ingest_buffer
+    from . import buffer as buffer_module
+    from .loadtest import ASGITransport, run_load
+
+    sensor_ids = [sensor.sensor_id for sensor in seed_network()]
+    transport = ASGITransport(get_asgi_application())
+    # Every 429 would otherwise be logged as a warning.
+    logging.getLogger("django.request").setLevel(logging.ERROR)
+    gateways, per_request = 50, 100
+    requests = max(rows // (gateways * per_request), 1)
+    out(f"{gateways} gateways x {requests} requests x {per_request} readings")
+
+    def load(path):
+        return async_to_sync(run_load)(
+            transport, sensor_ids, path, gateways, requests, per_request
+        )
+
+    result = load(reverse("ingest_readings"))
+    out(f"sync endpoint:     {result.summary()}")
+
+    def buffered(label, buffer):
+        buffer_module._buffer = buffer
+
+        async def load_and_drain():
+            result = await run_load(
+                transport, sensor_ids, reverse("ingest_readings_buffered"),
+                gateways, requests, per_request,
+            )
+            started = time.perf_counter()
+            await buffer.close()
+            return result, time.perf_counter() - started
+
+        result, drained = async_to_sync(load_and_drain)()
+        stats = buffer.stats
+        out(f"{label}{result.summary()}")
+        out(f"  {stats.written:,} written in {stats.flushes:,} flushes "
+            f"(avg {stats.written / max(stats.flushes, 1):,.0f} rows, "
+            f"{stats.flush_time / max(stats.flushes, 1) * 1000:.1f} ms each); "
+            f"{drained * 1000:.0f} ms to drain at the end, "
+            f"{stats.written / (result.elapsed + drained):,.0f} readings/s durable")
+
+    buffered("buffered endpoint: ", IngestBuffer())
+    buffered("small buffer:      ", IngestBuffer(capacity=2000))
+    reset_ingest_buffer()
+
+
+@benchmark("gateway_listener", default_rows=100_000)
+def bench_gateway_listener(out, rows):
+    """
+    Messages/sec the gateway listener sustains from the in-process fake
+    broker (one reading per message, as sensors publish), decode and
+    batched writes included; then the same with the connection cut every
+    10,000 messages.
+    """
+    from .gateway import FakeBroker, GatewayListener, encode_payload, sensor_topic, subscriptions
+
+    sensors = seed_network()
+    coops = dict(FieldPlot.objects.values_list("pk", "cooperative_id"))
+    rng = random.Random(7)
+    start = int(timezone.now().timestamp()) - rows
+    messages = []
+    for i in range(rows):
+        sensor = sensors[i % len(sensors)]
+        payload = encode_payload([{"recorded_at": start + i, **reading_values(rng)}])
+        messages.append((sensor_topic(coops[sensor.field_id], sensor.sensor_id), payload))
+    out(f"{rows:,} messages, {sum(len(p) for _, p in messages) / rows:.0f} bytes each")
+
+    def run(label, drop_every=None):
+        broker = FakeBroker()
+        client = broker.client()
+        client.connect()
+        client.subscribe(subscriptions()[0])
+        for topic, payload in messages:
+            broker.publish(topic, payload)
+
+        if drop_every:
+            receive = client.receive
+            received = [0]
+
+            def flaky_receive(timeout):
+                message = receive(timeout)
+                received[0] += 1
+                if received[0] % drop_every == 0:
+                    broker.drop()
+                return message
+            client.receive = flaky_receive
+
+        listener = GatewayListener(client, subscriptions(), reconnect_min=0.0)
+        started = time.perf_counter()
+        stats = listener.run(max_messages=rows)
+        elapsed = time.perf_counter() - started
+        out(f"{label}{rows / elapsed:,.0f} messages/s sustained ({elapsed:.2f}s), "
+            f"{stats.written:,} written in {stats.flushes} batches, "
+            f"{stats.disconnects} reconnects, {len(stats.topics)} topics")
+
+    run("clean:              ")
+    SensorReading.objects.all().delete()
+    run("drop every 10,000:  ", drop_every=10_000)
+
+
+@benchmark("packed_payloads", default_rows=100_000)
+def bench_packed_payloads(out, rows):
+    """
+    Bytes per reading and decode throughput of the packed binary format
+    against the JSON bodies, for gateway uploads of 20 sensors x 50
+    readings ten minutes apart.
+    """
+    import json
+    import zlib
+
+    from . import packed
+    from .gateway import decode_payload, encode_payload
+
+    rng = random.Random(11)
+    start = int(timezone.now().timestamp()) - 50 * 600
+    uploads = []
+    for upload in range(max(rows // 1000, 1)):
+        records = []
+        for sensor in range(20):
+            for i in range(50):
+                values = reading_values(rng)
+                records.append({
+                    "sensor_id": f"GW{upload:04d}-S{sensor:02d}",
+                    "recorded_at": start + i * 600,
+                    "battery_level": rng.randint(30, 100),
+                    **values,
+                })
+        uploads.append(records)
+    total = sum(len(records) for records in uploads)
+
+    def iso(records):
+        return [
+            {**record, "recorded_at": datetime.fromtimestamp(record["recorded_at"], dt_timezone.utc).isoformat()}
+            for record in records
+        ]
+
+    def per_sensor(records):
+        by_sensor = {}
+        for record in records:
+            by_sensor.setdefault(record["sensor_id"], []).append(record)
+        return list(by_sensor.values())
+
+    formats = [
+        ("JSON (API)", [json.dumps(iso(records)).encode() for records in uploads], json.loads),
+        (
+            "compact JSON",
+            [encode_payload(group) for records in uploads for group in per_sensor(records)],
+            decode_payload,
+        ),
+        ("packed", [packed.encode_records(records) for records in uploads], packed.decode),
+    ]
+    for label, payloads, decode in formats:
+        size = sum(len(payload) for payload in payloads)
+        compressed = sum(len(zlib.compress(payload)) for payload in payloads)
+        started = time.perf_counter()
+        decoded = sum(len(decode(payload)) for payload in payloads)
+        elapsed = time.perf_counter() - started
+        assert decoded == total
+        out(f"{label:<13} {size / total:6.1f} bytes/reading ({compressed / total:5.1f} deflated), "
+            f"decode {total / elapsed:,.0f} readings/s")
+
+
+@benchmark("archive", default_rows=1_000_000)
+def bench_archive(out, rows):
+    """
+    Hot-path query latency with two years of readings in the readings
+    table, then after archiving everything but the last three months; and
+    what reading an archived month back costs.
+    """
+    from .archive import archive_readings, archive_cutoff, iter_readings, month_start, next_month
+    from .health import evaluate_sensor_health
+    from .pagination import keyset_paginate
+
+    sensors = seed_network()
+    seed_readings(sensors, rows, span=timedelta(days=730))
+    analyze()
+    field_id = sensors[0].field_id
+    month = month_start(timezone.now() - timedelta(days=365))
+    month_end = next_month(month)
+
+    def used_bytes():
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA page_size")
+            page_size = cursor.fetchone()[0]
+            cursor.execute("PRAGMA page_count")
+            pages = cursor.fetchone()[0]
+            cursor.execute("PRAGMA freelist_count")
+            return (pages - cursor.fetchone()[0]) * page_size
+
+    base = SensorReading.objects.select_related("sensor", "sensor__field", "sensor__field__cooperative")
+    cases = [
+        ("latest reading", lambda: SensorReading.objects.order_by("-recorded_at").first()),
+        ("readings COUNT(*)", lambda: SensorReading.objects.count()),
+        ("history page 1", lambda: keyset_paginate(base, None, 50).items),
+        ("history page 1, field", lambda: keyset_paginate(base.for_scope(field_id=field_id), None, 50).items),
+        ("last 14 days, all", lambda: SensorReading.objects.filter(
+            recorded_at__gte=timezone.now() - timedelta(days=14)).values_list("ph").order_by().count()),
+        ("sensor health", lambda: evaluate_sensor_health()),
+        ("a year-old month, field", lambda: list(iter_readings(field_id=field_id, start=month, end=month_end))),
+    ]
+
+    def measure(label):
+        out(f"\n{label}: {SensorReading.objects.count():,} rows in the readings table, "
+            f"{used_bytes() / 2**20:,.0f} MiB in use")
+        for name, func in cases:
+            ms, _ = timed(func)
+            out(f"  {name:<26} {ms:9.2f} ms")
+
+    measure("before")
+    with override_settings(SOILTRACK_ARCHIVE_AFTER_DAYS=90):
+        cutoff = archive_cutoff()
+    run = archive_readings(before=cutoff)
+    analyze()
+    out(f"\narchived {run.readings:,} readings ({run.months} months) into {run.segments:,} segments "
+        f"in {run.elapsed:.1f}s: {run.stored_bytes / 2**20:.1f} MiB, {run.ratio:.1f}x smaller than raw columns")
+    measure("after")
+
+
+@benchmark("column_store", default_rows=1_000_000)
+def bench_column_store(out, rows):
+    """
+    A year's pH mean and percentiles, through the ORM and from the
+    memory-mapped column store.
+    """
+    import tempfile
+    from pathlib import Path
+
+    import numpy as np
+    from django.db.models import Avg
+
+    from .columnstore import ColumnStore
+
+    sensors = seed_network()
+    seed_readings(sensors, rows)
+    analyze()
+    end = timezone.now()
+    start = end - timedelta(days=365)
+    year = SensorReading.objects.filter(recorded_at__gte=start, recorded_at__lt=end, ph__isnull=False)
+
+    def describe(values):
+        values = np.asarray(values, dtype=np.float64)
+        return (len(values), values.mean(), *np.percentile(values, (10, 50, 90)))
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = ColumnStore(directory)
+        run = store.sync()
+        size = sum(path.stat().st_size for path in Path(directory).rglob("*.npy"))
+        out(f"sync: {run.readings:,} readings into {len(store.months())} months in {run.elapsed:.1f}s, "
+            f"{size / 2**20:.0f} MiB on disk\n")
+
+        cases = [
+            ("ORM, model instances", 1, lambda: describe(
+                [reading.ph for reading in year.only("ph").iterator(chunk_size=5000)])),
+            ("ORM, values_list", 1, lambda: describe(list(year.values_list("ph", flat=True)))),
+            ("SQL AVG only", 3, lambda: (year.count(), year.aggregate(mean=Avg("ph"))["mean"])),
+            ("column store, cold", 3, lambda: describe(ColumnStore(directory).values("ph", start, end))),
+            ("column store, mapped", 5, lambda: describe(store.values("ph", start, end))),
+        ]
+        with override_settings(SOILTRACK_EXCLUDE_ANOMALIES=False):
+            for name, repeat, func in cases:
+                ms, result = timed(func, repeat=repeat)
+                summary = f"n={result[0]:,} mean={result[1]:.4f}"
+                if len(result) > 2:
+                    summary += " p10/50/90=" + "/".join(f"{value:.2f}" for value in result[2:])
+                out(f"  {name:<22} {ms:10.1f} ms   {summary}")
+
+            ms, _ = timed(lambda: [len(part["ph"]) for part in store.slices(start, end, ["ph"])])
+            out(f"\n  slices() for the year  {ms:10.3f} ms (views only, nothing copied)")
+
+
+@benchmark("analytics", default_rows=1_000_000)
+def bench_analytics(out, rows):
+    """
+    Each analytics metric over 90 days of a year of readings, uncached
+    and cached, against RESPONSE_TARGETS: first with every bucket
+    truncated from raw readings, then with closed buckets downsampled.
+    """
+    from django.core.cache import cache
+    from django.test.utils import CaptureQueriesContext
+
+    from .analytics import METRICS, RESPONSE_TARGETS, get_metric, make_window
+    from .downsampling import run_downsampling
+    from .models import AIInsight
+
+    sensors = seed_network()
+    seed_readings(sensors, rows)
+    rng = random.Random(7)
+    fields = {sensor.field_id for sensor in sensors}
+    AIInsight.objects.bulk_create([
+        AIInsight(
+            field_id=field_id,
+            summary="bench",
+            suitability_score=rng.randint(20, 100),
+            nutrient_score=rng.randint(20, 100),
+            water_retention_score=rng.randint(20, 100),
+            drainage_score=rng.randint(20, 100),
+        )
+        for field_id in fields
+        for _ in range(10)
+    ], batch_size=5000)
+    analyze()
+    coop_id = sensors[0].field.cooperative_id
+
+    def verdict(ms, target):
+        return "ok" if ms <= target else f"MISSED ({target} ms)"
+
+    def measure(label):
+        out(f"\n{label}:")
+        for bucket in ("day", "week"):
+            for coop in (None, coop_id):
+                window = make_window(coop, 90, bucket)
+                scope = "one coop" if coop else "all coops"
+                for name in METRICS:
+                    cache.clear()
+                    connection.queries_log.clear()
+                    with CaptureQueriesContext(connection) as queries:
+                        cold, data = timed(lambda: get_metric(name, window), repeat=1)
+                    cached, _ = timed(lambda: get_metric(name, window))
+                    out(f"  {bucket:<4} {scope:<9} {name:<6} {len(data['results']):4,} rows "
+                        f"{len(queries)} queries  cold {cold:7.1f} ms {verdict(cold, RESPONSE_TARGETS['cold']):<15}"
+                        f" cached {cached:5.2f} ms {verdict(cached, RESPONSE_TARGETS['cached'])}")
+
+    measure("raw readings only")
+    started = time.perf_counter()
+    run_downsampling()
+    analyze()
+    measure(f"after downsampling ({time.perf_counter() - started:.1f}s)")
@@ -0,0 +1,307 @@
+"""
+Write buffer for the async ingestion endpoint.
+
+Requests only validate their readings and append them to an in-process
+queue; a single writer task on the event loop drains it in batches of
+SOILTRACK_INGEST_BATCH_SIZE, or sooner once the oldest buffered reading
+has waited SOILTRACK_INGEST_FLUSH_SECONDS. Each batch is one transaction
+through tracker.ingest.write_readings, run on a dedicated writer thread
+with its own database connection, so there is never more than one writer
+per process and requests (whose sync middleware runs in Django's shared
+sync thread) don't queue behind a flush.
+
+When SOILTRACK_INGEST_BUFFER_SIZE readings are waiting (queued or being
+written) new requests are refused and the view answers 429, which tells
+gateways to back off instead of piling up memory.
+
+A batch that fails with a transient database error (a locked SQLite
+file, a dropped connection) goes back to the head of the queue and is
+retried with exponential backoff, up to ``max_retries`` times; meanwhile
+it still counts towards the limit. A batch that still fails then, or
+fails with any other error, is dropped and its readings logged in full
+to the ``tracker.buffer.dead_letter`` logger, so they can be replayed.
+
+The buffer lives in process memory: readings accepted but not yet written
+are lost if the process dies. tracker.buffer.lifespan flushes them on a
+clean ASGI shutdown.
+"""
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, close_old_connections, connections
+
+from .ingest import get_batch_size, ingest_parsed
+
+
+logger = logging.getLogger(__name__)
+dead_letter_logger = logging.getLogger(__name__ + ".dead_letter")
+
+DEFAULT_BUFFER_SIZE = 50_000
+DEFAULT_FLUSH_SECONDS = 1.0
+
+# Write errors worth retrying: the database was busy or went away.
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+
+@dataclass
+class BufferStats:
+    queued: int = 0             # readings accepted into the buffer
+    refused_requests: int = 0   # requests answered 429
+    flushes: int = 0
+    written: int = 0
+    rejected: int = 0           # dropped at write time (unknown sensor)
+    retries: int = 0            # batches put back after a transient error
+    failed: int = 0             # lost to a failed write
+    flush_time: float = 0.0
+
+    def as_dict(self):
+        return {
+            "queued": self.queued,
+            "refused_requests": self.refused_requests,
+            "flushes": self.flushes,
+            "written": self.written,
+            "rejected": self.rejected,
+            "retries": self.retries,
+            "failed": self.failed,
+            "flush_ms": round(self.flush_time * 1000, 2),
+        }
+
+
+class IngestBuffer:
+    """
+    ``dedicated_thread=False`` writes from Django's thread-sensitive sync
+    thread instead, sharing its connection (tests, where that connection
+    holds the test transaction).
+    """
+    def __init__(
+        self,
+        capacity=None,
+        batch_size=None,
+        max_delay=None,
+        writer=ingest_parsed,
+        dedicated_thread=True,
+        retry_min=0.1,
+        retry_max=10.0,
+        max_retries=5,
+    ):
+        self.capacity = capacity or getattr(
+            settings, "SOILTRACK_INGEST_BUFFER_SIZE", DEFAULT_BUFFER_SIZE
+        )
+        self.batch_size = batch_size or get_batch_size()
+        self.max_delay = max_delay if max_delay is not None else getattr(
+            settings, "SOILTRACK_INGEST_FLUSH_SECONDS", DEFAULT_FLUSH_SECONDS
+        )
+        self.writer = writer
+        self.retry_min = retry_min
+        self.retry_max = retry_max
+        self.max_retries = max_retries
+        self._retry_delay = retry_min
+        self._attempts = 0
+        self._executor = None
+        if not dedicated_thread:
+            self._sync_write = sync_to_async(writer, thread_sensitive=True)
+        self.stats = BufferStats()
+        self._pending = []
+        self._oldest = None
+        self._in_flight = 0
+        self._loop = None
+        self._task = None
+
+    def __len__(self):
+        return len(self._pending) + self._in_flight
+
+    def offer(self, parsed):
+        """
+        Queue parsed rows (tracker.ingest.parse_records). Returns False,
+        queueing nothing, when they don't fit. Call from the event loop.
+        """
+        if len(self) + len(parsed) > self.capacity:
+            self.stats.refused_requests += 1
+            return False
+        if not parsed:
+            return True
+        self._start_writer()
+        if not self._pending:
+            self._oldest = time.monotonic()
+        self._pending.extend(parsed)
+        self.stats.queued += len(parsed)
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def _start_writer(self):
+        # One writer per event loop; a new loop (tests, a reloaded server)
+        # gets a fresh one and takes over whatever is still pending.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task.done():
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._lock = asyncio.Lock()
+            self._task = loop.create_task(self._run())
+
+    def _write_in_thread(self, batch):
+        close_old_connections()
+        return self.writer(batch)
+
+    async def write(self, batch):
+        if not hasattr(self, "_sync_write"):
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-writer")
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._write_in_thread, batch
+            )
+        return await self._sync_write(batch)
+
+    def _due(self):
+        return bool(self._pending) and (
+            len(self._pending) >= self.batch_size
+            or time.monotonic() - self._oldest >= self.max_delay
+        )
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            if not self._due():
+                timeout = None
+                if self._pending:
+                    timeout = max(self._oldest + self.max_delay - time.monotonic(), 0)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except TimeoutError:
+                    pass
+            while self._due():
+                delay = await self._write_batch()
+                if delay:
+                    await asyncio.sleep(delay)
+
+    def _dead_letter(self, batch, reason):
+        self.stats.failed += len(batch)
+        logger.error("ingest buffer: dropped a batch of %d readings (%s)", len(batch), reason)
+        dead_letter_logger.error(json.dumps([
+            {"sensor_id": sensor_id, "recorded_at": recorded_at.isoformat(),
+             "battery_level": battery, **measurements}
+            for _, sensor_id, recorded_at, measurements, battery in batch
+        ]))
+
+    async def _write_batch(self):
+        """
+        Write the batch at the head of the queue. Returns how long to wait
+        before trying again after a transient error, else 0; the caller
+        waits, outside the lock.
+        """
+        async with self._lock:
+            batch = self._pending[:self.batch_size]
+            if not batch:
+                return 0
+            oldest = self._oldest
+            del self._pending[:len(batch)]
+            self._oldest = time.monotonic() if self._pending else None
+            self._in_flight = len(batch)
+            self._attempts += 1
+            try:
+                result = await self.write(batch)
+            except TRANSIENT_ERRORS as exc:
+                if self._attempts > self.max_retries:
+                    self._give_up()
+                    self._dead_letter(batch, f"{self._attempts} attempts, last: {exc}")
+                    return 0
+                delay = self._retry_delay
+                self._retry_delay = min(delay * 2, self.retry_max)
+                logger.warning(
+                    "ingest buffer: writing %d readings failed, retrying in %.1fs",
+                    len(batch), delay, exc_info=True,
+                )
+                self.stats.retries += 1
+                self._pending[:0] = batch
+                self._oldest = oldest
+                return delay
+            except Exception as exc:
+                logger.exception("ingest buffer: writing %d readings failed", len(batch))
+                self._give_up()
+                self._dead_letter(batch, repr(exc))
+            else:
+                self._give_up()
+                self.stats.flushes += 1
+                self.stats.written += result.accepted
+                self.stats.rejected += result.rejected
+                self.stats.flush_time += result.elapsed
+            finally:
+                self._in_flight = 0
+            return 0
+
+    def _give_up(self):
+        # Done with the head batch, one way or the other.
+        self._attempts = 0
+        self._retry_delay = self.retry_min
+
+    async def flush(self):
+        """
+        Write everything queued so far, now.
+        """
+        if self._task is None:
+            return
+        self._start_writer()
+        while self._pending:
+            delay = await self._write_batch()
+            if delay:
+                await asyncio.sleep(delay)
+        # ... and wait for a batch the writer task already has in flight.
+        async with self._lock:
+            pass
+
+    async def close(self):
+        """
+        Flush and stop the writer task.
+        """
+        await self.flush()
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._loop = None
+        if self._executor is not None:
+            self._executor.submit(connections.close_all)
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+_buffer = None
+
+
+def get_ingest_buffer():
+    global _buffer
+    if _buffer is None:
+        _buffer = IngestBuffer()
+    return _buffer
+
+
+def reset_ingest_buffer():
+    """
+    Drop the process buffer and anything still in it (tests).
+    """
+    global _buffer
+    _buffer = None
+
+
+async def lifespan(scope, receive, send):
+    """
+    ASGI lifespan handler: flushes the buffer when the server shuts down.
+    """
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if _buffer is not None:
+                await _buffer.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
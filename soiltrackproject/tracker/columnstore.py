@@ -0,0 +1,378 @@
+"""
+Columnar reading store for analytics scans.
+
+A directory (SOILTRACK_COLUMN_STORE_DIR) with one subdirectory per month
+of readings ("2025-03", local time) holding one .npy file per column:
+
+    id, recorded_at    int64 (recorded_at in microseconds since the epoch)
+    sensor, field,     int32 primary keys
+    cooperative
+    ph ... conductivity
+                       float64, NaN where the reading had no value
+    anomaly_flags      uint16
+
+and state.json, the high-water marks of the sync and, per month, how many
+rows are committed and where each sorted run starts.
+
+ColumnStore.sync() appends readings with an id above the watermark (and
+archived readings it has not seen, see tracker.archive), a chunk at a
+time. A chunk goes to each month it touches as one run sorted by
+recorded_at; when it starts no earlier than the month's last reading it
+just extends the last run. A month with more than MAX_RUNS runs is merged
+back into one. Files are only ever appended to (or a month replaced
+whole), and state.json is written last, so a sync that dies halfway
+leaves the previous state readable and is redone by the next one.
+
+Queries open the files with np.memmap and binary-search each run, so
+slices() hands out views of the mapped files with no copying and no row
+objects. The store is a copy for reading: readings edited or deleted
+after they were synced only change here on ``sync_column_store
+--rebuild``. Runs from one process at a time (a cron job).
+"""
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .anomalies import exclude_anomalies
+from .archive import EPOCH, MICROSECOND, decode_segment, month_start, next_month
+from .models import ArchiveSegment, SensorReading
+
+
+MEASUREMENTS = SensorReading.MEASUREMENTS
+
+STORE_COLUMNS = (
+    ("id", np.int64),
+    ("recorded_at", np.int64),
+    ("sensor", np.int32),
+    ("field", np.int32),
+    ("cooperative", np.int32),
+    *((name, np.float64) for name in MEASUREMENTS),
+    ("anomaly_flags", np.uint16),
+)
+
+MAX_RUNS = 8
+DEFAULT_CHUNK_SIZE = 50_000
+
+_READ_FIELDS = (
+    "id", "recorded_at", "sensor_id", "field_id", "cooperative_id",
+) + MEASUREMENTS + ("anomaly_flags",)
+
+
+def get_store_dir():
+    return Path(getattr(settings, "SOILTRACK_COLUMN_STORE_DIR", settings.BASE_DIR / "columnstore"))
+
+
+def _micros(moment):
+    return (moment - EPOCH) // MICROSECOND
+
+
+def _month_key(start):
+    return f"{start:%Y-%m}"
+
+
+def _month_range(key):
+    start = timezone.make_aware(datetime(int(key[:4]), int(key[5:7]), 1))
+    return start, next_month(start)
+
+
+@dataclass
+class SyncRun:
+    readings: int = 0
+    archived: int = 0       # of readings, taken from archive segments
+    months: int = 0         # months written to
+    merged: int = 0         # months merged back into one run
+    elapsed: float = 0.0
+
+
+# =========================
+# FILES
+# =========================
+def _append_column(path, committed, values):
+    """
+    Write ``values`` after the first ``committed`` elements of a .npy file
+    (dropping anything a failed sync left beyond them).
+    """
+    if not path.exists():
+        np.save(path, values)
+        return
+    with open(path, "r+b") as handle:
+        np.lib.format.read_magic(handle)
+        _, _, dtype = np.lib.format.read_array_header_1_0(handle)
+        data_start = handle.tell()
+        handle.seek(data_start + committed * dtype.itemsize)
+        handle.write(values.tobytes())
+        handle.truncate()
+        # np.save leaves room in the header for the shape to grow.
+        handle.seek(0)
+        np.lib.format.write_array_header_1_0(handle, {
+            "descr": np.lib.format.dtype_to_descr(dtype),
+            "fortran_order": False,
+            "shape": (committed + len(values),),
+        })
+        if handle.tell() != data_start:
+            raise RuntimeError(f"{path}: .npy header changed size")
+
+
+def _write_month(directory, columns):
+    """
+    Replace a month directory with ``columns``, swapping in a complete copy.
+    """
+    staging = directory.with_name(directory.name + ".new")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    for name, _ in STORE_COLUMNS:
+        np.save(staging / f"{name}.npy", columns[name])
+    retired = directory.with_name(directory.name + ".old")
+    if directory.exists():
+        directory.rename(retired)
+    staging.rename(directory)
+    shutil.rmtree(retired, ignore_errors=True)
+
+
+def _sorted(columns):
+    order = np.lexsort((columns["id"], columns["recorded_at"]))
+    return {name: values[order] for name, values in columns.items()}
+
+
+# =========================
+# STORE
+# =========================
+class ColumnStore:
+    def __init__(self, root=None):
+        self.root = Path(root) if root is not None else get_store_dir()
+        self._maps = {}
+
+    # State ------------------------------------------------------------
+    def state(self):
+        try:
+            with open(self.root / "state.json") as handle:
+                return json.load(handle)
+        except FileNotFoundError:
+            return {"last_id": 0, "last_segment": 0, "months": {}}
+
+    def _save_state(self, state):
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.root / "state.json"
+        with open(path.with_suffix(".tmp"), "w") as handle:
+            json.dump(state, handle)
+        os.replace(path.with_suffix(".tmp"), path)
+
+    def months(self):
+        return sorted(self.state()["months"])
+
+    def __len__(self):
+        return sum(month["rows"] for month in self.state()["months"].values())
+
+    # Writing ----------------------------------------------------------
+    def _add(self, state, columns, run):
+        """
+        Add rows ({column: array}) to the months they fall in.
+        """
+        if not len(columns["id"]):
+            return
+        times = columns["recorded_at"]
+        first = month_start(EPOCH + int(times.min()) * MICROSECOND)
+        last = EPOCH + int(times.max()) * MICROSECOND
+        starts = [first]
+        while starts[-1] <= last:
+            starts.append(next_month(starts[-1]))
+        bucket = np.searchsorted(np.array([_micros(start) for start in starts]), times, side="right") - 1
+
+        for index in np.unique(bucket):
+            selected = _sorted({name: values[bucket == index] for name, values in columns.items()})
+            key = _month_key(starts[index])
+            directory = self.root / key
+            month = state["months"].get(key)
+            if month is None:
+                _write_month(directory, selected)
+                state["months"][key] = {"rows": len(selected["id"]), "runs": [0]}
+            else:
+                rows = month["rows"]
+                mapped = self._open(key, month)
+                if selected["recorded_at"][0] < mapped["recorded_at"][rows - 1]:
+                    month["runs"].append(rows)
+                if len(month["runs"]) > MAX_RUNS:
+                    merged = {
+                        name: np.concatenate([mapped[name], selected[name]]) for name, _ in STORE_COLUMNS
+                    }
+                    self._maps.pop(key, None)
+                    _write_month(directory, _sorted(merged))
+                    month["runs"] = [0]
+                    run.merged += 1
+                else:
+                    for name, _ in STORE_COLUMNS:
+                        _append_column(directory / f"{name}.npy", rows, selected[name])
+                month["rows"] = rows + len(selected["id"])
+            run.months += 1
+
+    def _archived_columns(self, segments, last_id):
+        parts = []
+        for sensor_id, field_id, coop_id, count, data in segments:
+            decoded = decode_segment(data, count)
+            new = decoded["id"] > last_id
+            if not new.any():
+                continue
+            part = {name: decoded[name][new] for name in decoded}
+            size = int(new.sum())
+            part["sensor"] = np.full(size, sensor_id, dtype=np.int32)
+            part["field"] = np.full(size, field_id, dtype=np.int32)
+            part["cooperative"] = np.full(size, coop_id, dtype=np.int32)
+            parts.append(part)
+        if not parts:
+            return None
+        return {
+            name: np.concatenate([part[name] for part in parts]).astype(dtype, copy=False)
+            for name, dtype in STORE_COLUMNS
+        }
+
+    def sync(self, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+        """
+        Append every reading not yet in the store. ``progress(SyncRun)`` is
+        called after each chunk. Returns a SyncRun.
+        """
+        started = time.perf_counter()
+        run = SyncRun()
+        state = self.state()
+        last_id = state["last_id"]
+
+        # Readings archived before they were synced exist only in segments.
+        segments = ArchiveSegment.objects.filter(pk__gt=state["last_segment"])
+        for month in segments.order_by("month").values_list("month", flat=True).distinct():
+            in_month = segments.filter(month=month)
+            columns = self._archived_columns(
+                in_month.values_list("sensor_id", "field_id", "cooperative_id", "reading_count", "data"),
+                last_id,
+            )
+            if columns is not None:
+                self._add(state, columns, run)
+                run.readings += len(columns["id"])
+                run.archived += len(columns["id"])
+                state["last_id"] = max(state["last_id"], int(columns["id"].max()))
+            state["last_segment"] = max(state["last_segment"], max(in_month.values_list("pk", flat=True)))
+            self._save_state(state)
+            if progress:
+                progress(run)
+
+        # Then the readings table, by id. Assumes ids become visible in
+        # order, which holds with one writer per database (SQLite, or the
+        # buffered endpoint's writer thread).
+        while True:
+            rows = list(
+                SensorReading.objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .values_list(*_READ_FIELDS)[:chunk_size]
+            )
+            if not rows:
+                break
+            values = list(zip(*rows))
+            columns = {
+                "id": np.array(values[0], dtype=np.int64),
+                "recorded_at": np.array([_micros(moment) for moment in values[1]], dtype=np.int64),
+                "sensor": np.array(values[2], dtype=np.int32),
+                "field": np.array(values[3], dtype=np.int32),
+                "cooperative": np.array(values[4], dtype=np.int32),
+                "anomaly_flags": np.array(values[-1], dtype=np.uint16),
+            }
+            for offset, name in enumerate(MEASUREMENTS, start=5):
+                columns[name] = np.array(values[offset], dtype=np.float64)   # None -> NaN
+            self._add(state, columns, run)
+            last_id = rows[-1][0]
+            state["last_id"] = max(state["last_id"], last_id)
+            self._save_state(state)
+            run.readings += len(rows)
+            if progress:
+                progress(run)
+
+        run.elapsed = time.perf_counter() - started
+        return run
+
+    def rebuild(self, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+        """
+        Drop the store and sync everything again.
+        """
+        self._maps.clear()
+        shutil.rmtree(self.root, ignore_errors=True)
+        return self.sync(chunk_size, progress)
+
+    # Reading ----------------------------------------------------------
+    def _open(self, key, month):
+        cached = self._maps.get(key)
+        signature = (month["rows"], tuple(month["runs"]))
+        if cached is None or cached[0] != signature:
+            columns = {
+                name: np.load(self.root / key / f"{name}.npy", mmap_mode="r")[:month["rows"]]
+                for name, _ in STORE_COLUMNS
+            }
+            cached = self._maps[key] = (signature, columns)
+        return cached[1]
+
+    def slices(self, start=None, end=None, columns=None):
+        """
+        Yield {column: array} for the readings in [start, end), as views of
+        the mapped files: one per sorted run, months oldest first, each in
+        recorded_at order. ``columns`` limits the names returned.
+        """
+        names = columns or [name for name, _ in STORE_COLUMNS]
+        low = _micros(start) if start is not None else None
+        high = _micros(end) if end is not None else None
+        state = self.state()
+        for key in sorted(state["months"]):
+            month_begin, month_end = _month_range(key)
+            if (end is not None and month_begin >= end) or (start is not None and month_end <= start):
+                continue
+            month = state["months"][key]
+            mapped = self._open(key, month)
+            times = mapped["recorded_at"]
+            bounds = month["runs"] + [month["rows"]]
+            for first, stop in zip(bounds, bounds[1:]):
+                run = times[first:stop]
+                lo = first + (int(np.searchsorted(run, low, "left")) if low is not None else 0)
+                hi = first + (int(np.searchsorted(run, high, "left")) if high is not None else len(run))
+                if lo < hi:
+                    yield {name: mapped[name][lo:hi] for name in names}
+
+    def values(self, measurement, start=None, end=None, coop_id=None, field_id=None, sensor_id=None):
+        """
+        One measurement's values in the range and scope, as a new array:
+        missing values dropped, and flagged ones too when anomalies are
+        excluded from analysis.
+        """
+        bit = 1 << MEASUREMENTS.index(measurement)
+        skip_flagged = exclude_anomalies()
+        scope = [
+            (name, value) for name, value in
+            (("cooperative", coop_id), ("field", field_id), ("sensor", sensor_id))
+            if value is not None
+        ]
+        names = [measurement, "anomaly_flags"] + [name for name, _ in scope]
+        parts = []
+        for part in self.slices(start, end, names):
+            keep = ~np.isnan(part[measurement])
+            if skip_flagged:
+                keep &= (part["anomaly_flags"] & bit) == 0
+            for name, value in scope:
+                keep &= part[name] == int(value)
+            parts.append(part[measurement][keep])
+        return np.concatenate(parts) if parts else np.empty(0)
+
+    def summary(self, measurement, start=None, end=None, percentiles=(10, 50, 90), **scope):
+        """
+        count, mean, min, max and the given percentiles of a measurement.
+        """
+        values = self.values(measurement, start, end, **scope)
+        result = {"count": len(values)}
+        if not len(values):
+            return {**result, "mean": None, "min": None, "max": None,
+                    **{f"p{p}": None for p in percentiles}}
+        result.update(mean=float(values.mean()), min=float(values.min()), max=float(values.max()))
+        for p, value in zip(percentiles, np.percentile(values, percentiles)):
+            result[f"p{p}"] = float(value)
+        return result
@@ -0,0 +1,193 @@
+"""
+Current conditions: the newest reading of every sensor and every field.
+
+apply_current() runs in the ingest transaction and upserts the newest
+reading of the batch per sensor and per field; the database keeps
+whichever of the stored and the new row is newer, so concurrent batches
+and late readings can't roll a current reading back. Pages and the
+conditions API then read one row per sensor or field by primary key
+instead of a newest-per-group query over the readings table.
+"""
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .anomalies import exclude_anomalies
+from .models import FieldCurrentReading, FieldPlot, Sensor, SensorCurrentReading, SensorReading
+
+
+MEASUREMENTS = SensorReading.MEASUREMENTS
+
+READING_FIELDS = ["reading_id", "recorded_at"] + list(MEASUREMENTS) + ["anomaly_flags", "updated_at"]
+
+
+def _newest(readings, key):
+    newest = {}
+    for reading in readings:
+        group = key(reading)
+        current = newest.get(group)
+        if current is None or (reading.recorded_at, reading.pk or 0) > (current.recorded_at, current.pk or 0):
+            newest[group] = reading
+    return newest
+
+
+def _upsert_sql(model, columns, rows):
+    """
+    INSERT ... ON CONFLICT DO UPDATE that only replaces an older reading
+    (SQLite >= 3.24 and PostgreSQL share this syntax).
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    quoted = [connection.ops.quote_name(column) for column in columns]
+    recorded_at = connection.ops.quote_name("recorded_at")
+    reading_id = connection.ops.quote_name("reading_id")
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    assignments = ", ".join(f"{column} = excluded.{column}" for column in quoted[1:])
+    return (
+        f"INSERT INTO {table} ({', '.join(quoted)}) "
+        f"VALUES {', '.join([placeholders] * rows)} "
+        f"ON CONFLICT ({quoted[0]}) DO UPDATE SET {assignments} "
+        f"WHERE excluded.{recorded_at} > {table}.{recorded_at} "
+        f"OR (excluded.{recorded_at} = {table}.{recorded_at} AND excluded.{reading_id} > {table}.{reading_id})"
+    )
+
+
+def _upsert(model, keys, rows):
+    """
+    ``rows`` maps a key tuple (values for ``keys``) to its newest reading.
+    """
+    if not rows:
+        return 0
+    now = timezone.now()
+    columns = list(keys) + READING_FIELDS
+    db_fields = {name: model._meta.get_field(name) for name in READING_FIELDS}
+    values = []
+    for key, reading in rows.items():
+        current = {
+            "reading_id": reading.pk,
+            "recorded_at": reading.recorded_at,
+            "anomaly_flags": reading.anomaly_flags,
+            "updated_at": now,
+            **{name: getattr(reading, name) for name in MEASUREMENTS},
+        }
+        values.append(list(key) + [
+            db_fields[name].get_db_prep_value(current[name], connection) for name in READING_FIELDS
+        ])
+
+    batch_size = max(connection.ops.bulk_batch_size(columns, values), 1)
+    with connection.cursor() as cursor:
+        for start in range(0, len(values), batch_size):
+            chunk = values[start:start + batch_size]
+            cursor.execute(
+                _upsert_sql(model, columns, len(chunk)),
+                [value for row in chunk for value in row],
+            )
+    return len(rows)
+
+
+def apply_current(readings):
+    """
+    Make a batch of freshly written readings current where they are the
+    newest. Must run inside the transaction that wrote the readings.
+    """
+    by_sensor = _newest(readings, lambda reading: reading.sensor_id)
+    by_field = _newest(
+        (reading for reading in by_sensor.values() if reading.field_id is not None),
+        lambda reading: reading.field_id,
+    )
+    _upsert(SensorCurrentReading, ["sensor_id"], {(k,): r for k, r in by_sensor.items()})
+    _upsert(
+        FieldCurrentReading,
+        ["field_id", "sensor_id", "cooperative_id"],
+        {(r.field_id, r.sensor_id, r.cooperative_id): r for r in by_field.values()},
+    )
+    return len(by_sensor)
+
+
+def _newest_id(owner):
+    return Subquery(
+        SensorReading.objects.filter(**{owner: OuterRef("pk")})
+        .order_by("-recorded_at", "-id").values("id")[:1]
+    )
+
+
+def rebuild_current():
+    """
+    Recompute every current reading from the readings table (backfills,
+    and after readings were deleted or edited outside the ingest path).
+    Sensors whose readings are all archived get none.
+    """
+    sensor_rows = SensorReading.objects.filter(
+        pk__in=Sensor.objects.annotate(newest=_newest_id("sensor")).values("newest")
+    ).order_by()
+    field_rows = SensorReading.objects.filter(
+        pk__in=FieldPlot.objects.annotate(newest=_newest_id("field")).values("newest")
+    ).order_by()
+
+    with transaction.atomic():
+        SensorCurrentReading.objects.all().delete()
+        FieldCurrentReading.objects.all().delete()
+        sensors = _upsert(SensorCurrentReading, ["sensor_id"], {(r.sensor_id,): r for r in sensor_rows})
+        _upsert(
+            FieldCurrentReading,
+            ["field_id", "sensor_id", "cooperative_id"],
+            {(r.field_id, r.sensor_id, r.cooperative_id): r for r in field_rows},
+        )
+    return sensors
+
+
+def refresh_field_current(field_ids):
+    """
+    Recompute the current readings of these fields only (after a sensor
+    moved between them).
+    """
+    field_rows = SensorReading.objects.filter(
+        pk__in=FieldPlot.objects.filter(pk__in=field_ids).annotate(newest=_newest_id("field")).values("newest")
+    ).order_by()
+    with transaction.atomic():
+        FieldCurrentReading.objects.filter(field_id__in=field_ids).delete()
+        _upsert(
+            FieldCurrentReading,
+            ["field_id", "sensor_id", "cooperative_id"],
+            {(r.field_id, r.sensor_id, r.cooperative_id): r for r in field_rows},
+        )
+
+
+# =========================
+# CURRENT CONDITIONS
+# =========================
+def _conditions(current):
+    skip_flagged = exclude_anomalies()
+    values = {}
+    for index, name in enumerate(MEASUREMENTS):
+        value = getattr(current, name)
+        if skip_flagged and current.anomaly_flags & (1 << index):
+            value = None
+        values[name] = value
+    return {
+        "sensor": current.sensor_id,
+        "recorded_at": current.recorded_at.isoformat(),
+        **values,
+    }
+
+
+def field_conditions(field_ids=None, coop_id=None):
+    """
+    {field id: current conditions} for the given fields and/or one
+    cooperative, in one query on the current-reading table. Fields that
+    never reported are left out. Values flagged as anomalies are None when
+    anomalies are excluded from analysis.
+    """
+    current = FieldCurrentReading.objects.order_by()
+    if field_ids is not None:
+        current = current.filter(field_id__in=field_ids)
+    if coop_id is not None:
+        current = current.filter(cooperative_id=coop_id)
+    return {row.field_id: _conditions(row) for row in current}
+
+
+def sensor_conditions(sensor_ids):
+    """
+    {sensor pk: current conditions} for the given sensors, in one query.
+    """
+    current = SensorCurrentReading.objects.filter(sensor_id__in=sensor_ids).order_by()
+    return {row.sensor_id: _conditions(row) for row in current}
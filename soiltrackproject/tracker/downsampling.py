@@ -0,0 +1,260 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q, Sum, Avg
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .anomalies import clean_condition, exclude_anomalies
+from .archive import archived_until
+from .models import DownsampleState, ReadingAggregate, SensorReading
+
+
+MEASUREMENTS = SensorReading.MEASUREMENTS
+
+# Finest first. Each level is built from the one before it (hours from raw
+# readings, days from hours, weeks from days), so a run never rescans raw rows
+# for the coarse levels.
+RESOLUTIONS = ("hour", "day", "week")
+
+BUCKET_SIZE = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+}
+
+# Buckets aggregated per query / transaction while catching up.
+CHUNK_BUCKETS = {"hour": 24, "day": 31, "week": 8}
+
+DEFAULT_MAX_POINTS = 500
+
+AGGREGATE_FIELDS = ["reading_count"] + [
+    f"{name}_{part}" for name in MEASUREMENTS for part in ("min", "max", "mean", "count")
+]
+
+
+def floor_bucket(moment, resolution):
+    """
+    Start of the bucket containing ``moment``, in the current time zone
+    (the same boundaries Trunc uses in SQL).
+    """
+    local = timezone.localtime(moment)
+    start = local.replace(minute=0, second=0, microsecond=0)
+    if resolution in ("day", "week"):
+        start = start.replace(hour=0)
+    if resolution == "week":
+        start -= timedelta(days=start.weekday())
+    return start
+
+
+def _raw_aggregates():
+    aggregates = {"reading_count": Count("id")}
+    for name in MEASUREMENTS:
+        clean = clean_condition(name) if exclude_anomalies() else None
+        aggregates[f"{name}_min"] = Min(name, filter=clean)
+        aggregates[f"{name}_max"] = Max(name, filter=clean)
+        aggregates[f"{name}_mean"] = Avg(name, filter=clean)
+        aggregates[f"{name}_count"] = Count(name, filter=clean)
+    return aggregates
+
+
+def _rollup_aggregates():
+    aggregates = {"reading_count": Sum("reading_count")}
+    for name in MEASUREMENTS:
+        count = f"{name}_count"
+        aggregates[f"{name}_min"] = Min(f"{name}_min")
+        aggregates[f"{name}_max"] = Max(f"{name}_max")
+        # Weighted by the finer bucket's sample count; NULL when no samples.
+        aggregates[f"_{name}_total"] = Sum(F(f"{name}_mean") * F(count))
+        aggregates[count] = Sum(count)
+    return aggregates
+
+
+def _source_rows(resolution, start, end):
+    if resolution == "hour":
+        source = SensorReading.objects.filter(recorded_at__gte=start, recorded_at__lt=end)
+        time_field, aggregates = "recorded_at", _raw_aggregates()
+    else:
+        finer = RESOLUTIONS[RESOLUTIONS.index(resolution) - 1]
+        source = ReadingAggregate.objects.filter(
+            resolution=finer, bucket_start__gte=start, bucket_start__lt=end
+        )
+        time_field, aggregates = "bucket_start", _rollup_aggregates()
+
+    rows = (
+        source.order_by()
+        .annotate(bucket=Trunc(time_field, resolution))
+        .values("sensor_id", "bucket")
+        .annotate(**aggregates)
+    )
+    for row in rows:
+        for name in MEASUREMENTS:
+            total = row.pop(f"_{name}_total", None)
+            if total is not None:
+                row[f"{name}_mean"] = total / row[f"{name}_count"]
+        yield row
+
+
+def _source_start(resolution, after=None):
+    """
+    Bucket holding the first source row (at or after ``after``), or None.
+    """
+    if resolution == "hour":
+        source = SensorReading.objects.order_by("recorded_at")
+        if after is not None:
+            source = source.filter(recorded_at__gte=after)
+        first = source.values_list("recorded_at", flat=True).first()
+    else:
+        finer = RESOLUTIONS[RESOLUTIONS.index(resolution) - 1]
+        source = ReadingAggregate.objects.filter(resolution=finer).order_by("bucket_start")
+        if after is not None:
+            source = source.filter(bucket_start__gte=after)
+        first = source.values_list("bucket_start", flat=True).first()
+    return floor_bucket(first, resolution) if first else None
+
+
+def _source_limit(resolution, watermarks, now):
+    """
+    Only closed buckets are processed: for hours that is everything before the
+    current hour; coarser levels also wait for the finer level to catch up.
+    """
+    if resolution == "hour":
+        return floor_bucket(now, "hour")
+    finer_done = watermarks.get(RESOLUTIONS[RESOLUTIONS.index(resolution) - 1])
+    if finer_done is None:
+        return None
+    return floor_bucket(min(finer_done, now), resolution)
+
+
+def downsample(resolution, watermarks, now=None):
+    """
+    Aggregate every closed, not yet processed bucket of ``resolution``.
+    Returns the number of aggregate rows written.
+    """
+    now = now or timezone.now()
+    state, _ = DownsampleState.objects.get_or_create(resolution=resolution)
+
+    limit = _source_limit(resolution, watermarks, now)
+    start = state.processed_until or _source_start(resolution)
+    if state.late_since is not None:
+        # Late readings arrived behind the watermark: redo their buckets.
+        # Cleared only if no earlier one was noted since it was read.
+        DownsampleState.objects.filter(pk=state.pk, late_since=state.late_since).update(late_since=None)
+        late, boundary = state.late_since, archived_until()
+        if boundary is not None and late < boundary:
+            late = boundary
+        late = floor_bucket(late, resolution)
+        start = min(start, late) if start else late
+    if limit is None or start is None:
+        watermarks[resolution] = state.processed_until
+        return 0
+
+    written = 0
+    chunk = BUCKET_SIZE[resolution] * CHUNK_BUCKETS[resolution]
+    while start < limit:
+        end = min(floor_bucket(start + chunk, resolution), limit)
+        aggregates = [
+            ReadingAggregate(
+                resolution=resolution,
+                sensor_id=row.pop("sensor_id"),
+                bucket_start=row.pop("bucket"),
+                **row,
+            )
+            for row in _source_rows(resolution, start, end)
+        ]
+        next_start = end
+        if not aggregates:
+            # Skip over gaps (e.g. a network outage) in one lookup.
+            next_start = max(end, min(_source_start(resolution, after=end) or limit, limit))
+
+        with transaction.atomic():
+            ReadingAggregate.objects.bulk_create(
+                aggregates,
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=["resolution", "sensor", "bucket_start"],
+                update_fields=AGGREGATE_FIELDS,
+            )
+            state.processed_until = next_start
+            state.save(update_fields=["processed_until", "updated_at"])
+        written += len(aggregates)
+        start = next_start
+
+    watermarks[resolution] = state.processed_until
+    return written
+
+
+def run_downsampling(now=None):
+    """
+    One incremental pass over all resolutions, finest first.
+    Returns {resolution: rows written}.
+    """
+    watermarks = {}
+    return {
+        resolution: downsample(resolution, watermarks, now=now)
+        for resolution in RESOLUTIONS
+    }
+
+
+def note_late_readings(readings):
+    """
+    Note the earliest of ``readings`` (being ingested) on each resolution
+    whose watermark it is behind, so the next run recomputes its buckets.
+    One UPDATE, in the caller's transaction.
+    """
+    if not readings:
+        return
+    earliest = min(reading.recorded_at for reading in readings)
+    DownsampleState.objects.filter(processed_until__gt=earliest).filter(
+        Q(late_since__isnull=True) | Q(late_since__gt=earliest)
+    ).update(late_since=earliest)
+
+
+def reset_downsampling(since):
+    """
+    Forget every bucket from ``since`` on so the next run recomputes it,
+    e.g. after readings were deleted (late ones are noted at ingest, see
+    note_late_readings). Buckets of
+    archived months are kept: their raw readings are no longer there to
+    recompute them from.
+    """
+    boundary = archived_until()
+    if boundary is not None and since < boundary:
+        since = boundary
+    with transaction.atomic():
+        for resolution in RESOLUTIONS:
+            boundary = floor_bucket(since, resolution)
+            ReadingAggregate.objects.filter(
+                resolution=resolution, bucket_start__gte=boundary
+            ).delete()
+            DownsampleState.objects.filter(
+                resolution=resolution, processed_until__gt=boundary
+            ).update(processed_until=boundary)
+
+
+def choose_resolution(start, end, max_points=DEFAULT_MAX_POINTS):
+    """
+    Coarsest resolution needed to fit the range: the finest one that yields
+    at most ``max_points`` buckets per sensor (weeks if none does).
+    """
+    span = end - start
+    for resolution in RESOLUTIONS:
+        if span / BUCKET_SIZE[resolution] <= max_points:
+            return resolution
+    return RESOLUTIONS[-1]
+
+
+def get_series(start, end, sensor_ids=None, resolution=None, max_points=DEFAULT_MAX_POINTS):
+    """
+    Downsampled readings between ``start`` and ``end``.
+    Returns (resolution, queryset of ReadingAggregate ordered by bucket).
+    """
+    resolution = resolution or choose_resolution(start, end, max_points)
+    series = ReadingAggregate.objects.filter(
+        resolution=resolution,
+        bucket_start__gte=floor_bucket(start, resolution),
+        bucket_start__lt=end,
+    )
+    if sensor_ids is not None:
+        series = series.filter(sensor_id__in=sensor_ids)
+    return resolution, series.order_by("sensor_id", "bucket_start")
@@ -0,0 +1,177 @@
+"""
+Streaming reading exports (CSV, Parquet).
+
+Rows are pulled with ``values_list(...).iterator(chunk_size=...)`` and
+written out chunk by chunk, so memory stays flat however many readings a
+cooperative has. Parquet needs the optional ``pyarrow`` package.
+"""
+import csv
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import QuerySet
+
+from .models import SensorReading
+
+
+EXPORT_COLUMNS = (
+    "id",
+    "sensor_id",
+    "field_id",
+    "cooperative_id",
+    "recorded_at",
+) + SensorReading.MEASUREMENTS
+
+# ORM paths for EXPORT_COLUMNS ("sensor_id" in the export is the device id).
+_VALUE_PATHS = (
+    "id",
+    "sensor__sensor_id",
+    "field_id",
+    "cooperative_id",
+    "recorded_at",
+) + SensorReading.MEASUREMENTS
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+class ExportUnavailable(Exception):
+    pass
+
+
+def get_chunk_size():
+    return getattr(settings, "SOILTRACK_EXPORT_CHUNK_SIZE", DEFAULT_CHUNK_SIZE)
+
+
+def export_queryset(coop_id=None, field_id=None, sensor_id=None, start=None, end=None):
+    readings = SensorReading.objects.for_scope(coop_id, field_id, sensor_id)
+    if start is not None:
+        readings = readings.filter(recorded_at__gte=start)
+    if end is not None:
+        readings = readings.filter(recorded_at__lt=end)
+    return readings.order_by("recorded_at", "id")
+
+
+def iter_rows(readings, chunk_size=None):
+    """
+    Export rows for a queryset; any other iterable is taken to yield
+    export rows already (e.g. tracker.archive.iter_readings).
+    """
+    if not isinstance(readings, QuerySet):
+        return iter(readings)
+    return readings.values_list(*_VALUE_PATHS).iterator(
+        chunk_size=chunk_size or get_chunk_size()
+    )
+
+
+def _iter_chunks(rows, chunk_size):
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class _Buffer:
+    """
+    Minimal file object: collects what a writer produces until drained.
+    """
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def stream_csv(readings, chunk_size=None):
+    """
+    Yield the export as CSV byte chunks, one per fetched chunk of rows.
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    buffer = _Buffer()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for chunk in _iter_chunks(iter_rows(readings, chunk_size), chunk_size):
+        writer.writerows(
+            row[:4] + (row[4].isoformat(),) + row[5:] for row in chunk
+        )
+        yield buffer.drain()
+    yield buffer.drain()
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ExportUnavailable("Parquet export needs the pyarrow package")
+    return pyarrow, pyarrow.parquet
+
+
+def _arrow_schema(pa):
+    return pa.schema(
+        [
+            ("id", pa.int64()),
+            ("sensor_id", pa.string()),
+            ("field_id", pa.int64()),
+            ("cooperative_id", pa.int64()),
+            ("recorded_at", pa.timestamp("us", tz="UTC")),
+        ]
+        + [(name, pa.float64()) for name in SensorReading.MEASUREMENTS]
+    )
+
+
+def stream_parquet(readings, chunk_size=None):
+    """
+    Yield the export as Parquet bytes, one row group per fetched chunk.
+    """
+    pa, pq = _import_pyarrow()
+    chunk_size = chunk_size or get_chunk_size()
+    schema = _arrow_schema(pa)
+    buffer = _Buffer()
+    writer = pq.ParquetWriter(buffer, schema, compression="zstd")
+    try:
+        for chunk in _iter_chunks(iter_rows(readings, chunk_size), chunk_size):
+            columns = list(zip(*chunk))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=schema.field(i).type) for i, column in enumerate(columns)],
+                schema=schema,
+            ))
+            yield buffer.drain()
+    finally:
+        writer.close()
+    yield buffer.drain()
+
+
+def stream_export(readings, export_format, chunk_size=None):
+    if export_format == "csv":
+        return stream_csv(readings, chunk_size)
+    if export_format == "parquet":
+        # Fail before the response starts rather than mid-stream.
+        _import_pyarrow()
+        return stream_parquet(readings, chunk_size)
+    raise ValueError(f"unknown export format {export_format!r}")
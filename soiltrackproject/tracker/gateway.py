@@ -0,0 +1,560 @@
+"""
+Pub/sub gateway listener (``manage.py run_gateway_listener``).
+
+Gateways publish each sensor's readings to
+``<prefix>/<cooperative id>/sensors/<sensor id>`` as compact JSON: one
+object, or a list of them, with short keys
+
+    {"t": 1760000000, "b": 87, "ph": 6.4, "m": 31.2, "tc": 21.5,
+     "n": 120, "p": 40, "k": 180, "ec": 0.8}
+
+(t = unix time, b = battery; any key may be left out), or in the packed
+binary format of tracker.packed. The listener
+subscribes to every cooperative (or the ones given), decodes messages as
+they arrive and writes them through tracker.ingest in batches of
+SOILTRACK_INGEST_BATCH_SIZE, or after SOILTRACK_INGEST_FLUSH_SECONDS for a
+partial batch. A lost connection flushes what is pending and reconnects
+with exponential backoff; the subscriptions are persistent (QoS 1, no
+clean session), so the broker keeps messages for us meanwhile. A failed
+write keeps its batch and is retried with the same backoff; a message
+that cannot be decoded is counted as rejected and skipped.
+
+A gateway may only report for sensors of the cooperative in its topic:
+readings for a sensor registered to another cooperative are rejected.
+While the database is down readings pile up in memory, at most
+SOILTRACK_INGEST_BUFFER_SIZE of them; messages that arrive when that is
+full are dropped and counted, rather than exhausting memory.
+
+Brokers are reached through a small client interface (connect, subscribe,
+receive, disconnect). MQTTClient speaks MQTT through the optional
+``paho-mqtt`` package; FakeBroker is an in-process stand-in for tests and
+benchmarks.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field as dataclass_field
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+
+from . import packed
+from .buffer import DEFAULT_BUFFER_SIZE
+from .ingest import IngestResult, get_batch_size, ingest_parsed, parse_records
+from .models import Sensor
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOPIC_PREFIX = "soiltrack"
+DEFAULT_FLUSH_SECONDS = 1.0
+# How long a sensor's cooperative is remembered before it is looked up again.
+SENSOR_CACHE_SECONDS = 60.0
+
+# Payload key -> SensorReading field.
+SHORT_KEYS = {
+    "ph": "ph",
+    "m": "moisture",
+    "tc": "temperature",
+    "n": "nitrogen",
+    "p": "phosphorus",
+    "k": "potassium",
+    "ec": "conductivity",
+}
+
+
+class GatewayUnavailable(Exception):
+    pass
+
+
+class PayloadError(ValueError):
+    pass
+
+
+@dataclass
+class Message:
+    topic: str
+    payload: bytes
+
+
+def get_topic_prefix():
+    return getattr(settings, "SOILTRACK_MQTT_TOPIC_PREFIX", DEFAULT_TOPIC_PREFIX)
+
+
+def sensor_topic(cooperative_id, sensor_id, prefix=None):
+    return f"{prefix or get_topic_prefix()}/{cooperative_id}/sensors/{sensor_id}"
+
+
+def subscriptions(cooperative_ids=None, prefix=None):
+    prefix = prefix or get_topic_prefix()
+    if not cooperative_ids:
+        return [f"{prefix}/+/sensors/+"]
+    return [f"{prefix}/{coop_id}/sensors/+" for coop_id in cooperative_ids]
+
+
+def topic_matches(pattern, topic):
+    """
+    MQTT topic filter matching: ``+`` is one level, a final ``#`` the rest.
+    """
+    pattern_levels = pattern.split("/")
+    topic_levels = topic.split("/")
+    for i, level in enumerate(pattern_levels):
+        if level == "#":
+            return True
+        if i >= len(topic_levels) or level not in ("+", topic_levels[i]):
+            return False
+    return len(pattern_levels) == len(topic_levels)
+
+
+def decode_payload(payload):
+    """
+    Raw reading records (as tracker.ingest.parse_record takes them) from
+    one message. Compact JSON carries no sensor_id, the topic gives it;
+    packed binary payloads (tracker.packed) name their sensors.
+    """
+    if payload[:len(packed.MAGIC)] == packed.MAGIC:
+        try:
+            return packed.decode(payload)
+        except packed.PackedError as exc:
+            raise PayloadError(str(exc))
+
+    try:
+        data = json.loads(payload)
+    except (ValueError, UnicodeDecodeError):
+        raise PayloadError("payload is not valid JSON")
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list):
+        raise PayloadError("payload must be an object or a list of objects")
+
+    records = []
+    for item in data:
+        if not isinstance(item, dict):
+            raise PayloadError("payload must be an object or a list of objects")
+        record = {name: item[key] for key, name in SHORT_KEYS.items() if key in item}
+        if "t" in item:
+            record["recorded_at"] = item["t"]
+        if "b" in item:
+            record["battery_level"] = item["b"]
+        records.append(record)
+    return records
+
+
+def encode_payload(readings):
+    """
+    Compact JSON for a list of reading dicts (the reverse of decode_payload;
+    used by simulators and tests).
+    """
+    long_keys = {name: key for key, name in SHORT_KEYS.items()}
+    long_keys.update(recorded_at="t", battery_level="b")
+    items = [
+        {long_keys[name]: value for name, value in reading.items() if name in long_keys}
+        for reading in readings
+    ]
+    return json.dumps(items[0] if len(items) == 1 else items, separators=(",", ":")).encode()
+
+
+# =========================
+# STATS
+# =========================
+@dataclass
+class TopicStats:
+    messages: int = 0
+    readings: int = 0
+    rejected: int = 0
+    bytes: int = 0
+
+
+@dataclass
+class ListenerStats:
+    topics: dict = dataclass_field(default_factory=dict)   # topic filter -> TopicStats
+    messages: int = 0
+    flushes: int = 0
+    written: int = 0
+    rejected: int = 0           # dropped at write time (unknown sensor)
+    disconnects: int = 0
+    connect_failures: int = 0
+    write_failures: int = 0
+    dropped: int = 0            # readings dropped with the pending queue full
+    started: float = dataclass_field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def rates(self):
+        """
+        {topic: (messages/s, readings/s)} since the listener started.
+        """
+        elapsed = self.elapsed or 1e-9
+        return {
+            name: (topic.messages / elapsed, topic.readings / elapsed)
+            for name, topic in sorted(self.topics.items())
+        }
+
+
+# =========================
+# LISTENER
+# =========================
+class GatewayListener:
+    def __init__(
+        self,
+        client,
+        topics,
+        batch_size=None,
+        flush_seconds=None,
+        max_pending=None,
+        reconnect_min=1.0,
+        reconnect_max=60.0,
+        report=None,
+        report_every=60.0,
+        sleep=time.sleep,
+    ):
+        self.client = client
+        self.topics = list(topics)
+        self.batch_size = batch_size or get_batch_size()
+        self.flush_seconds = flush_seconds if flush_seconds is not None else getattr(
+            settings, "SOILTRACK_INGEST_FLUSH_SECONDS", DEFAULT_FLUSH_SECONDS
+        )
+        self.max_pending = max_pending or getattr(
+            settings, "SOILTRACK_INGEST_BUFFER_SIZE", DEFAULT_BUFFER_SIZE
+        )
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        self.report = report
+        self.report_every = report_every
+        self.sleep = sleep
+        self.stats = ListenerStats()
+        self.connected = False
+        self._stopping = False
+        self._pending = []
+        self._oldest = None
+        self._retry_at = None
+        self._retry_delay = reconnect_min
+        self._last_report = time.monotonic()
+        self._cooperatives = {}     # sensor id -> cooperative id
+        self._cooperatives_at = None
+        self._dropping = False
+
+    def stop(self):
+        """
+        Ask run() to flush and return (safe from a signal handler).
+        """
+        self._stopping = True
+
+    def run(self, max_messages=None, idle_timeout=None):
+        """
+        Listen until stop(), until ``max_messages`` have been handled, or
+        until nothing arrived for ``idle_timeout`` seconds.
+        """
+        self._stopping = False
+        self.stats.started = time.monotonic()
+        idle_since = time.monotonic()
+        try:
+            while not self._stopping:
+                if max_messages is not None and self.stats.messages >= max_messages:
+                    break
+                if not self.connected:
+                    self._connect()
+                    continue
+                try:
+                    message = self.client.receive(self._receive_timeout())
+                except ConnectionError:
+                    self.connected = False
+                    self.stats.disconnects += 1
+                    self.flush()
+                    continue
+
+                now = time.monotonic()
+                if message is not None:
+                    self.handle(message)
+                    idle_since = now
+                elif idle_timeout is not None and now - idle_since >= idle_timeout:
+                    break
+                if self._due():
+                    self.flush()
+                if self.report and now - self._last_report >= self.report_every:
+                    self._last_report = now
+                    self.report(self.stats)
+        finally:
+            self.flush()
+            if self._pending:
+                logger.error("gateway listener: %d readings not written", len(self._pending))
+            if self.connected:
+                self.client.disconnect()
+                self.connected = False
+        return self.stats
+
+    def _connect(self):
+        delay = self.reconnect_min
+        while not self._stopping:
+            try:
+                self.client.connect()
+                for topic in self.topics:
+                    self.client.subscribe(topic)
+            except ConnectionError:
+                self.stats.connect_failures += 1
+                self.sleep(delay)
+                delay = min(delay * 2, self.reconnect_max)
+                continue
+            self.connected = True
+            return
+
+    def _receive_timeout(self):
+        # Wake up at least once a second so stop() is noticed.
+        if self._oldest is None:
+            return 1.0
+        flush_at = self._oldest + self.flush_seconds
+        if self._retry_at is not None:
+            flush_at = max(flush_at, self._retry_at)
+        return min(max(flush_at - time.monotonic(), 0), 1.0)
+
+    def _due(self):
+        if self._retry_at is not None and time.monotonic() < self._retry_at:
+            return False
+        return bool(self._pending) and (
+            len(self._pending) >= self.batch_size
+            or time.monotonic() - self._oldest >= self.flush_seconds
+        )
+
+    def handle(self, message):
+        levels = message.topic.split("/")
+        valid = len(levels) == 4 and levels[2] == "sensors" and levels[3]
+        # Counted per cooperative topic; per sensor would be one counter per device.
+        name = "/".join(levels[:3] + ["+"]) if valid else message.topic
+        topic = self.stats.topics.get(name)
+        if topic is None:
+            topic = self.stats.topics[name] = TopicStats()
+        topic.messages += 1
+        self.stats.messages += 1
+        topic.bytes += len(message.payload)
+        if not valid:
+            topic.rejected += 1
+            return
+        cooperative_id, sensor_id = levels[1], levels[3]
+
+        result = IngestResult()
+        try:
+            records = decode_payload(message.payload)
+            for record in records:
+                record.setdefault("sensor_id", sensor_id)
+            parsed = parse_records(records, result)
+        except PayloadError:
+            topic.rejected += 1
+            return
+        except Exception:
+            # One bad message must not stop the listener.
+            logger.exception("gateway listener: could not decode a message on %s", message.topic)
+            topic.rejected += 1
+            return
+        topic.rejected += result.rejected
+
+        cooperatives = self._cooperatives_of({row[1] for row in parsed})
+        accepted = [row for row in parsed if cooperatives.get(row[1], cooperative_id) == cooperative_id]
+        if len(accepted) < len(parsed):
+            logger.warning(
+                "gateway listener: rejected %d readings on %s for sensors of another cooperative",
+                len(parsed) - len(accepted), message.topic,
+            )
+            topic.rejected += len(parsed) - len(accepted)
+            parsed = accepted
+        topic.readings += len(parsed)
+
+        if len(self._pending) + len(parsed) > self.max_pending:
+            if not self._dropping:
+                logger.error("gateway listener: %d readings pending, dropping new messages", len(self._pending))
+                self._dropping = True
+            self.stats.dropped += len(parsed)
+            return
+        if parsed and not self._pending:
+            self._oldest = time.monotonic()
+        self._pending.extend(parsed)
+
+    def _cooperatives_of(self, sensor_ids):
+        """
+        {sensor id: cooperative id (as in topics)} for the known sensors
+        among ``sensor_ids``. Remembered for SENSOR_CACHE_SECONDS, so moved
+        sensors are picked up; unknown ones are left to the write to reject.
+        """
+        now = time.monotonic()
+        if self._cooperatives_at is None or now - self._cooperatives_at >= SENSOR_CACHE_SECONDS:
+            self._cooperatives = {}
+            self._cooperatives_at = now
+        missing = sensor_ids - self._cooperatives.keys()
+        if missing:
+            close_old_connections()
+            self._cooperatives.update(
+                (sensor_id, str(cooperative_id))
+                for sensor_id, cooperative_id in Sensor.objects.filter(
+                    sensor_id__in=missing
+                ).values_list("sensor_id", "field__cooperative_id")
+            )
+        return self._cooperatives
+
+    def flush(self):
+        """
+        Write the pending readings. On a database error the batch stays
+        pending and the next attempt waits, doubling up to reconnect_max.
+        """
+        while self._pending:
+            batch = self._pending[:self.batch_size]
+            # Long-running: drop connections the database has timed out.
+            close_old_connections()
+            try:
+                result = ingest_parsed(batch)
+            except DatabaseError:
+                logger.exception("gateway listener: could not write %d readings, will retry", len(batch))
+                self.stats.write_failures += 1
+                self._retry_at = time.monotonic() + self._retry_delay
+                self._retry_delay = min(self._retry_delay * 2, self.reconnect_max)
+                return
+            del self._pending[:len(batch)]
+            self._dropping = False
+            self._retry_at = None
+            self._retry_delay = self.reconnect_min
+            self.stats.flushes += 1
+            self.stats.written += result.accepted
+            self.stats.rejected += result.rejected
+        self._oldest = None
+
+
+# =========================
+# BROKER CLIENTS
+# =========================
+def _import_paho():
+    try:
+        import paho.mqtt.client as mqtt
+    except ImportError:
+        raise GatewayUnavailable("The gateway listener needs the paho-mqtt package")
+    return mqtt
+
+
+class MQTTClient:
+    """
+    paho-mqtt behind the listener's client interface. paho's network loop
+    runs in its own thread and hands messages over through a queue.
+    """
+    def __init__(self, host, port=1883, client_id="soiltrack-listener",
+                 username=None, password=None, keepalive=60, tls=False):
+        self.mqtt = _import_paho()
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.username = username
+        self.password = password
+        self.keepalive = keepalive
+        self.tls = tls
+        self._client = None
+        self._messages = queue.Queue()
+        self._lost = threading.Event()
+
+    def connect(self):
+        mqtt = self.mqtt
+        kwargs = {"client_id": self.client_id, "clean_session": False}
+        if hasattr(mqtt, "CallbackAPIVersion"):
+            kwargs["callback_api_version"] = mqtt.CallbackAPIVersion.VERSION2
+        client = mqtt.Client(**kwargs)
+        if self.username:
+            client.username_pw_set(self.username, self.password)
+        if self.tls:
+            client.tls_set()
+        client.on_message = lambda _client, _userdata, msg: self._messages.put(
+            Message(msg.topic, msg.payload)
+        )
+        client.on_disconnect = lambda *args: self._lost.set()
+        try:
+            client.connect(self.host, self.port, self.keepalive)
+        except OSError as exc:
+            raise ConnectionError(f"cannot reach {self.host}:{self.port}: {exc}")
+        self._lost.clear()
+        client.loop_start()
+        self._client = client
+
+    def subscribe(self, topic):
+        self._client.subscribe(topic, qos=1)
+
+    def receive(self, timeout):
+        try:
+            return self._messages.get(timeout=timeout)
+        except queue.Empty:
+            if self._lost.is_set():
+                self._close()
+                raise ConnectionError("connection to the broker lost")
+            return None
+
+    def disconnect(self):
+        if self._client is not None:
+            self._client.disconnect()
+            self._close()
+
+    def _close(self):
+        if self._client is not None:
+            self._client.loop_stop()
+            self._client = None
+
+
+class FakeBroker:
+    """
+    In-process broker stand-in. Sessions are persistent: messages for a
+    subscribed client are queued while it is disconnected.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sessions = {}       # client id -> queue of Messages
+        self.subscribed = {}     # client id -> [topic filters]
+        self.online = set()
+        self.refuse = 0          # refuse this many connection attempts
+
+    def client(self, client_id="soiltrack-listener"):
+        return FakeClient(self, client_id)
+
+    def publish(self, topic, payload):
+        with self._lock:
+            for client_id, patterns in self.subscribed.items():
+                if any(topic_matches(pattern, topic) for pattern in patterns):
+                    self.sessions[client_id].put(Message(topic, payload))
+
+    def drop(self, client_id=None):
+        """
+        Cut the connection of one client (or all), as a network failure would.
+        """
+        with self._lock:
+            if client_id is None:
+                self.online.clear()
+            else:
+                self.online.discard(client_id)
+
+
+class FakeClient:
+    def __init__(self, broker, client_id):
+        self.broker = broker
+        self.client_id = client_id
+
+    def connect(self):
+        broker = self.broker
+        with broker._lock:
+            if broker.refuse:
+                broker.refuse -= 1
+                raise ConnectionRefusedError("broker refused the connection")
+            broker.online.add(self.client_id)
+            broker.sessions.setdefault(self.client_id, queue.Queue())
+            broker.subscribed.setdefault(self.client_id, [])
+
+    def subscribe(self, topic):
+        with self.broker._lock:
+            patterns = self.broker.subscribed[self.client_id]
+            if topic not in patterns:
+                patterns.append(topic)
+
+    def receive(self, timeout):
+        if self.client_id not in self.broker.online:
+            raise ConnectionError("connection to the broker lost")
+        try:
+            return self.broker.sessions[self.client_id].get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def disconnect(self):
+        self.broker.drop(self.client_id)
@@ -0,0 +1,139 @@
+"""
+Sensor health: classifies every active sensor as online, stale, offline or
+low battery from last_seen, battery_level and how many readings it sent in
+the last window, and stores the result in SensorHealth.
+
+The whole evaluation is one INSERT ... SELECT ... ON CONFLICT statement
+(plus a cleanup for deactivated sensors and the status counts), so it
+runs in the same three queries for ten sensors or a hundred thousand.
+"""
+import time
+from dataclasses import dataclass, field as dataclass_field
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Sensor, SensorHealth, SensorReading
+
+
+DEFAULT_STALE_MINUTES = 120
+DEFAULT_OFFLINE_HOURS = 24
+DEFAULT_LOW_BATTERY = 20
+DEFAULT_MIN_DAILY_READINGS = 6
+
+
+@dataclass
+class HealthThresholds:
+    stale_after: timedelta = timedelta(minutes=DEFAULT_STALE_MINUTES)
+    offline_after: timedelta = timedelta(hours=DEFAULT_OFFLINE_HOURS)
+    low_battery: int = DEFAULT_LOW_BATTERY
+    min_daily_readings: int = DEFAULT_MIN_DAILY_READINGS
+
+
+def get_thresholds():
+    return HealthThresholds(
+        stale_after=timedelta(minutes=getattr(
+            settings, "SOILTRACK_SENSOR_STALE_MINUTES", DEFAULT_STALE_MINUTES
+        )),
+        offline_after=timedelta(hours=getattr(
+            settings, "SOILTRACK_SENSOR_OFFLINE_HOURS", DEFAULT_OFFLINE_HOURS
+        )),
+        low_battery=getattr(settings, "SOILTRACK_SENSOR_LOW_BATTERY", DEFAULT_LOW_BATTERY),
+        min_daily_readings=getattr(
+            settings, "SOILTRACK_SENSOR_MIN_DAILY_READINGS", DEFAULT_MIN_DAILY_READINGS
+        ),
+    )
+
+
+@dataclass
+class HealthRun:
+    counts: dict = dataclass_field(default_factory=dict)
+    elapsed: float = 0.0
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+
+def _evaluate_sql():
+    qn = connection.ops.quote_name
+    health = qn(SensorHealth._meta.db_table)
+    sensors = qn(Sensor._meta.db_table)
+    readings = qn(SensorReading._meta.db_table)
+    columns = ["sensor_id", "status", "battery_level", "last_seen", "recent_readings", "checked_at"]
+    updates = ", ".join(f"{qn(column)} = excluded.{qn(column)}" for column in columns[1:])
+
+    # Offline wins over everything (its battery level is old news), then a
+    # low battery, then a sensor that reports late or too rarely.
+    return f"""
+        INSERT INTO {health} ({", ".join(map(qn, columns))})
+        SELECT s.{qn("id")},
+            CASE
+                WHEN s.{qn("last_seen")} IS NULL OR s.{qn("last_seen")} < %(offline_before)s THEN 'offline'
+                WHEN s.{qn("battery_level")} < %(low_battery)s THEN 'low_battery'
+                WHEN s.{qn("last_seen")} < %(stale_before)s
+                    OR COALESCE(r.n, 0) < %(min_readings)s THEN 'stale'
+                ELSE 'online'
+            END,
+            s.{qn("battery_level")},
+            s.{qn("last_seen")},
+            COALESCE(r.n, 0),
+            %(now)s
+        FROM {sensors} s
+        LEFT JOIN (
+            SELECT {qn("sensor_id")}, COUNT(*) AS n
+            FROM {readings}
+            WHERE {qn("recorded_at")} >= %(window_start)s
+            GROUP BY {qn("sensor_id")}
+        ) r ON r.{qn("sensor_id")} = s.{qn("id")}
+        WHERE s.{qn("is_active")}
+        ON CONFLICT ({qn("sensor_id")}) DO UPDATE SET {updates}
+    """
+
+
+def _cleanup_sql():
+    qn = connection.ops.quote_name
+    return (
+        f"DELETE FROM {qn(SensorHealth._meta.db_table)} WHERE {qn('sensor_id')} IN "
+        f"(SELECT {qn('id')} FROM {qn(Sensor._meta.db_table)} WHERE NOT {qn('is_active')})"
+    )
+
+
+def evaluate_sensor_health(now=None, thresholds=None):
+    """
+    Reclassify every active sensor and drop health rows of deactivated
+    ones. The reading rate is the number of readings in the 24 hours
+    before ``now``.
+    """
+    started = time.perf_counter()
+    now = now or timezone.now()
+    thresholds = thresholds or get_thresholds()
+    adapt = connection.ops.adapt_datetimefield_value
+    params = {
+        "now": adapt(now),
+        "offline_before": adapt(now - thresholds.offline_after),
+        "stale_before": adapt(now - thresholds.stale_after),
+        "window_start": adapt(now - timedelta(days=1)),
+        "low_battery": thresholds.low_battery,
+        "min_readings": thresholds.min_daily_readings,
+    }
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(_evaluate_sql(), params)
+        cursor.execute(_cleanup_sql())
+
+    return HealthRun(counts=health_counts(), elapsed=time.perf_counter() - started)
+
+
+def health_counts():
+    """
+    {status: sensors} for every status, zeros included.
+    """
+    counts = dict.fromkeys((status for status, _ in SensorHealth.STATUS_CHOICES), 0)
+    counts.update(
+        SensorHealth.objects.order_by().values_list("status").annotate(total=Count("pk"))
+    )
+    return counts
@@ -0,0 +1,279 @@
+import math
+import time
+from datetime import datetime, timezone as dt_timezone
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Sensor, SensorReading
+from .alerts import evaluate_alerts
+from .analytics import invalidate_analytics
+from .anomalies import flag_readings, save_baselines
+from .current import apply_current
+from .downsampling import note_late_readings
+from .rollups import apply_readings
+from .stats import invalidate_dashboard_stats
+
+
+# Measurement columns a gateway may send for a reading.
+READING_FIELDS = SensorReading.MEASUREMENTS
+
+DEFAULT_BATCH_SIZE = 1000
+
+# How many rejection reasons we echo back per batch (the counts are always exact).
+MAX_REPORTED_ERRORS = 50
+
+
+def get_batch_size():
+    return getattr(settings, "SOILTRACK_INGEST_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+
+
+@dataclass
+class IngestResult:
+    """
+    Outcome of ingesting one batch (or several, when merged).
+    """
+    received: int = 0
+    accepted: int = 0
+    rejected: int = 0
+    sensors_updated: int = 0
+    anomalies: int = 0
+    alerts: int = 0
+    elapsed: float = 0.0
+    errors: list = field(default_factory=list)
+
+    @property
+    def rows_per_sec(self):
+        if not self.elapsed:
+            return 0.0
+        return self.accepted / self.elapsed
+
+    def reject(self, index, reason):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"index": index, "error": reason})
+
+    def merge(self, other):
+        self.received += other.received
+        self.accepted += other.accepted
+        self.rejected += other.rejected
+        self.sensors_updated += other.sensors_updated
+        self.anomalies += other.anomalies
+        self.alerts += other.alerts
+        self.elapsed += other.elapsed
+        room = MAX_REPORTED_ERRORS - len(self.errors)
+        if room > 0:
+            self.errors.extend(other.errors[:room])
+
+    def as_dict(self):
+        return {
+            "received": self.received,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "sensors_updated": self.sensors_updated,
+            "anomalies": self.anomalies,
+            "alerts": self.alerts,
+            "elapsed_ms": round(self.elapsed * 1000, 2),
+            "rows_per_sec": round(self.rows_per_sec, 1),
+            "errors": self.errors,
+        }
+
+
+class RecordError(ValueError):
+    pass
+
+
+def _parse_timestamp(value, now):
+    if value in (None, ""):
+        return now
+    try:
+        if isinstance(value, (int, float)):
+            return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+        # None when malformed, ValueError when well-formed but out of range.
+        parsed = parse_datetime(str(value))
+    except (OverflowError, OSError, ValueError):
+        raise RecordError(f"invalid recorded_at {value!r}")
+    if parsed is None:
+        raise RecordError(f"invalid recorded_at {value!r}")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _parse_measurement(name, value):
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise RecordError(f"invalid {name} {value!r}")
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise RecordError(f"invalid {name} {value!r}")
+    if not math.isfinite(value):
+        raise RecordError(f"invalid {name} {value!r}")
+    return value
+
+
+def _parse_battery(value):
+    if value is None:
+        return None
+    try:
+        battery = int(value)
+    except (TypeError, ValueError):
+        raise RecordError(f"invalid battery_level {value!r}")
+    if not 0 <= battery <= 100:
+        raise RecordError(f"battery_level out of range {battery}")
+    return battery
+
+
+def parse_record(record, now):
+    """
+    Validate one raw record (a dict from JSON) into
+    (sensor_id, recorded_at, measurements, battery_level).
+    """
+    if not isinstance(record, dict):
+        raise RecordError("record must be an object")
+
+    sensor_id = record.get("sensor_id")
+    if not sensor_id:
+        raise RecordError("missing sensor_id")
+
+    measurements = {}
+    for name in READING_FIELDS:
+        if name in record:
+            measurements[name] = _parse_measurement(name, record[name])
+    if not any(v is not None for v in measurements.values()):
+        raise RecordError("no measurements")
+
+    recorded_at = _parse_timestamp(record.get("recorded_at"), now)
+    battery = _parse_battery(record.get("battery_level"))
+    return str(sensor_id), recorded_at, measurements, battery
+
+
+def parse_records(records, result, now=None, offset=0):
+    """
+    Validate raw records into parsed rows for write_readings, rejecting
+    invalid ones on ``result``. Records without recorded_at get ``now``.
+    """
+    now = now or timezone.now()
+    parsed = []
+    for index, record in enumerate(records, start=offset):
+        try:
+            parsed.append((index,) + parse_record(record, now))
+        except RecordError as exc:
+            result.reject(index, str(exc))
+    return parsed
+
+
+def _readings_committed():
+    # bulk_create sends no post_save, so the dashboard snapshot's readings
+    # total is not refreshed by tracker.signals.
+    invalidate_analytics("readings")
+    invalidate_dashboard_stats()
+
+
+def write_readings(parsed, result):
+    """
+    Write parsed rows (from parse_records) in one transaction.
+
+    Sensors are resolved with a single lookup, readings are written with
+    bulk_create and sensor last_seen / battery_level with one bulk_update.
+    Readings are screened for anomalies before they are written; sensor
+    rollups, current readings, anomaly baselines, downsampling watermarks
+    (for late readings) and alert rules are updated in the same
+    transaction; cached analytics and dashboard counters are invalidated
+    once it commits. Unknown sensors are rejected on ``result``.
+    """
+    sensor_ids = {row[1] for row in parsed}
+    sensors = (
+        Sensor.objects
+        .select_related("field", "anomaly_state")
+        .in_bulk(sensor_ids, field_name="sensor_id")
+    )
+
+    readings = []
+    touched = {}
+    for index, sensor_id, recorded_at, measurements, battery in parsed:
+        sensor = sensors.get(sensor_id)
+        if sensor is None:
+            result.reject(index, f"unknown sensor {sensor_id}")
+            continue
+
+        readings.append(
+            SensorReading(
+                sensor=sensor,
+                field_id=sensor.field_id,
+                cooperative_id=sensor.field.cooperative_id,
+                recorded_at=recorded_at,
+                **measurements,
+            )
+        )
+
+        # Keep only the newest state per sensor for the bulk update.
+        if sensor.last_seen is None or recorded_at >= sensor.last_seen:
+            sensor.last_seen = recorded_at
+            if battery is not None:
+                sensor.battery_level = battery
+            touched[sensor.pk] = sensor
+
+    baselines, result.anomalies = flag_readings(readings)
+
+    with transaction.atomic():
+        SensorReading.objects.bulk_create(readings, batch_size=get_batch_size())
+        save_baselines(baselines)
+        if touched:
+            Sensor.objects.bulk_update(touched.values(), ["last_seen", "battery_level"])
+        apply_readings(readings)
+        apply_current(readings)
+        note_late_readings(readings)
+        result.alerts = evaluate_alerts(readings)
+    if readings:
+        transaction.on_commit(_readings_committed)
+
+    result.accepted = len(readings)
+    result.sensors_updated = len(touched)
+    return result
+
+
+def ingest_batch(records, offset=0):
+    """
+    Ingest one batch of raw reading records (see write_readings).
+    Invalid records and unknown sensors are rejected individually; the rest
+    of the batch is still written. ``offset`` shifts the record indexes
+    reported in errors when the batch is part of a larger payload.
+    """
+    started = time.perf_counter()
+    result = IngestResult(received=len(records))
+    write_readings(parse_records(records, result, offset=offset), result)
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def ingest_parsed(parsed):
+    """
+    Write rows that were validated earlier (the ingest buffer parses on
+    arrival and writes later).
+    """
+    started = time.perf_counter()
+    result = IngestResult(received=len(parsed))
+    write_readings(parsed, result)
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def ingest_records(records, batch_size=None):
+    """
+    Ingest any number of records, split into batches of ``batch_size``.
+    Returns the merged result plus the per-batch results.
+    """
+    batch_size = batch_size or get_batch_size()
+    total = IngestResult()
+    batches = []
+    for start in range(0, len(records), batch_size):
+        batch_result = ingest_batch(records[start:start + batch_size], offset=start)
+        batches.append(batch_result)
+        total.merge(batch_result)
+    return total, batches
@@ -0,0 +1,230 @@
+"""
+Load-test harness for the ingestion endpoints.
+
+GatewaySimulator stands in for a field gateway: it posts JSON batches of
+readings for its share of the sensors, as fast as it can (or every
+``interval`` seconds), and backs off briefly when told 429. run_load
+drives many of them concurrently over a transport: ASGITransport calls the
+ASGI application in-process (used by ``manage.py benchmark
+buffered_ingest``), HTTPTransport speaks HTTP/1.1 to a running server
+(used by ``manage.py simulate_gateways``).
+"""
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import Counter
+from dataclasses import dataclass, field as dataclass_field
+from urllib.parse import urlsplit
+
+from django.utils import timezone
+
+from .benchmarks import reading_values
+
+
+@dataclass
+class LoadResult:
+    requests: int = 0
+    statuses: Counter = dataclass_field(default_factory=Counter)
+    readings_sent: int = 0
+    readings_accepted: int = 0
+    latencies: list = dataclass_field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def readings_per_sec(self):
+        return self.readings_accepted / self.elapsed if self.elapsed else 0.0
+
+    def latency(self, percentile):
+        if not self.latencies:
+            return 0.0
+        if len(self.latencies) == 1:
+            return self.latencies[0]
+        return statistics.quantiles(self.latencies, n=100)[percentile - 1]
+
+    def summary(self):
+        statuses = ", ".join(f"{status}: {count:,}" for status, count in sorted(self.statuses.items()))
+        return (
+            f"{self.requests:,} requests ({statuses}) in {self.elapsed:.2f}s, "
+            f"{self.readings_per_sec:,.0f} readings/s accepted, latency "
+            f"p50 {self.latency(50) * 1000:.1f} ms / p95 {self.latency(95) * 1000:.1f} ms"
+        )
+
+
+# =========================
+# TRANSPORTS
+# =========================
+class ASGITransport:
+    """
+    Calls an ASGI application directly, without a server or sockets.
+    """
+    def __init__(self, application, server=("localhost", 80)):
+        self.application = application
+        self.server = server
+
+    def connect(self):
+        return self
+
+    async def post(self, path, body, headers):
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "POST",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [
+                (name.lower().encode(), value.encode()) for name, value in headers.items()
+            ] + [(b"content-length", str(len(body)).encode())],
+            "client": ("127.0.0.1", 0),
+            "server": self.server,
+        }
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            # The handler listens for a disconnect until it has responded.
+            await asyncio.Future()
+
+        response = {"status": None, "headers": {}, "body": b""}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = {
+                    name.decode().lower(): value.decode() for name, value in message["headers"]
+                }
+            elif message["type"] == "http.response.body":
+                response["body"] += message.get("body", b"")
+
+        await self.application(scope, receive, send)
+        return response["status"], response["headers"], response["body"]
+
+    async def close(self):
+        pass
+
+
+class HTTPTransport:
+    """
+    Minimal keep-alive HTTP/1.1 client; one connection per gateway.
+    """
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+        self.reader = self.writer = None
+
+    def connect(self):
+        return HTTPTransport(f"http://{self.host}:{self.port}")
+
+    async def post(self, path, body, headers):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        lines = [f"POST {path} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        lines.append(f"Content-Length: {len(body)}")
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        response_headers = {}
+        while True:
+            line = (await self.reader.readline()).decode().strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+        response_body = await self.reader.readexactly(int(response_headers.get("content-length", 0)))
+        if response_headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, response_headers, response_body
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+# =========================
+# GATEWAYS
+# =========================
+class GatewaySimulator:
+    def __init__(self, sensor_ids, readings_per_request=100, seed=None):
+        self.sensor_ids = list(sensor_ids)
+        self.readings_per_request = readings_per_request
+        self.rng = random.Random(seed)
+
+    def payload(self):
+        now = timezone.now().isoformat()
+        return [
+            {
+                "sensor_id": self.rng.choice(self.sensor_ids),
+                "recorded_at": now,
+                "battery_level": self.rng.randint(30, 100),
+                **reading_values(self.rng),
+            }
+            for _ in range(self.readings_per_request)
+        ]
+
+    async def run(self, transport, path, requests, result, token="", interval=0.0, backoff=0.05):
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["X-Ingest-Token"] = token
+        sent = 0
+        try:
+            while sent < requests:
+                body = json.dumps(self.payload()).encode()
+                started = time.perf_counter()
+                status, response_headers, response_body = await transport.post(path, body, headers)
+                result.latencies.append(time.perf_counter() - started)
+                result.requests += 1
+                result.statuses[status] += 1
+                if status == 429:
+                    # Retry-After is advisory; a gateway with a full disk
+                    # retries sooner, which is what we want to stress.
+                    await asyncio.sleep(backoff)
+                    continue
+                sent += 1
+                result.readings_sent += self.readings_per_request
+                if status in (200, 202):
+                    data = json.loads(response_body)
+                    result.readings_accepted += data.get("queued", data.get("accepted", 0))
+                if interval:
+                    await asyncio.sleep(interval)
+        finally:
+            await transport.close()
+
+
+async def run_load(
+    transport,
+    sensor_ids,
+    path,
+    gateways=20,
+    requests=10,
+    readings_per_request=100,
+    token="",
+    interval=0.0,
+    backoff=0.05,
+):
+    """
+    Run ``gateways`` simulators at once, each sending ``requests``
+    accepted batches; sensors are split between them round-robin.
+    """
+    sensor_ids = list(sensor_ids)
+    result = LoadResult()
+    simulators = [
+        GatewaySimulator(sensor_ids[i::gateways] or sensor_ids, readings_per_request, seed=i)
+        for i in range(gateways)
+    ]
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        simulator.run(transport.connect(), path, requests, result, token, interval, backoff)
+        for simulator in simulators
+    ))
+    result.elapsed = time.perf_counter() - started
+    return result
@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tracker.archive import archive_readings, get_horizon, month_start
+
+
+class Command(BaseCommand):
+    help = (
+        "Move readings older than the archive horizon (whole months) out of "
+        "the readings table into compressed monthly archive segments."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            default=None,
+            help=f"Archive horizon in days (default {get_horizon().days})",
+        )
+        parser.add_argument(
+            "--sensors-per-batch",
+            type=int,
+            default=25,
+            help="Sensors copied and deleted per transaction",
+        )
+
+    def handle(self, *args, **options):
+        days = options["older_than_days"]
+        if days is not None and days < 0:
+            raise CommandError("--older-than-days must not be negative")
+        horizon = timedelta(days=days) if days is not None else get_horizon()
+        before = month_start(timezone.now() - horizon)
+        self.stdout.write(f"Archiving readings before {before:%Y-%m-%d}")
+
+        def progress(month, run):
+            self.stdout.write(
+                f"{month:%Y-%m}: {run.readings:,} readings in {run.segments:,} segments, "
+                f"{run.stored_bytes / 1024:,.0f} KiB ({run.ratio:.1f}x)"
+            )
+
+        run = archive_readings(
+            before=before, sensors_per_batch=options["sensors_per_batch"], progress=progress
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {run.readings:,} readings from {run.months} months "
+            f"into {run.segments:,} segments ({run.ratio:.1f}x smaller) in {run.elapsed:.1f}s"
+        ))
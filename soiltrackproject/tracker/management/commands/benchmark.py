@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_databases, teardown_databases
+
+from tracker.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a synthetic-data benchmark against a throwaway test database. "
+        "Available: " + ", ".join(sorted(BENCHMARKS))
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", choices=sorted(BENCHMARKS))
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=None,
+            help="Number of readings (or items) to generate.",
+        )
+
+    def handle(self, *args, **options):
+        func, default_rows, shared_database = BENCHMARKS[options["name"]]
+        rows = options["rows"] or default_rows
+        if rows <= 0:
+            raise CommandError("--rows must be positive")
+
+        if shared_database and connection.vendor == "sqlite":
+            test_settings = connection.settings_dict.setdefault("TEST", {})
+            if not test_settings.get("NAME"):
+                test_settings["NAME"] = f"{connection.settings_dict['NAME']}.benchmark"
+
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self.stdout.write(f"benchmark {options['name']} ({rows:,} rows)")
+            func(self.stdout.write, rows)
+        finally:
+            teardown_databases(old_config, verbosity=0)
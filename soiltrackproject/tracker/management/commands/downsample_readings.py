@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from tracker.downsampling import reset_downsampling, run_downsampling
+
+
+class Command(BaseCommand):
+    help = (
+        "Aggregate new sensor readings into hourly, daily and weekly buckets. "
+        "Only buckets closed since the last run, or that late readings arrived "
+        "in, are processed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--every",
+            type=int,
+            default=0,
+            metavar="SECONDS",
+            help="Keep running, starting a new pass every SECONDS.",
+        )
+        parser.add_argument(
+            "--reset-since",
+            metavar="DATETIME",
+            help="Recompute all buckets from this ISO datetime on (e.g. after deleting readings).",
+        )
+
+    def handle(self, *args, **options):
+        if options["reset_since"]:
+            since = parse_datetime(options["reset_since"])
+            if since is None:
+                raise CommandError("--reset-since must be an ISO datetime")
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+            reset_downsampling(since)
+            self.stdout.write(f"Reset downsampled buckets from {since}.")
+
+        while True:
+            started = time.perf_counter()
+            written = run_downsampling()
+            summary = ", ".join(f"{res}={count}" for res, count in written.items())
+            self.stdout.write(
+                f"Downsampled {summary} in {time.perf_counter() - started:.2f}s"
+            )
+            if not options["every"]:
+                break
+            time.sleep(options["every"])
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tracker.health import evaluate_sensor_health
+
+
+class Command(BaseCommand):
+    help = "Classify every active sensor as online, stale, offline or low battery."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--every",
+            type=int,
+            default=0,
+            metavar="SECONDS",
+            help="Keep running, re-evaluating every SECONDS.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            run = evaluate_sensor_health()
+            counts = ", ".join(f"{count} {status}" for status, count in run.counts.items())
+            self.stdout.write(f"{run.total} sensors evaluated in {run.elapsed:.2f}s: {counts}")
+            if not options["every"]:
+                return
+            time.sleep(options["every"])
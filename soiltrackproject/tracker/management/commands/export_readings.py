@@ -0,0 +1,65 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from tracker.archive import iter_readings
+from tracker.exports import FORMATS, ExportUnavailable, stream_export
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream sensor readings, archived months included, to a CSV or "
+        "Parquet file without loading them all into memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+        parser.add_argument("--output", "-o", default="-", help="File path, or '-' for stdout.")
+        parser.add_argument("--coop", type=int, help="Cooperative id")
+        parser.add_argument("--field", type=int, help="Field id")
+        parser.add_argument("--sensor", type=int, help="Sensor id (primary key)")
+        parser.add_argument("--start", help="Only readings at or after this ISO datetime")
+        parser.add_argument("--end", help="Only readings before this ISO datetime")
+        parser.add_argument("--chunk-size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        bounds = {name: self._parse_moment(options[name], name) for name in ("start", "end")}
+        readings = iter_readings(options["coop"], options["field"], options["sensor"], **bounds)
+        try:
+            chunks = stream_export(readings, options["format"], options["chunk_size"])
+        except ExportUnavailable as exc:
+            raise CommandError(str(exc))
+
+        started = time.perf_counter()
+        written = 0
+        try:
+            target = sys.stdout.buffer if options["output"] == "-" else open(options["output"], "wb")
+        except OSError as exc:
+            raise CommandError(f"cannot write {options['output']}: {exc.strerror}")
+        try:
+            for chunk in chunks:
+                target.write(chunk)
+                written += len(chunk)
+        except OSError as exc:
+            raise CommandError(f"writing {options['output']} failed: {exc.strerror}")
+        finally:
+            if target is not sys.stdout.buffer:
+                target.close()
+
+        self.stderr.write(
+            f"Wrote {written:,} bytes of {options['format']} in {time.perf_counter() - started:.2f}s"
+        )
+
+    def _parse_moment(self, value, name):
+        if not value:
+            return None
+        try:
+            moment = parse_datetime(value)
+        except ValueError:  # well-formed but not a date, e.g. February 30th
+            moment = None
+        if moment is None:
+            raise CommandError(f"--{name} must be an ISO datetime")
+        return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
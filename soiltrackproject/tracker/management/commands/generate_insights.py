@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from tracker.analysis import generate_insights, get_window
+from tracker.models import FieldPlot
+
+
+class Command(BaseCommand):
+    help = "Score fields from their recent sensor readings and store AIInsight rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--window-days",
+            type=int,
+            default=None,
+            help=f"Days of readings to analyse (default {get_window().days}).",
+        )
+        parser.add_argument(
+            "--top",
+            type=int,
+            default=None,
+            help="Crops recommended per field and season (default SOILTRACK_CROP_TOP_K).",
+        )
+        parser.add_argument(
+            "--no-recommendations",
+            action="store_true",
+            help="Only write insights; leave crop recommendations untouched.",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Recompute every field, not only those with readings since the last run.",
+        )
+        parser.add_argument("--coop", type=int, help="Only fields of this cooperative id.")
+        parser.add_argument("--field", type=int, action="append", dest="fields", help="Only this field id (repeatable).")
+
+    def handle(self, *args, **options):
+        field_ids = None
+        if options["coop"] or options["fields"]:
+            fields = FieldPlot.objects.order_by("pk")
+            if options["coop"]:
+                fields = fields.filter(cooperative_id=options["coop"])
+            if options["fields"]:
+                fields = fields.filter(pk__in=options["fields"])
+            field_ids = fields.values_list("pk", flat=True)
+
+        window = timedelta(days=options["window_days"]) if options["window_days"] else None
+        run = generate_insights(
+            field_ids,
+            window=window,
+            recommend=not options["no_recommendations"],
+            top_k=options["top"],
+            incremental=not options["full"],
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {run.insights_created} insights and {run.recommendations_created} "
+            f"crop recommendations for {run.fields_recomputed} of {run.fields_considered} fields "
+            f"({run.fields_skipped} skipped, no new readings) "
+            f"from {run.readings_used:,} readings in {run.elapsed:.2f}s"
+        ))
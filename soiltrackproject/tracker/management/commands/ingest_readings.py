@@ -0,0 +1,72 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker import packed
+from tracker.ingest import get_batch_size, ingest_records
+
+
+class Command(BaseCommand):
+    help = (
+        "Ingest sensor readings from a JSON file (a list of readings), a "
+        "JSON-lines file or a packed binary payload. Use '-' to read from stdin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="JSON / JSON-lines / packed file, or '-' for stdin")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help=f"Readings per batch (default {get_batch_size()})",
+        )
+
+    def handle(self, *args, **options):
+        records = self._load(options["path"])
+        total, batches = ingest_records(records, batch_size=options["batch_size"])
+
+        for number, batch in enumerate(batches, start=1):
+            self.stdout.write(
+                f"batch {number}: accepted={batch.accepted} "
+                f"rejected={batch.rejected} "
+                f"{batch.rows_per_sec:.0f} rows/s"
+            )
+        for error in total.errors:
+            self.stderr.write(f"record {error['index']}: {error['error']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Ingested {total.accepted}/{total.received} readings "
+            f"({total.rejected} rejected) in {total.elapsed:.2f}s, "
+            f"{total.rows_per_sec:.0f} rows/s"
+        ))
+
+    def _load(self, path):
+        try:
+            if path == "-":
+                data = sys.stdin.buffer.read()
+            else:
+                with open(path, "rb") as handle:
+                    data = handle.read()
+        except OSError as exc:
+            raise CommandError(f"Cannot read {path}: {exc}")
+
+        if data.startswith(packed.MAGIC):
+            try:
+                return packed.decode(data)
+            except packed.PackedError as exc:
+                raise CommandError(f"Invalid packed payload in {path}: {exc}")
+
+        try:
+            text = data.decode("utf-8").strip()
+        except UnicodeDecodeError as exc:
+            raise CommandError(f"Invalid JSON in {path}: {exc}")
+
+        try:
+            if text.startswith("["):
+                records = json.loads(text)
+            else:
+                records = [json.loads(line) for line in text.splitlines() if line.strip()]
+        except ValueError as exc:
+            raise CommandError(f"Invalid JSON in {path}: {exc}")
+        return records
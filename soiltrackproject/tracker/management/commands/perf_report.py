@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand
+
+from tracker.models import QueryPattern, ViewTiming
+from tracker.perf import METRIC_BOUNDS, flagged_patterns, load_histograms, summarise
+
+
+def _mean(stats):
+    return f"{stats['mean']:.1f}" if stats and stats["mean"] is not None else "-"
+
+
+def _bound(metric, stats, quantile):
+    # Quantiles are known to a histogram bucket; None means past the last one.
+    if not stats:
+        return "-"
+    value = stats[quantile]
+    return f"<={value:g}" if value is not None else f">{METRIC_BOUNDS[metric][-1]:g}"
+
+
+class Command(BaseCommand):
+    help = "Per-view request times, query counts and flagged N+1 / duplicate queries, from tracker.perf."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--view", help="Only this URL name.")
+        parser.add_argument(
+            "--sort",
+            choices=["wall", "db", "render", "queries", "requests"],
+            default="wall",
+            help="Order views by this mean, highest first (default: wall).",
+        )
+        parser.add_argument("--reset", action="store_true", help="Clear the stored numbers after reporting.")
+
+    def handle(self, *args, **options):
+        summary = summarise(load_histograms(options["view"]))
+        if not summary:
+            self.stdout.write("No requests recorded yet.")
+            return
+
+        def sort_key(item):
+            name, view = item
+            if options["sort"] == "requests":
+                return view["requests"]
+            return (view.get(options["sort"]) or {}).get("mean") or 0
+
+        self.stdout.write(
+            f"{'view':<24} {'requests':>8}  {'wall ms mean/p50/p95':>22}  "
+            f"{'queries mean/p95':>16}  {'db ms':>7}  {'render ms':>9}"
+        )
+        for name, view in sorted(summary.items(), key=sort_key, reverse=True):
+            wall, queries = view.get("wall"), view.get("queries")
+            wall_text = f"{_mean(wall)} / {_bound('wall', wall, 'p50')} / {_bound('wall', wall, 'p95')}"
+            queries_text = f"{_mean(queries)} / {_bound('queries', queries, 'p95')}"
+            self.stdout.write(
+                f"{name:<24} {view['requests']:>8}  {wall_text:>22}  {queries_text:>16}  "
+                f"{_mean(view.get('db')):>7}  {_mean(view.get('render')):>9}"
+            )
+
+        patterns = list(flagged_patterns(options["view"]))
+        if patterns:
+            self.stdout.write("\nRepeated queries:")
+        for pattern in patterns:
+            sql = " ".join(pattern.sql.split())
+            self.stdout.write(
+                f"  {pattern.view_name}: {pattern.get_kind_display()} in {pattern.requests} requests, "
+                f"up to {pattern.max_repeats}x per request\n    {sql[:160]}{'...' if len(sql) > 160 else ''}"
+            )
+
+        if options["reset"]:
+            timings = ViewTiming.objects.all()
+            found = QueryPattern.objects.all()
+            if options["view"]:
+                timings = timings.filter(view_name=options["view"])
+                found = found.filter(view_name=options["view"])
+            timings.delete()
+            found.delete()
+            self.stdout.write(self.style.SUCCESS("Cleared."))
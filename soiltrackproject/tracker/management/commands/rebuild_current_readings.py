@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from tracker.current import rebuild_current
+
+
+class Command(BaseCommand):
+    help = "Recompute every sensor's and field's current reading from the readings table (for backfills)."
+
+    def handle(self, *args, **options):
+        count = rebuild_current()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt current readings of {count} sensors."))
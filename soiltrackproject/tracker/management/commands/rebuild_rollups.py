@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from tracker.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute per-sensor rollups from all stored readings "
+        "(after backfills, or readings updated or deleted outside ingest and the admin)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sensor",
+            action="append",
+            type=int,
+            dest="sensors",
+            help="Only rebuild this sensor (primary key). Can be repeated.",
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_rollups(options["sensors"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} sensor rollups."))
@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.parallel import get_workers, run_parallel
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate AI insights and crop recommendations in parallel, one "
+        "cooperative per task across a pool of worker processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help=f"Worker processes (default: CPU count, {get_workers()}).",
+        )
+        parser.add_argument(
+            "--retries",
+            type=int,
+            default=2,
+            help="Times a failed cooperative is resubmitted before giving up.",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Recompute every field, not only those with readings since the last run.",
+        )
+        parser.add_argument("--coop", type=int, action="append", dest="coops", help="Only this cooperative id (repeatable).")
+        parser.add_argument("--window-days", type=int, default=None)
+        parser.add_argument("--top", type=int, default=None)
+        parser.add_argument("--no-recommendations", action="store_true")
+
+    def progress(self, event, done, total, detail):
+        if event == "done":
+            self.stdout.write(
+                f"[{done}/{total}] cooperative {detail.cooperative_id}: {detail.fields} fields, "
+                f"{detail.insights_created} insights, {detail.recommendations_created} "
+                f"recommendations in {detail.elapsed:.2f}s"
+            )
+        else:
+            coop_id, exc = detail
+            label = "retrying" if event == "retry" else "FAILED"
+            self.stderr.write(f"[{done}/{total}] cooperative {coop_id} {label}: {exc!r}")
+
+    def handle(self, *args, **options):
+        if options["workers"] is not None and options["workers"] < 1:
+            raise CommandError("--workers must be at least 1")
+
+        run = run_parallel(
+            workers=options["workers"],
+            incremental=not options["full"],
+            cooperative_ids=options["coops"],
+            retries=options["retries"],
+            progress=self.progress,
+            window=timedelta(days=options["window_days"]) if options["window_days"] else None,
+            recommend=not options["no_recommendations"],
+            top_k=options["top"],
+        )
+
+        summary = (
+            f"{run.shards} cooperatives on {run.workers} workers: {run.fields_recomputed} fields "
+            f"recomputed, {run.fields_skipped} skipped, {run.insights_created} insights, "
+            f"{run.recommendations_created} recommendations in {run.elapsed:.2f}s"
+        )
+        if run.failed:
+            raise CommandError(
+                f"{summary}; {len(run.failed)} cooperatives failed: "
+                + ", ".join(str(coop_id) for coop_id in run.failed)
+            )
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,84 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.gateway import GatewayListener, GatewayUnavailable, MQTTClient, subscriptions
+
+
+class Command(BaseCommand):
+    help = (
+        "Subscribe to the gateways' per-cooperative sensor topics on the MQTT "
+        "broker and write the readings they publish in batches. Runs until "
+        "interrupted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default=getattr(settings, "SOILTRACK_MQTT_HOST", "localhost"))
+        parser.add_argument("--port", type=int, default=getattr(settings, "SOILTRACK_MQTT_PORT", 1883))
+        parser.add_argument("--client-id", default="soiltrack-listener")
+        parser.add_argument("--username", default=None)
+        parser.add_argument("--password", default=None)
+        parser.add_argument("--tls", action="store_true", help="Connect with TLS")
+        parser.add_argument(
+            "--coop",
+            type=int,
+            action="append",
+            dest="cooperative_ids",
+            help="Only this cooperative's topics (repeatable; default: all)",
+        )
+        parser.add_argument("--batch-size", type=int, default=None, help="Readings per write")
+        parser.add_argument(
+            "--flush-seconds",
+            type=float,
+            default=None,
+            help="Longest a reading waits for its batch to fill",
+        )
+        parser.add_argument(
+            "--stats-every",
+            type=float,
+            default=60.0,
+            metavar="SECONDS",
+            help="Print per-topic throughput every SECONDS (default 60)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            client = MQTTClient(
+                options["host"],
+                options["port"],
+                client_id=options["client_id"],
+                username=options["username"],
+                password=options["password"],
+                tls=options["tls"],
+            )
+        except GatewayUnavailable as exc:
+            raise CommandError(str(exc))
+
+        topics = subscriptions(options["cooperative_ids"])
+        listener = GatewayListener(
+            client,
+            topics,
+            batch_size=options["batch_size"],
+            flush_seconds=options["flush_seconds"],
+            report=self.report,
+            report_every=options["stats_every"],
+        )
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: listener.stop())
+
+        self.stdout.write(f"Listening on {options['host']}:{options['port']} for {', '.join(topics)}")
+        stats = listener.run()
+        self.report(stats)
+        self.stdout.write(self.style.SUCCESS(
+            f"Stopped: {stats.messages} messages, {stats.written} readings written "
+            f"in {stats.flushes} batches, {stats.dropped} dropped, {stats.disconnects} reconnects"
+        ))
+
+    def report(self, stats):
+        for topic, (messages, readings) in stats.rates().items():
+            counters = stats.topics[topic]
+            self.stdout.write(
+                f"{topic}: {counters.messages} messages ({messages:.1f}/s), "
+                f"{counters.readings} readings ({readings:.1f}/s), {counters.rejected} rejected"
+            )
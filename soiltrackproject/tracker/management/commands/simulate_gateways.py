@@ -0,0 +1,51 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.loadtest import HTTPTransport, run_load
+from tracker.models import Sensor
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test a running server with simulated gateways posting readings "
+        "for the active sensors in the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="Server to load")
+        parser.add_argument(
+            "--path",
+            default="/api/readings/buffered/",
+            help="Endpoint (default the buffered one; /api/readings/ for the synchronous one)",
+        )
+        parser.add_argument("--gateways", type=int, default=20)
+        parser.add_argument("--requests", type=int, default=50, help="Accepted requests per gateway")
+        parser.add_argument("--readings", type=int, default=100, help="Readings per request")
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0.0,
+            help="Seconds each gateway waits between requests (default: none)",
+        )
+
+    def handle(self, *args, **options):
+        if min(options["gateways"], options["requests"], options["readings"]) < 1:
+            raise CommandError("--gateways, --requests and --readings must be positive")
+
+        sensor_ids = list(Sensor.objects.filter(is_active=True).values_list("sensor_id", flat=True))
+        if not sensor_ids:
+            raise CommandError("No active sensors to simulate.")
+
+        result = asyncio.run(run_load(
+            HTTPTransport(options["url"]),
+            sensor_ids,
+            options["path"],
+            gateways=options["gateways"],
+            requests=options["requests"],
+            readings_per_request=options["readings"],
+            token=getattr(settings, "SOILTRACK_INGEST_TOKEN", ""),
+            interval=options["interval"],
+        ))
+        self.stdout.write(self.style.SUCCESS(result.summary()))
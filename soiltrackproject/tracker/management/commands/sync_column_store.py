@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.columnstore import DEFAULT_CHUNK_SIZE, ColumnStore
+
+
+class Command(BaseCommand):
+    help = "Append new readings to the columnar analytics store (SOILTRACK_COLUMN_STORE_DIR)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Drop the store and copy every reading again, archived ones included",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f"Readings read per query (default {DEFAULT_CHUNK_SIZE})",
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be positive")
+        store = ColumnStore()
+        sync = store.rebuild if options["rebuild"] else store.sync
+
+        def progress(run):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"{run.readings:,} readings")
+
+        run = sync(chunk_size=options["chunk_size"], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Synced {run.readings:,} readings ({run.archived:,} from the archive) into "
+            f"{store.root} in {run.elapsed:.1f}s; {len(store):,} readings in "
+            f"{len(store.months())} months, {run.merged} months merged"
+        ))
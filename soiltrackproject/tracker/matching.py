@@ -0,0 +1,161 @@
+"""
+Crop matching: scores every field against every crop profile at once.
+
+The active CropProfile catalog is loaded once per run into (crops x
+measurements) arrays of ideal ranges. Field soil vectors (per-field means
+from tracker.analysis) are broadcast against them to give a (fields x
+crops) score matrix, and the top-k crops per season are taken with
+argsort. Needs NumPy.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+from django.conf import settings
+
+from .analysis import band_score
+from .models import CropProfile, CropRecommendation
+
+
+MEASUREMENTS = CropProfile.MEASUREMENTS
+
+# A reading this far outside a crop's range scores 0 for that measurement,
+# unless the range itself is wider.
+MIN_TOLERANCE = {
+    "ph": 0.5,
+    "moisture": 5.0,
+    "temperature": 3.0,
+    "nitrogen": 20.0,
+    "phosphorus": 10.0,
+    "potassium": 30.0,
+}
+
+MEASUREMENT_WEIGHTS = {
+    "ph": 0.25,
+    "moisture": 0.2,
+    "temperature": 0.1,
+    "nitrogen": 0.15,
+    "phosphorus": 0.15,
+    "potassium": 0.15,
+}
+
+DEFAULT_TOP_K = 3
+
+
+def get_top_k():
+    return getattr(settings, "SOILTRACK_CROP_TOP_K", DEFAULT_TOP_K)
+
+
+@dataclass
+class CropIndex:
+    """
+    The crop catalog as arrays, one row per profile.
+    """
+    profiles: list
+    low: np.ndarray          # (crops, measurements)
+    high: np.ndarray
+    tolerance: np.ndarray
+    weights: np.ndarray      # (measurements,)
+    seasons: dict            # season -> array of profile row numbers
+
+    def __len__(self):
+        return len(self.profiles)
+
+
+def build_crop_index(profiles=None):
+    if profiles is None:
+        profiles = CropProfile.objects.filter(is_active=True)
+    profiles = list(profiles)
+
+    ranges = np.array(
+        [[profile.ideal_range(name) for name in MEASUREMENTS] for profile in profiles],
+        dtype=float,
+    ).reshape(len(profiles), len(MEASUREMENTS), 2)
+    low, high = ranges[..., 0], ranges[..., 1]
+    floor = np.array([MIN_TOLERANCE[name] for name in MEASUREMENTS])
+
+    seasons = {}
+    for row, profile in enumerate(profiles):
+        seasons.setdefault(profile.season, []).append(row)
+
+    return CropIndex(
+        profiles=profiles,
+        low=low,
+        high=high,
+        tolerance=np.maximum(high - low, floor),
+        weights=np.array([MEASUREMENT_WEIGHTS[name] for name in MEASUREMENTS]),
+        seasons={season: np.array(rows) for season, rows in seasons.items()},
+    )
+
+
+def soil_vectors(features):
+    """
+    (fields, measurements) matrix of the means the catalog is defined on.
+    """
+    return np.stack([features.mean(name) for name in MEASUREMENTS], axis=1)
+
+
+def score_matrix(vectors, index):
+    """
+    (fields, crops) suitability scores, 0-100; NaN where a field has none
+    of the measurements. Measurements a field lacks are left out of its
+    weighted mean rather than counted as zero.
+    """
+    per_measurement = band_score(
+        vectors[:, None, :], index.low[None], index.high[None], index.tolerance[None]
+    )
+    weights = index.weights * ~np.isnan(per_measurement)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.nansum(per_measurement * weights, axis=2) / weights.sum(axis=2)
+
+
+def top_k(scores, k):
+    """
+    Column numbers of the ``k`` best scores per row, best first.
+    """
+    ranked = np.argsort(-np.nan_to_num(scores, nan=-1.0), axis=1, kind="stable")
+    return ranked[:, :k]
+
+
+def match_crops(features, index, k=None, insights=None):
+    """
+    Unsaved CropRecommendation rows: the top ``k`` crops per season for
+    every field in ``features`` with data. ``insights`` maps field id to
+    the AIInsight the recommendations should point at.
+    """
+    k = k or get_top_k()
+    insights = insights or {}
+    if not len(index) or not len(features.field_ids):
+        return []
+
+    scores = score_matrix(soil_vectors(features), index)
+    recommendations = []
+    for rows in index.seasons.values():
+        season_scores = scores[:, rows]
+        best = rows[top_k(season_scores, k)]
+        for i, field_id in enumerate(features.field_ids.tolist()):
+            for rank, row in enumerate(best[i]):
+                score = scores[i, row]
+                if np.isnan(score):
+                    break
+                profile = index.profiles[row]
+                recommendations.append(CropRecommendation(
+                    field_id=field_id,
+                    ai_insight=insights.get(field_id),
+                    crop_name=profile.name,
+                    season=profile.season,
+                    suitability_score=int(round(float(score))),
+                    description=profile.description,
+                    expected_yield=profile.expected_yield,
+                    is_top_choice=rank == 0,
+                ))
+    return recommendations
+
+
+def replace_recommendations(field_ids, recommendations):
+    """
+    Swap the stored recommendations of ``field_ids`` for the new ones.
+    Call inside a transaction so pages never see a field half-replaced.
+    """
+    CropRecommendation.objects.filter(field_id__in=list(field_ids)).delete()
+    CropRecommendation.objects.bulk_create(recommendations, batch_size=1000)
+    return len(recommendations)
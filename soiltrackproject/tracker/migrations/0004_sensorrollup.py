@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-18 13:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0003_sensorreading_recorded_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorRollup',
+            fields=[
+                ('sensor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rollup', serialize=False, to='tracker.sensor')),
+                ('reading_count', models.PositiveBigIntegerField(default=0)),
+                ('last_reading_at', models.DateTimeField(blank=True, null=True)),
+                ('ph_sum', models.FloatField(default=0)),
+                ('ph_count', models.PositiveBigIntegerField(default=0)),
+                ('moisture_sum', models.FloatField(default=0)),
+                ('moisture_count', models.PositiveBigIntegerField(default=0)),
+                ('temperature_sum', models.FloatField(default=0)),
+                ('temperature_count', models.PositiveBigIntegerField(default=0)),
+                ('nitrogen_sum', models.FloatField(default=0)),
+                ('nitrogen_count', models.PositiveBigIntegerField(default=0)),
+                ('phosphorus_sum', models.FloatField(default=0)),
+                ('phosphorus_count', models.PositiveBigIntegerField(default=0)),
+                ('potassium_sum', models.FloatField(default=0)),
+                ('potassium_count', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 6.0 on 2026-10-18 13:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0004_sensorrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DownsampleState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily'), ('week', 'Weekly')], max_length=10, unique=True)),
+                ('processed_until', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReadingAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily'), ('week', 'Weekly')], max_length=10)),
+                ('bucket_start', models.DateTimeField()),
+                ('reading_count', models.PositiveIntegerField(default=0)),
+                ('ph_min', models.FloatField(blank=True, null=True)),
+                ('ph_max', models.FloatField(blank=True, null=True)),
+                ('ph_mean', models.FloatField(blank=True, null=True)),
+                ('ph_count', models.PositiveIntegerField(default=0)),
+                ('moisture_min', models.FloatField(blank=True, null=True)),
+                ('moisture_max', models.FloatField(blank=True, null=True)),
+                ('moisture_mean', models.FloatField(blank=True, null=True)),
+                ('moisture_count', models.PositiveIntegerField(default=0)),
+                ('temperature_min', models.FloatField(blank=True, null=True)),
+                ('temperature_max', models.FloatField(blank=True, null=True)),
+                ('temperature_mean', models.FloatField(blank=True, null=True)),
+                ('temperature_count', models.PositiveIntegerField(default=0)),
+                ('nitrogen_min', models.FloatField(blank=True, null=True)),
+                ('nitrogen_max', models.FloatField(blank=True, null=True)),
+                ('nitrogen_mean', models.FloatField(blank=True, null=True)),
+                ('nitrogen_count', models.PositiveIntegerField(default=0)),
+                ('phosphorus_min', models.FloatField(blank=True, null=True)),
+                ('phosphorus_max', models.FloatField(blank=True, null=True)),
+                ('phosphorus_mean', models.FloatField(blank=True, null=True)),
+                ('phosphorus_count', models.PositiveIntegerField(default=0)),
+                ('potassium_min', models.FloatField(blank=True, null=True)),
+                ('potassium_max', models.FloatField(blank=True, null=True)),
+                ('potassium_mean', models.FloatField(blank=True, null=True)),
+                ('potassium_count', models.PositiveIntegerField(default=0)),
+                ('conductivity_min', models.FloatField(blank=True, null=True)),
+                ('conductivity_max', models.FloatField(blank=True, null=True)),
+                ('conductivity_mean', models.FloatField(blank=True, null=True)),
+                ('conductivity_count', models.PositiveIntegerField(default=0)),
+                ('sensor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aggregates', to='tracker.sensor')),
+            ],
+            options={
+                'ordering': ['bucket_start'],
+                'indexes': [models.Index(fields=['resolution', 'bucket_start'], name='tracker_rea_resolut_ea78c3_idx')],
+                'constraints': [models.UniqueConstraint(fields=('resolution', 'sensor', 'bucket_start'), name='unique_reading_aggregate_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 6.0 on 2026-10-18 13:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_reading_location(apps, schema_editor):
+    Sensor = apps.get_model("tracker", "Sensor")
+    SensorReading = apps.get_model("tracker", "SensorReading")
+    sensor = Sensor.objects.filter(pk=OuterRef("sensor_id"))
+    SensorReading.objects.filter(field__isnull=True).update(
+        field_id=Subquery(sensor.values("field_id")[:1]),
+        cooperative_id=Subquery(sensor.values("field__cooperative_id")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0005_readingaggregate_downsamplestate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sensorreading',
+            name='cooperative',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='readings', to='tracker.cooperative'),
+        ),
+        migrations.AddField(
+            model_name='sensorreading',
+            name='field',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='readings', to='tracker.fieldplot'),
+        ),
+        migrations.RunPython(backfill_reading_location, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='sensorreading',
+            name='sensor',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='readings', to='tracker.sensor'),
+        ),
+        migrations.AddIndex(
+            model_name='sensorreading',
+            index=models.Index(fields=['sensor', '-recorded_at'], name='reading_sensor_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sensorreading',
+            index=models.Index(fields=['field', '-recorded_at'], name='reading_field_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sensorreading',
+            index=models.Index(fields=['cooperative', '-recorded_at'], name='reading_coop_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sensorreading',
+            index=models.Index(fields=['-recorded_at'], name='reading_time_idx'),
+        ),
+    ]
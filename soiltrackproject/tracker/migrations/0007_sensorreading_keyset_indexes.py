@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-18 13:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0006_sensorreading_location_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='sensorreading',
+            name='reading_sensor_time_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='sensorreading',
+            name='reading_field_time_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='sensorreading',
+            name='reading_coop_time_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='sensorreading',
+            name='reading_time_idx',
+        ),
+        migrations.AddIndex(
+            model_name='sensorreading',
+            index=models.Index(fields=['sensor', '-recorded_at', '-id'], name='reading_sensor_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sensorreading',
+            index=models.Index(fields=['field', '-recorded_at', '-id'], name='reading_field_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sensorreading',
+            index=models.Index(fields=['cooperative', '-recorded_at', '-id'], name='reading_coop_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sensorreading',
+            index=models.Index(fields=['-recorded_at', '-id'], name='reading_keyset_idx'),
+        ),
+    ]
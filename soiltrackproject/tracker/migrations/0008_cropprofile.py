@@ -0,0 +1,76 @@
+# Generated by Django 6.0 on 2026-10-18 13:55
+
+from django.db import migrations, models
+
+
+# name, season, yield, pH, moisture %, temperature °C, N, P, K (mg/kg)
+CATALOG = [
+    ("Maize", "Season A", "4–6 t/ha", (5.8, 7.0), (25, 40), (18, 30), (120, 180), (30, 50), (150, 220)),
+    ("Maize", "Season B", "3–5 t/ha", (5.8, 7.0), (25, 40), (18, 30), (120, 180), (30, 50), (150, 220)),
+    ("Beans", "Season A", "1.5–2.5 t/ha", (6.0, 7.5), (20, 35), (16, 27), (40, 90), (25, 45), (120, 180)),
+    ("Beans", "Season B", "1–2 t/ha", (6.0, 7.5), (20, 35), (16, 27), (40, 90), (25, 45), (120, 180)),
+    ("Irish Potato", "Season A", "15–25 t/ha", (5.0, 6.5), (25, 40), (12, 22), (100, 160), (35, 60), (180, 260)),
+    ("Irish Potato", "Season B", "12–20 t/ha", (5.0, 6.5), (25, 40), (12, 22), (100, 160), (35, 60), (180, 260)),
+    ("Sorghum", "Season B", "2–4 t/ha", (5.5, 7.5), (15, 30), (20, 32), (80, 130), (20, 40), (120, 180)),
+    ("Rice", "Season A", "5–7 t/ha", (5.0, 6.5), (40, 60), (20, 32), (100, 160), (20, 40), (120, 180)),
+    ("Soybean", "Season A", "1.5–2.5 t/ha", (6.0, 7.0), (20, 35), (18, 28), (30, 80), (25, 45), (130, 190)),
+    ("Wheat", "Season B", "2–4 t/ha", (6.0, 7.5), (20, 35), (12, 24), (100, 150), (25, 45), (140, 200)),
+    ("Cassava", "", "15–25 t/ha", (4.5, 6.5), (15, 35), (20, 32), (50, 100), (15, 35), (150, 220)),
+    ("Sweet Potato", "", "10–20 t/ha", (5.0, 6.5), (20, 35), (18, 30), (50, 100), (20, 40), (160, 240)),
+    ("Banana", "", "20–40 t/ha", (5.5, 7.0), (30, 45), (18, 30), (120, 180), (25, 45), (200, 300)),
+    ("Coffee", "", "1–2 t/ha", (5.0, 6.0), (25, 40), (16, 26), (100, 150), (20, 40), (150, 220)),
+]
+
+
+def seed_catalog(apps, schema_editor):
+    CropProfile = apps.get_model("tracker", "CropProfile")
+    profiles = []
+    for name, season, expected_yield, *ranges in CATALOG:
+        values = {}
+        for measurement, (low, high) in zip(
+            ("ph", "moisture", "temperature", "nitrogen", "phosphorus", "potassium"), ranges
+        ):
+            values[f"{measurement}_min"] = low
+            values[f"{measurement}_max"] = high
+        profiles.append(CropProfile(
+            name=name, season=season, expected_yield=expected_yield, **values
+        ))
+    CropProfile.objects.bulk_create(profiles)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0007_sensorreading_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CropProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('season', models.CharField(blank=True, max_length=50)),
+                ('description', models.TextField(blank=True)),
+                ('expected_yield', models.CharField(blank=True, max_length=100)),
+                ('ph_min', models.FloatField()),
+                ('ph_max', models.FloatField()),
+                ('moisture_min', models.FloatField(help_text='%')),
+                ('moisture_max', models.FloatField(help_text='%')),
+                ('temperature_min', models.FloatField(help_text='°C')),
+                ('temperature_max', models.FloatField(help_text='°C')),
+                ('nitrogen_min', models.FloatField(help_text='mg/kg')),
+                ('nitrogen_max', models.FloatField(help_text='mg/kg')),
+                ('phosphorus_min', models.FloatField(help_text='mg/kg')),
+                ('phosphorus_max', models.FloatField(help_text='mg/kg')),
+                ('potassium_min', models.FloatField(help_text='mg/kg')),
+                ('potassium_max', models.FloatField(help_text='mg/kg')),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'ordering': ['name', 'season'],
+                'constraints': [models.UniqueConstraint(fields=('name', 'season'), name='unique_crop_profile_season')],
+            },
+        ),
+        migrations.RunPython(seed_catalog, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-18 13:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0008_cropprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FieldAnalysisState',
+            fields=[
+                ('field', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='analysis_state', serialize=False, to='tracker.fieldplot')),
+                ('analysed_until', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-18 14:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0009_fieldanalysisstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorHealth',
+            fields=[
+                ('sensor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='health', serialize=False, to='tracker.sensor')),
+                ('status', models.CharField(choices=[('online', 'Online'), ('stale', 'Stale'), ('offline', 'Offline'), ('low_battery', 'Low battery')], db_index=True, max_length=20)),
+                ('battery_level', models.PositiveIntegerField(blank=True, null=True)),
+                ('last_seen', models.DateTimeField(blank=True, null=True)),
+                ('recent_readings', models.PositiveIntegerField(default=0, help_text='Readings received within the evaluation window')),
+                ('checked_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name_plural': 'sensor health',
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0 on 2026-10-18 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0010_sensorhealth'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('measurement', models.CharField(choices=[('ph', 'ph'), ('moisture', 'moisture'), ('temperature', 'temperature'), ('nitrogen', 'nitrogen'), ('phosphorus', 'phosphorus'), ('potassium', 'potassium'), ('conductivity', 'conductivity')], max_length=20)),
+                ('operator', models.CharField(choices=[('below', 'Below'), ('above', 'Above'), ('outside', 'Outside range')], max_length=10)),
+                ('threshold', models.FloatField(help_text="Limit, or the lower bound for 'outside range'")),
+                ('upper_threshold', models.FloatField(blank=True, help_text="Upper bound for 'outside range'", null=True)),
+                ('consecutive_readings', models.PositiveSmallIntegerField(default=1)),
+                ('severity', models.CharField(choices=[('info', 'Info'), ('warning', 'Warning'), ('critical', 'Critical')], default='warning', max_length=10)),
+                ('is_active', models.BooleanField(default=True)),
+                ('cooperative', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alert_rules', to='tracker.cooperative')),
+                ('field', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alert_rules', to='tracker.fieldplot')),
+                ('sensor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alert_rules', to='tracker.sensor')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(choices=[('threshold', 'Threshold alert'), ('system', 'System')], default='threshold', max_length=20)),
+                ('severity', models.CharField(choices=[('info', 'Info'), ('warning', 'Warning'), ('critical', 'Critical')], default='warning', max_length=10)),
+                ('title', models.CharField(max_length=150)),
+                ('message', models.TextField(blank=True)),
+                ('value', models.FloatField(blank=True, null=True)),
+                ('triggered_at', models.DateTimeField(help_text='Time of the reading that fired the alert')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('is_resolved', models.BooleanField(default=False)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('field', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='tracker.fieldplot')),
+                ('rule', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notifications', to='tracker.alertrule')),
+                ('sensor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='tracker.sensor')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['is_resolved', '-created_at'], name='tracker_not_is_reso_b16d73_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 14:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0011_alertrule_notification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorAnomalyState',
+            fields=[
+                ('sensor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='anomaly_state', serialize=False, to='tracker.sensor')),
+                ('state', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='sensorreading',
+            name='anomaly_flags',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-18 14:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0012_reading_anomalies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('first_recorded_at', models.DateTimeField()),
+                ('last_recorded_at', models.DateTimeField()),
+                ('reading_count', models.PositiveIntegerField()),
+                ('totals', models.JSONField(default=dict)),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('cooperative', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tracker.cooperative')),
+                ('field', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tracker.fieldplot')),
+                ('sensor', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archive_segments', to='tracker.sensor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['sensor', 'month'], name='archive_sensor_month_idx'), models.Index(fields=['field', 'month'], name='archive_field_month_idx'), models.Index(fields=['cooperative', 'month'], name='archive_coop_month_idx'), models.Index(fields=['month'], name='archive_month_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 6.0 on 2026-10-18 14:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0013_archivesegment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorCurrentReading',
+            fields=[
+                ('reading_id', models.BigIntegerField(blank=True, null=True)),
+                ('recorded_at', models.DateTimeField()),
+                ('ph', models.FloatField(blank=True, null=True)),
+                ('moisture', models.FloatField(blank=True, null=True)),
+                ('temperature', models.FloatField(blank=True, null=True)),
+                ('nitrogen', models.FloatField(blank=True, null=True)),
+                ('phosphorus', models.FloatField(blank=True, null=True)),
+                ('potassium', models.FloatField(blank=True, null=True)),
+                ('conductivity', models.FloatField(blank=True, null=True)),
+                ('anomaly_flags', models.PositiveSmallIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('sensor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='current_reading', serialize=False, to='tracker.sensor')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='FieldCurrentReading',
+            fields=[
+                ('reading_id', models.BigIntegerField(blank=True, null=True)),
+                ('recorded_at', models.DateTimeField()),
+                ('ph', models.FloatField(blank=True, null=True)),
+                ('moisture', models.FloatField(blank=True, null=True)),
+                ('temperature', models.FloatField(blank=True, null=True)),
+                ('nitrogen', models.FloatField(blank=True, null=True)),
+                ('phosphorus', models.FloatField(blank=True, null=True)),
+                ('potassium', models.FloatField(blank=True, null=True)),
+                ('conductivity', models.FloatField(blank=True, null=True)),
+                ('anomaly_flags', models.PositiveSmallIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('field', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='current_reading', serialize=False, to='tracker.fieldplot')),
+                ('cooperative', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tracker.cooperative')),
+                ('sensor', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tracker.sensor')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 6.0 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0014_current_readings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryPattern',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('view_name', models.CharField(max_length=100)),
+                ('kind', models.CharField(choices=[('duplicate', 'Duplicate query'), ('n_plus_one', 'N+1 query')], max_length=10)),
+                ('fingerprint', models.CharField(help_text='SHA-1 of the normalised SQL', max_length=40)),
+                ('sql', models.TextField()),
+                ('requests', models.PositiveBigIntegerField(default=0, help_text='Requests it was seen in')),
+                ('max_repeats', models.PositiveIntegerField(default=0, help_text='Most executions in one request')),
+                ('last_seen', models.DateTimeField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('view_name', 'kind', 'fingerprint'), name='unique_query_pattern')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ViewTiming',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('view_name', models.CharField(max_length=100)),
+                ('metric', models.CharField(choices=[('wall', 'Wall time (ms)'), ('db', 'Database time (ms)'), ('render', 'Template render time (ms)'), ('queries', 'SQL queries')], max_length=10)),
+                ('bucket', models.PositiveSmallIntegerField(help_text="Index into the metric's bucket bounds")),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('total', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('view_name', 'metric', 'bucket'), name='unique_view_timing_bucket')],
+            },
+        ),
+    ]
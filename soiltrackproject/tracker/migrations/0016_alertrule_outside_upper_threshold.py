@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0015_perf_instrumentation'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='alertrule',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('operator', 'outside'), _negated=True), models.Q(('upper_threshold__gt', models.F('threshold')), ('upper_threshold__isnull', False)), _connector='OR'), name='alert_rule_outside_has_upper_threshold'),
+        ),
+    ]
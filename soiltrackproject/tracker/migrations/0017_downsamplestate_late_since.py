@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0016_alertrule_outside_upper_threshold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='downsamplestate',
+            name='late_since',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,4 +1,7 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 
@@ -15,6 +18,37 @@ class AdminProfile(models.Model):
         return self.full_name
 
 
+def _count_subquery(model, fk_name):
+    """
+    Correlated COUNT(*) of ``model`` rows pointing at the outer row.
+    Counting in a subquery per relation avoids the fan-out (and the
+    DISTINCT it would need) of joining two reverse relations at once.
+    """
+    rows = (
+        model.objects
+        .filter(**{fk_name: models.OuterRef("pk")})
+        .order_by()
+        .values(fk_name)
+        .annotate(total=models.Count("pk"))
+        .values("total")
+    )
+    return Coalesce(
+        models.Subquery(rows, output_field=models.IntegerField()), 0
+    )
+
+
+class CooperativeQuerySet(models.QuerySet):
+    def with_counts(self):
+        """
+        Annotate member_total / field_total in the same query, which the
+        member_count / field_count properties then use.
+        """
+        return self.annotate(
+            member_total=_count_subquery(Farmer, "cooperative"),
+            field_total=_count_subquery(FieldPlot, "cooperative"),
+        )
+
+
 class Cooperative(models.Model):
     """
     Cooperative where farmers belong.
@@ -32,15 +66,21 @@ class Cooperative(models.Model):
     cell = models.CharField(max_length=100, blank=True)
     description = models.TextField(blank=True)
 
+    objects = CooperativeQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
     @property
     def member_count(self):
+        if hasattr(self, "member_total"):
+            return self.member_total
         return self.farmers.count()
 
     @property
     def field_count(self):
+        if hasattr(self, "field_total"):
+            return self.field_total
         return self.fields.count()
 
 
@@ -141,16 +181,63 @@ class Sensor(models.Model):
         return f"{self.sensor_id} ({self.get_sensor_type_display()})"
 
 
+class SensorReadingQuerySet(models.QuerySet):
+    def for_scope(self, coop_id=None, field_id=None, sensor_id=None):
+        """
+        The history filters. field / cooperative are denormalized onto
+        readings, so these hit the composite (key, recorded_at, id) indexes
+        without joins.
+        """
+        readings = self
+        if coop_id:
+            readings = readings.filter(cooperative_id=coop_id)
+        if field_id:
+            readings = readings.filter(field_id=field_id)
+        if sensor_id:
+            readings = readings.filter(sensor_id=sensor_id)
+        return readings
+
+
 class SensorReading(models.Model):
     """
     Readings coming from sensors over time.
     """
+    MEASUREMENTS = (
+        "ph",
+        "moisture",
+        "temperature",
+        "nitrogen",
+        "phosphorus",
+        "potassium",
+        "conductivity",
+    )
+
     sensor = models.ForeignKey(
         Sensor,
         on_delete=models.CASCADE,
         related_name="readings",
+        db_index=False,  # covered by the (sensor, recorded_at) index
+    )
+    # Copied from the sensor when the reading is stored, so the history
+    # filters by field / cooperative don't join through Sensor -> FieldPlot.
+    field = models.ForeignKey(
+        FieldPlot,
+        on_delete=models.CASCADE,
+        related_name="readings",
+        null=True,
+        editable=False,
+        db_index=False,
+    )
+    cooperative = models.ForeignKey(
+        Cooperative,
+        on_delete=models.CASCADE,
+        related_name="readings",
+        null=True,
+        editable=False,
+        db_index=False,
     )
-    recorded_at = models.DateTimeField(auto_now_add=True)
+    # Gateways send their own timestamps, so this is a default, not auto_now_add.
+    recorded_at = models.DateTimeField(default=timezone.now)
 
     ph = models.FloatField(null=True, blank=True)
     moisture = models.FloatField(null=True, blank=True)
@@ -160,12 +247,37 @@ class SensorReading(models.Model):
     potassium = models.FloatField(null=True, blank=True)
     conductivity = models.FloatField(null=True, blank=True)
 
+    # Bit i set = MEASUREMENTS[i] looked like a probe fault (tracker.anomalies).
+    anomaly_flags = models.PositiveSmallIntegerField(default=0)
+
+    objects = SensorReadingQuerySet.as_manager()
+
     class Meta:
         ordering = ["-recorded_at"]
+        indexes = [
+            # id breaks ties on recorded_at for keyset pagination.
+            models.Index(fields=["sensor", "-recorded_at", "-id"], name="reading_sensor_keyset_idx"),
+            models.Index(fields=["field", "-recorded_at", "-id"], name="reading_field_keyset_idx"),
+            models.Index(fields=["cooperative", "-recorded_at", "-id"], name="reading_coop_keyset_idx"),
+            models.Index(fields=["-recorded_at", "-id"], name="reading_keyset_idx"),
+        ]
 
     def __str__(self):
         return f"Reading for {self.sensor} at {self.recorded_at}"
 
+    @classmethod
+    def anomaly_bit(cls, name):
+        return 1 << cls.MEASUREMENTS.index(name)
+
+    def is_flagged(self, name):
+        return bool(self.anomaly_flags & self.anomaly_bit(name))
+
+    def save(self, *args, **kwargs):
+        if self.field_id is None or self.cooperative_id is None:
+            self.field_id = self.sensor.field_id
+            self.cooperative_id = self.sensor.field.cooperative_id
+        super().save(*args, **kwargs)
+
 
 class AIInsight(models.Model):
     """
@@ -189,6 +301,49 @@ class AIInsight(models.Model):
         return f"AI Insight for {self.field} ({self.created_at.date()})"
 
 
+class CropProfile(models.Model):
+    """
+    Ideal growing conditions for a crop in a season; the catalog the crop
+    matcher (tracker.matching) scores fields against.
+    """
+    MEASUREMENTS = ("ph", "moisture", "temperature", "nitrogen", "phosphorus", "potassium")
+
+    name = models.CharField(max_length=100)
+    season = models.CharField(max_length=50, blank=True)
+    description = models.TextField(blank=True)
+    expected_yield = models.CharField(max_length=100, blank=True)
+
+    ph_min = models.FloatField()
+    ph_max = models.FloatField()
+    moisture_min = models.FloatField(help_text="%")
+    moisture_max = models.FloatField(help_text="%")
+    temperature_min = models.FloatField(help_text="°C")
+    temperature_max = models.FloatField(help_text="°C")
+    nitrogen_min = models.FloatField(help_text="mg/kg")
+    nitrogen_max = models.FloatField(help_text="mg/kg")
+    phosphorus_min = models.FloatField(help_text="mg/kg")
+    phosphorus_max = models.FloatField(help_text="mg/kg")
+    potassium_min = models.FloatField(help_text="mg/kg")
+    potassium_max = models.FloatField(help_text="mg/kg")
+
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ["name", "season"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name", "season"],
+                name="unique_crop_profile_season",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.season})" if self.season else self.name
+
+    def ideal_range(self, name):
+        return getattr(self, f"{name}_min"), getattr(self, f"{name}_max")
+
+
 class CropRecommendation(models.Model):
     """
     Recommended crops for a field based on AI insight.
@@ -213,4 +368,485 @@ class CropRecommendation(models.Model):
     is_top_choice = models.BooleanField(default=False)
 
     def __str__(self):
-        return f"{self.crop_name} for {self.field}"
\ No newline at end of file
+        return f"{self.crop_name} for {self.field}"
+
+
+class SensorRollup(models.Model):
+    """
+    Running per-sensor totals over all readings, kept up to date on ingest
+    so pages don't have to aggregate the whole readings table.
+    Means are sum / count per measurement (a reading may omit fields).
+    """
+    MEASUREMENTS = ("ph", "moisture", "temperature", "nitrogen", "phosphorus", "potassium")
+
+    sensor = models.OneToOneField(
+        Sensor,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="rollup",
+    )
+    reading_count = models.PositiveBigIntegerField(default=0)
+    last_reading_at = models.DateTimeField(null=True, blank=True)
+
+    ph_sum = models.FloatField(default=0)
+    ph_count = models.PositiveBigIntegerField(default=0)
+    moisture_sum = models.FloatField(default=0)
+    moisture_count = models.PositiveBigIntegerField(default=0)
+    temperature_sum = models.FloatField(default=0)
+    temperature_count = models.PositiveBigIntegerField(default=0)
+    nitrogen_sum = models.FloatField(default=0)
+    nitrogen_count = models.PositiveBigIntegerField(default=0)
+    phosphorus_sum = models.FloatField(default=0)
+    phosphorus_count = models.PositiveBigIntegerField(default=0)
+    potassium_sum = models.FloatField(default=0)
+    potassium_count = models.PositiveBigIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Rollup for {self.sensor_id} ({self.reading_count} readings)"
+
+    def mean(self, name):
+        count = getattr(self, f"{name}_count")
+        if not count:
+            return None
+        return getattr(self, f"{name}_sum") / count
+
+
+class ReadingAggregate(models.Model):
+    """
+    Downsampled readings: min / max / mean / count of every measurement
+    per sensor per hour, day or week bucket (see tracker.downsampling).
+    """
+    RESOLUTION_CHOICES = [
+        ("hour", "Hourly"),
+        ("day", "Daily"),
+        ("week", "Weekly"),
+    ]
+
+    sensor = models.ForeignKey(
+        Sensor,
+        on_delete=models.CASCADE,
+        related_name="aggregates",
+    )
+    resolution = models.CharField(max_length=10, choices=RESOLUTION_CHOICES)
+    bucket_start = models.DateTimeField()
+    reading_count = models.PositiveIntegerField(default=0)
+
+    ph_min = models.FloatField(null=True, blank=True)
+    ph_max = models.FloatField(null=True, blank=True)
+    ph_mean = models.FloatField(null=True, blank=True)
+    ph_count = models.PositiveIntegerField(default=0)
+    moisture_min = models.FloatField(null=True, blank=True)
+    moisture_max = models.FloatField(null=True, blank=True)
+    moisture_mean = models.FloatField(null=True, blank=True)
+    moisture_count = models.PositiveIntegerField(default=0)
+    temperature_min = models.FloatField(null=True, blank=True)
+    temperature_max = models.FloatField(null=True, blank=True)
+    temperature_mean = models.FloatField(null=True, blank=True)
+    temperature_count = models.PositiveIntegerField(default=0)
+    nitrogen_min = models.FloatField(null=True, blank=True)
+    nitrogen_max = models.FloatField(null=True, blank=True)
+    nitrogen_mean = models.FloatField(null=True, blank=True)
+    nitrogen_count = models.PositiveIntegerField(default=0)
+    phosphorus_min = models.FloatField(null=True, blank=True)
+    phosphorus_max = models.FloatField(null=True, blank=True)
+    phosphorus_mean = models.FloatField(null=True, blank=True)
+    phosphorus_count = models.PositiveIntegerField(default=0)
+    potassium_min = models.FloatField(null=True, blank=True)
+    potassium_max = models.FloatField(null=True, blank=True)
+    potassium_mean = models.FloatField(null=True, blank=True)
+    potassium_count = models.PositiveIntegerField(default=0)
+    conductivity_min = models.FloatField(null=True, blank=True)
+    conductivity_max = models.FloatField(null=True, blank=True)
+    conductivity_mean = models.FloatField(null=True, blank=True)
+    conductivity_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["bucket_start"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["resolution", "sensor", "bucket_start"],
+                name="unique_reading_aggregate_bucket",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["resolution", "bucket_start"]),
+        ]
+
+    def __str__(self):
+        return f"{self.get_resolution_display()} {self.sensor_id} @ {self.bucket_start}"
+
+
+class DownsampleState(models.Model):
+    """
+    Watermark per resolution: every bucket starting before processed_until
+    has been aggregated. late_since is the earliest reading ingested behind
+    the watermark since the last run; that run recomputes from there.
+    """
+    resolution = models.CharField(
+        max_length=10, choices=ReadingAggregate.RESOLUTION_CHOICES, unique=True
+    )
+    processed_until = models.DateTimeField(null=True, blank=True)
+    late_since = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.resolution} downsampled until {self.processed_until}"
+
+
+class FieldAnalysisState(models.Model):
+    """
+    Watermark per field: the newest reading (recorded_at) that its latest
+    AIInsight / crop recommendations were computed with.
+    """
+    field = models.OneToOneField(
+        FieldPlot,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="analysis_state",
+    )
+    analysed_until = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.field_id} analysed until {self.analysed_until}"
+
+
+class SensorHealth(models.Model):
+    """
+    Latest health classification of a sensor, written in bulk by
+    tracker.health.evaluate_sensor_health so pages can show it with a join.
+    """
+    STATUS_CHOICES = [
+        ("online", "Online"),
+        ("stale", "Stale"),
+        ("offline", "Offline"),
+        ("low_battery", "Low battery"),
+    ]
+
+    sensor = models.OneToOneField(
+        Sensor,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="health",
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, db_index=True)
+    battery_level = models.PositiveIntegerField(null=True, blank=True)
+    last_seen = models.DateTimeField(null=True, blank=True)
+    recent_readings = models.PositiveIntegerField(
+        default=0, help_text="Readings received within the evaluation window"
+    )
+    checked_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name_plural = "sensor health"
+
+    def __str__(self):
+        return f"{self.sensor_id}: {self.get_status_display()}"
+
+
+class AlertRule(models.Model):
+    """
+    Threshold rule checked against readings as they are ingested
+    (see tracker.alerts), e.g. "moisture below 20 for 3 consecutive
+    readings" or "pH outside 5.5–7.5". Leave the scope empty to apply it
+    to every sensor.
+    """
+    OPERATOR_CHOICES = [
+        ("below", "Below"),
+        ("above", "Above"),
+        ("outside", "Outside range"),
+    ]
+    SEVERITY_CHOICES = [
+        ("info", "Info"),
+        ("warning", "Warning"),
+        ("critical", "Critical"),
+    ]
+
+    name = models.CharField(max_length=100)
+    measurement = models.CharField(
+        max_length=20, choices=[(name, name) for name in SensorReading.MEASUREMENTS]
+    )
+    operator = models.CharField(max_length=10, choices=OPERATOR_CHOICES)
+    threshold = models.FloatField(help_text="Limit, or the lower bound for 'outside range'")
+    upper_threshold = models.FloatField(
+        null=True, blank=True, help_text="Upper bound for 'outside range'"
+    )
+    consecutive_readings = models.PositiveSmallIntegerField(default=1)
+    severity = models.CharField(max_length=10, choices=SEVERITY_CHOICES, default="warning")
+
+    cooperative = models.ForeignKey(
+        Cooperative, on_delete=models.CASCADE, null=True, blank=True, related_name="alert_rules"
+    )
+    field = models.ForeignKey(
+        FieldPlot, on_delete=models.CASCADE, null=True, blank=True, related_name="alert_rules"
+    )
+    sensor = models.ForeignKey(
+        Sensor, on_delete=models.CASCADE, null=True, blank=True, related_name="alert_rules"
+    )
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=~models.Q(operator="outside")
+                | models.Q(upper_threshold__isnull=False, upper_threshold__gt=models.F("threshold")),
+                name="alert_rule_outside_has_upper_threshold",
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        super().clean()
+        if self.operator == "outside" and (
+            self.upper_threshold is None
+            or (self.threshold is not None and self.upper_threshold <= self.threshold)
+        ):
+            raise ValidationError({
+                "upper_threshold": "An 'outside range' rule needs an upper threshold above the threshold.",
+            })
+
+    def describe(self):
+        if self.operator == "outside":
+            upper = "?" if self.upper_threshold is None else f"{self.upper_threshold:g}"
+            condition = f"{self.measurement} outside {self.threshold:g}–{upper}"
+        else:
+            sign = "<" if self.operator == "below" else ">"
+            condition = f"{self.measurement} {sign} {self.threshold:g}"
+        if self.consecutive_readings > 1:
+            condition += f" for {self.consecutive_readings} consecutive readings"
+        return condition
+
+
+class Notification(models.Model):
+    """
+    Alert shown in the admin portal; threshold alerts are created by
+    tracker.alerts during ingestion.
+    """
+    CATEGORY_CHOICES = [
+        ("threshold", "Threshold alert"),
+        ("system", "System"),
+    ]
+
+    category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default="threshold")
+    severity = models.CharField(
+        max_length=10, choices=AlertRule.SEVERITY_CHOICES, default="warning"
+    )
+    title = models.CharField(max_length=150)
+    message = models.TextField(blank=True)
+    rule = models.ForeignKey(
+        AlertRule, on_delete=models.SET_NULL, null=True, blank=True, related_name="notifications"
+    )
+    sensor = models.ForeignKey(
+        Sensor, on_delete=models.CASCADE, null=True, blank=True, related_name="notifications"
+    )
+    field = models.ForeignKey(
+        FieldPlot, on_delete=models.CASCADE, null=True, blank=True, related_name="notifications"
+    )
+    value = models.FloatField(null=True, blank=True)
+    triggered_at = models.DateTimeField(help_text="Time of the reading that fired the alert")
+    created_at = models.DateTimeField(auto_now_add=True)
+    is_resolved = models.BooleanField(default=False)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["is_resolved", "-created_at"]),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class SensorAnomalyState(models.Model):
+    """
+    Per-sensor running baseline (EWMA mean / variance per measurement) of
+    the anomaly detector, packed into a few bytes (tracker.anomalies).
+    """
+    sensor = models.OneToOneField(
+        Sensor,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="anomaly_state",
+    )
+    state = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Anomaly baseline for {self.sensor_id}"
+
+
+class ArchiveSegmentQuerySet(models.QuerySet):
+    def for_scope(self, coop_id=None, field_id=None, sensor_id=None):
+        segments = self
+        if coop_id:
+            segments = segments.filter(cooperative_id=coop_id)
+        if field_id:
+            segments = segments.filter(field_id=field_id)
+        if sensor_id:
+            segments = segments.filter(sensor_id=sensor_id)
+        return segments
+
+
+class ArchiveSegment(models.Model):
+    """
+    One sensor's readings for one calendar month, moved out of the
+    readings table by archive_readings and stored as compressed columns
+    (tracker.archive). A month can have several segments when late
+    readings arrive after it was archived.
+    """
+    sensor = models.ForeignKey(
+        Sensor,
+        on_delete=models.CASCADE,
+        related_name="archive_segments",
+        db_index=False,  # covered by the (sensor, month) index
+    )
+    field = models.ForeignKey(
+        FieldPlot, on_delete=models.CASCADE, null=True, related_name="+", db_index=False
+    )
+    cooperative = models.ForeignKey(
+        Cooperative, on_delete=models.CASCADE, null=True, related_name="+", db_index=False
+    )
+    month = models.DateField()
+    first_recorded_at = models.DateTimeField()
+    last_recorded_at = models.DateTimeField()
+    reading_count = models.PositiveIntegerField()
+    # {measurement: [sum, count]} of the values rollups count, so rollups
+    # can be rebuilt without decompressing the archive.
+    totals = models.JSONField(default=dict)
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ArchiveSegmentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["sensor", "month"], name="archive_sensor_month_idx"),
+            models.Index(fields=["field", "month"], name="archive_field_month_idx"),
+            models.Index(fields=["cooperative", "month"], name="archive_coop_month_idx"),
+            models.Index(fields=["month"], name="archive_month_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.sensor_id} {self.month:%Y-%m} ({self.reading_count} readings)"
+
+
+class CurrentReading(models.Model):
+    """
+    Copy of the newest reading (by recorded_at, then id), kept up to date
+    on ingest (tracker.current). A copy rather than a foreign key, so
+    archiving or deleting readings never breaks it; reading_id may point
+    at a reading that is no longer in the readings table.
+    """
+    MEASUREMENTS = SensorReading.MEASUREMENTS
+
+    reading_id = models.BigIntegerField(null=True, blank=True)
+    recorded_at = models.DateTimeField()
+    ph = models.FloatField(null=True, blank=True)
+    moisture = models.FloatField(null=True, blank=True)
+    temperature = models.FloatField(null=True, blank=True)
+    nitrogen = models.FloatField(null=True, blank=True)
+    phosphorus = models.FloatField(null=True, blank=True)
+    potassium = models.FloatField(null=True, blank=True)
+    conductivity = models.FloatField(null=True, blank=True)
+    anomaly_flags = models.PositiveSmallIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+
+class SensorCurrentReading(CurrentReading):
+    sensor = models.OneToOneField(
+        Sensor,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="current_reading",
+    )
+
+    def __str__(self):
+        return f"Current reading of {self.sensor_id} at {self.recorded_at}"
+
+
+class FieldCurrentReading(CurrentReading):
+    """
+    The newest reading from any of the field's sensors.
+    """
+    field = models.OneToOneField(
+        FieldPlot,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="current_reading",
+    )
+    sensor = models.ForeignKey(Sensor, on_delete=models.CASCADE, related_name="+", db_index=False)
+    cooperative = models.ForeignKey(Cooperative, on_delete=models.CASCADE, null=True, related_name="+")
+
+    def __str__(self):
+        return f"Current reading of field {self.field_id} at {self.recorded_at}"
+
+
+class ViewTiming(models.Model):
+    """
+    One histogram bucket of one per-view measurement, summed over every
+    worker process (tracker.perf): requests that fell in the bucket and
+    the total of their values.
+    """
+    METRIC_CHOICES = [
+        ("wall", "Wall time (ms)"),
+        ("db", "Database time (ms)"),
+        ("render", "Template render time (ms)"),
+        ("queries", "SQL queries"),
+    ]
+
+    view_name = models.CharField(max_length=100)
+    metric = models.CharField(max_length=10, choices=METRIC_CHOICES)
+    bucket = models.PositiveSmallIntegerField(help_text="Index into the metric's bucket bounds")
+    count = models.PositiveBigIntegerField(default=0)
+    total = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["view_name", "metric", "bucket"],
+                name="unique_view_timing_bucket",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.view_name} {self.metric} bucket {self.bucket}: {self.count}"
+
+
+class QueryPattern(models.Model):
+    """
+    A statement a view ran repeatedly within single requests: the same
+    SQL with the same parameters (duplicate) or with different ones
+    (n_plus_one, usually a query per row of an earlier one).
+    """
+    KIND_CHOICES = [
+        ("duplicate", "Duplicate query"),
+        ("n_plus_one", "N+1 query"),
+    ]
+
+    view_name = models.CharField(max_length=100)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    fingerprint = models.CharField(max_length=40, help_text="SHA-1 of the normalised SQL")
+    sql = models.TextField()
+    requests = models.PositiveBigIntegerField(default=0, help_text="Requests it was seen in")
+    max_repeats = models.PositiveIntegerField(default=0, help_text="Most executions in one request")
+    last_seen = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["view_name", "kind", "fingerprint"],
+                name="unique_query_pattern",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} in {self.view_name}"
@@ -0,0 +1,215 @@
+"""
+Packed binary reading payloads, for gateways on slow or metered links.
+
+A payload is one or more sensor blocks, back to back. All integers are
+little-endian.
+
+Block header
+    2 bytes   magic b"ST"
+    1 byte    format version (1)
+    1 byte    sensor_id length, then that many bytes of UTF-8 sensor_id
+    4 bytes   base time, unsigned unix seconds
+    2 bytes   number of readings that follow
+
+Each reading
+    varint    seconds since the previous reading (the first: since the
+              base time); unsigned LEB128, so readings go oldest first
+    1 byte    presence bitmap: bit i set = FIELDS[i] is present, in the
+              order ph, moisture, temperature, nitrogen, phosphorus,
+              potassium, conductivity, battery_level
+    ...       the present values only, in the same order, as fixed-point
+              integers: value = stored / scale
+
+    ph             u16  / 100
+    moisture       u16  / 10     (percent)
+    temperature    i16  / 10     (degrees C)
+    nitrogen       u16  / 10     (mg/kg)
+    phosphorus     u16  / 10
+    potassium      u16  / 10
+    conductivity   u16  / 1000   (mS/cm)
+    battery_level  u8   / 1      (percent)
+
+A reading with every field takes about 18 bytes, against ~220 in the JSON
+API body.
+Timestamps have one-second resolution. The ingestion endpoints accept it
+with Content-Type application/vnd.soiltrack.packed, and the gateway
+listener for MQTT messages starting with the magic.
+"""
+import struct
+from datetime import datetime
+from functools import lru_cache
+from operator import truediv
+
+
+CONTENT_TYPE = "application/vnd.soiltrack.packed"
+MAGIC = b"ST"
+VERSION = 1
+
+# (record key, struct code, scale), in bitmap order.
+FIELDS = (
+    ("ph", "H", 100),
+    ("moisture", "H", 10),
+    ("temperature", "h", 10),
+    ("nitrogen", "H", 10),
+    ("phosphorus", "H", 10),
+    ("potassium", "H", 10),
+    ("conductivity", "H", 1000),
+    ("battery_level", "B", 1),
+)
+
+MAX_READINGS = 0xFFFF
+
+_HEADER = struct.Struct("<2sBB")
+_BASE = struct.Struct("<IH")
+_LIMITS = {"H": (0, 0xFFFF), "h": (-0x8000, 0x7FFF), "B": (0, 0xFF)}
+
+
+class PackedError(ValueError):
+    pass
+
+
+@lru_cache(maxsize=256)
+def _layout(bitmap):
+    """
+    (struct for the values, keys, scales) for one presence bitmap.
+    """
+    present = [FIELDS[i] for i in range(len(FIELDS)) if bitmap >> i & 1]
+    values = struct.Struct("<" + "".join(code for _, code, _ in present))
+    return values, tuple(key for key, _, _ in present), tuple(scale for _, _, scale in present)
+
+
+# =========================
+# ENCODING
+# =========================
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return out
+
+
+def _unix_seconds(value):
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    return int(value)
+
+
+def encode_block(sensor_id, readings):
+    """
+    One sensor block. ``readings`` are dicts with recorded_at (datetime or
+    unix seconds) and any of FIELDS; None or missing values are left out.
+    Raises PackedError on anything the format can't hold.
+    """
+    name = str(sensor_id).encode()
+    if not 0 < len(name) <= 0xFF:
+        raise PackedError("sensor_id must be 1-255 bytes")
+    if len(readings) > MAX_READINGS:
+        raise PackedError(f"at most {MAX_READINGS} readings per block")
+
+    try:
+        timed = sorted(((_unix_seconds(r["recorded_at"]), r) for r in readings), key=lambda item: item[0])
+    except (KeyError, TypeError, ValueError, OverflowError):
+        raise PackedError("every reading needs a finite recorded_at (datetime or unix seconds)")
+    base = timed[0][0] if timed else 0
+    if not 0 <= base <= 0xFFFFFFFF:
+        raise PackedError("recorded_at out of range")
+
+    out = bytearray(_HEADER.pack(MAGIC, VERSION, len(name)))
+    out += name
+    out += _BASE.pack(base, len(timed))
+    previous = base
+    for seconds, reading in timed:
+        out += _varint(seconds - previous)
+        previous = seconds
+        bitmap = 0
+        values = []
+        for i, (key, code, scale) in enumerate(FIELDS):
+            value = reading.get(key)
+            if value is None:
+                continue
+            try:
+                stored = round(value * scale)
+            except (TypeError, ValueError, OverflowError):
+                raise PackedError(f"{key} {value!r} is not a finite number")
+            low, high = _LIMITS[code]
+            if not low <= stored <= high:
+                raise PackedError(f"{key} {value!r} out of range for the packed format")
+            bitmap |= 1 << i
+            values.append(stored)
+        out.append(bitmap)
+        out += _layout(bitmap)[0].pack(*values)
+    return bytes(out)
+
+
+def encode_records(records):
+    """
+    A payload for ingest-style records (dicts with sensor_id), one block
+    per sensor.
+    """
+    by_sensor = {}
+    for record in records:
+        by_sensor.setdefault(record["sensor_id"], []).append(record)
+    out = bytearray()
+    for sensor_id, readings in by_sensor.items():
+        for start in range(0, len(readings), MAX_READINGS):
+            out += encode_block(sensor_id, readings[start:start + MAX_READINGS])
+    return bytes(out)
+
+
+# =========================
+# DECODING
+# =========================
+def decode(payload):
+    """
+    Ingest-style records (sensor_id, recorded_at as unix seconds, values)
+    from a payload. Raises PackedError on anything malformed.
+    """
+    data = memoryview(payload)
+    records = []
+    offset = 0
+    try:
+        while offset < len(data):
+            magic, version, name_length = _HEADER.unpack_from(data, offset)
+            if magic != MAGIC:
+                raise PackedError(f"bad magic at byte {offset}")
+            if version != VERSION:
+                raise PackedError(f"unsupported version {version}")
+            offset += _HEADER.size
+            sensor_id = bytes(data[offset:offset + name_length]).decode()
+            offset += name_length
+            seconds, count = _BASE.unpack_from(data, offset)
+            offset += _BASE.size
+
+            for _ in range(count):
+                byte = data[offset]
+                offset += 1
+                if byte < 0x80:
+                    seconds += byte
+                else:
+                    shift = 0
+                    while True:
+                        seconds += (byte & 0x7F) << shift
+                        if byte < 0x80:
+                            break
+                        shift += 7
+                        byte = data[offset]
+                        offset += 1
+                bitmap = data[offset]
+                values, keys, scales = _layout(bitmap)
+                stored = values.unpack_from(data, offset + 1)
+                offset += 1 + values.size
+
+                record = dict(zip(keys, map(truediv, stored, scales)))
+                record["sensor_id"] = sensor_id
+                record["recorded_at"] = seconds
+                records.append(record)
+    except (struct.error, IndexError):
+        raise PackedError(f"payload truncated at byte {offset}")
+    except UnicodeDecodeError:
+        raise PackedError("sensor_id is not valid UTF-8")
+    return records
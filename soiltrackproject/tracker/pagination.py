@@ -0,0 +1,87 @@
+import base64
+import json
+from dataclasses import dataclass
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+@dataclass
+class KeysetPage:
+    """
+    One page of a keyset-paginated queryset, newest first.
+    """
+    items: list
+    next_cursor: str | None
+    previous_cursor: str | None
+
+
+def encode_cursor(item, direction):
+    payload = {"t": item.recorded_at.isoformat(), "i": item.pk, "d": direction}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        recorded_at = parse_datetime(payload["t"])
+        pk = int(payload["i"])
+        direction = payload["d"]
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor("malformed cursor")
+    if recorded_at is None or direction not in ("next", "prev"):
+        raise InvalidCursor("malformed cursor")
+    return recorded_at, pk, direction
+
+
+def keyset_paginate(queryset, cursor=None, page_size=50):
+    """
+    Paginate ``queryset`` on (recorded_at, id) descending.
+
+    Each page is a range scan starting at the cursor position on the
+    (…, -recorded_at, -id) indexes, so page N costs the same as page 1,
+    and rows inserted meanwhile never shift the pages already seen.
+    """
+    queryset = queryset.order_by("-recorded_at", "-id")
+    direction = None
+
+    if cursor:
+        recorded_at, pk, direction = decode_cursor(cursor)
+        # The plain range on recorded_at gives the planner an index bound;
+        # the OR only resolves ties at the boundary timestamp.
+        if direction == "next":
+            queryset = queryset.filter(
+                Q(recorded_at__lt=recorded_at) | Q(id__lt=pk),
+                recorded_at__lte=recorded_at,
+            )
+        else:
+            queryset = queryset.filter(
+                Q(recorded_at__gt=recorded_at) | Q(id__gt=pk),
+                recorded_at__gte=recorded_at,
+            ).reverse()
+
+    rows = list(queryset[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if direction == "prev":
+        rows.reverse()
+
+    if not rows:
+        return KeysetPage(items=[], next_cursor=None, previous_cursor=None)
+
+    # Walking forward we know there's a previous page because we came from it;
+    # walking back the reverse holds.
+    has_next = has_more if direction != "prev" else True
+    has_previous = direction == "next" or (direction == "prev" and has_more)
+
+    return KeysetPage(
+        items=rows,
+        next_cursor=encode_cursor(rows[-1], "next") if has_next else None,
+        previous_cursor=encode_cursor(rows[0], "prev") if has_previous else None,
+    )
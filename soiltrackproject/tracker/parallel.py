@@ -0,0 +1,234 @@
+"""
+Parallel runner for the nightly analysis (insights + crop recommendations).
+
+Fields are sharded by cooperative and each shard is analysed in a
+ProcessPoolExecutor worker with its own database connection, writing its
+results with the same bulk path as tracker.analysis.generate_insights.
+The coordinator picks the shards, reports progress as shards finish and
+resubmits failed shards up to ``retries`` times. A worker that dies
+outright (killed, out of memory) breaks the whole pool; the coordinator
+then starts a new one and resubmits the shards that were lost with it.
+"""
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field as dataclass_field
+
+from django.db import connections
+
+from .analysis import dirty_fields
+from .models import FieldPlot
+
+
+@dataclass
+class ShardResult:
+    cooperative_id: int
+    fields: int
+    insights_created: int
+    recommendations_created: int
+    readings_used: int
+    elapsed: float
+
+
+@dataclass
+class ParallelRun:
+    workers: int
+    shards: int = 0
+    fields_recomputed: int = 0
+    fields_skipped: int = 0
+    insights_created: int = 0
+    recommendations_created: int = 0
+    readings_used: int = 0
+    retries: int = 0
+    pool_restarts: int = 0
+    elapsed: float = 0.0
+    failed: dict = dataclass_field(default_factory=dict)  # cooperative id -> error
+
+    def add(self, result):
+        self.insights_created += result.insights_created
+        self.recommendations_created += result.recommendations_created
+        self.readings_used += result.readings_used
+
+
+def get_workers():
+    return os.cpu_count() or 1
+
+
+def plan_shards(incremental=True, cooperative_ids=None):
+    """
+    [(cooperative id, [field ids])], largest shards first so the long
+    ones start early. Returns (shards, fields skipped).
+    """
+    fields = FieldPlot.objects.order_by("cooperative_id", "pk")
+    if cooperative_ids:
+        fields = fields.filter(cooperative_id__in=cooperative_ids)
+    rows = list(fields.values_list("cooperative_id", "pk"))
+
+    if incremental:
+        dirty = dirty_fields(None if not cooperative_ids else [pk for _, pk in rows])
+        selected = [(coop_id, pk) for coop_id, pk in rows if pk in dirty]
+    else:
+        selected = rows
+
+    shards = {}
+    for coop_id, pk in selected:
+        shards.setdefault(coop_id, []).append(pk)
+    ordered = sorted(shards.items(), key=lambda shard: len(shard[1]), reverse=True)
+    return ordered, len(rows) - len(selected)
+
+
+# =========================
+# WORKER
+# =========================
+def _init_worker(database_name):
+    """
+    Runs once per worker process; the worker opens its own connection on
+    first use (the coordinator closes its connections before forking).
+    The database name is passed explicitly so workers started with
+    "spawn" hit the same (possibly test) database as the coordinator.
+    """
+    import django
+
+    django.setup()
+    connections["default"].settings_dict["NAME"] = database_name
+
+
+def analyse_shard(cooperative_id, field_ids, options):
+    from .analysis import generate_insights
+
+    run = generate_insights(field_ids, incremental=False, **options)
+    return ShardResult(
+        cooperative_id=cooperative_id,
+        fields=len(field_ids),
+        insights_created=run.insights_created,
+        recommendations_created=run.recommendations_created,
+        readings_used=run.readings_used,
+        elapsed=run.elapsed,
+    )
+
+
+class InlineExecutor:
+    """
+    Executor that runs tasks in the calling process. Used when worker
+    processes could not see the database (in-memory SQLite, as in tests).
+    """
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def shutdown(self, wait=True):
+        pass
+
+    def submit(self, func, *args):
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+
+
+def _in_memory_database():
+    connection = connections["default"]
+    return connection.vendor == "sqlite" and connection.is_in_memory_db()
+
+
+# =========================
+# COORDINATOR
+# =========================
+def run_parallel(
+    workers=None,
+    incremental=True,
+    cooperative_ids=None,
+    retries=2,
+    progress=None,
+    **options,
+):
+    """
+    Analyse every (dirty) field, one cooperative per task. ``progress`` is
+    called as progress(event, done, total, detail) with event "done",
+    "retry" or "failed". ``options`` go to generate_insights (window,
+    recommend, top_k, ...).
+    """
+    started = time.perf_counter()
+    workers = workers or get_workers()
+    shards, skipped = plan_shards(incremental, cooperative_ids)
+    run = ParallelRun(
+        workers=workers,
+        shards=len(shards),
+        fields_recomputed=sum(len(field_ids) for _, field_ids in shards),
+        fields_skipped=skipped,
+    )
+    if not shards:
+        run.elapsed = time.perf_counter() - started
+        return run
+
+    progress = progress or (lambda *args: None)
+    fields_by_coop = dict(shards)
+    attempts = {}
+    done = 0
+    database_name = str(connections["default"].settings_dict["NAME"])
+
+    def start_pool():
+        if _in_memory_database():
+            return InlineExecutor()
+        # Forked workers must not inherit open connections.
+        connections.close_all()
+        return ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(database_name,)
+        )
+
+    def restart_pool():
+        nonlocal pool
+        pool.shutdown(wait=False)
+        pool = start_pool()
+        run.pool_restarts += 1
+
+    def submit(coop_id):
+        attempts[coop_id] = attempts.get(coop_id, 0) + 1
+        try:
+            future = pool.submit(analyse_shard, coop_id, fields_by_coop[coop_id], options)
+        except BrokenProcessPool:
+            restart_pool()
+            future = pool.submit(analyse_shard, coop_id, fields_by_coop[coop_id], options)
+        pending[future] = (coop_id, pool)
+
+    pool = start_pool()
+    pending = {}
+    try:
+        for coop_id, _ in shards:
+            submit(coop_id)
+        while pending:
+            future = next(as_completed(pending))
+            coop_id, owner = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as exc:
+                # Every shard still on a broken pool fails with it and is
+                # retried on the new one, like any other failure.
+                if isinstance(exc, BrokenProcessPool) and owner is pool:
+                    restart_pool()
+                if attempts[coop_id] <= retries:
+                    run.retries += 1
+                    progress("retry", done, len(shards), (coop_id, exc))
+                    submit(coop_id)
+                    continue
+                done += 1
+                run.failed[coop_id] = repr(exc)
+                progress("failed", done, len(shards), (coop_id, exc))
+                continue
+            done += 1
+            run.add(result)
+            progress("done", done, len(shards), result)
+    finally:
+        pool.shutdown()
+
+    run.fields_recomputed -= sum(len(fields_by_coop[coop_id]) for coop_id in run.failed)
+    run.elapsed = time.perf_counter() - started
+    return run
@@ -0,0 +1,548 @@
+"""
+Per-view performance instrumentation.
+
+PerfMiddleware measures every request that resolves to a named URL: wall
+time, SQL query count, time spent in the database (through a connection
+execute_wrapper, so it works with DEBUG off) and time spent rendering
+templates (through the TimedDjangoTemplates backend; queries a template
+triggers count towards both). Each value lands in a fixed-bucket
+histogram per view.
+
+The middleware runs in both the sync and the async request path. The
+request's profile travels in a ContextVar, which asgiref carries into the
+threads sync views and ORM calls run in under ASGI; the execute_wrapper
+is installed on every connection as it is created (tracker.signals) and
+reports to whichever profile is current.
+
+Within a request, statements are grouped by their SQL with IN and VALUES
+lists collapsed. One run SOILTRACK_PERF_REPEAT_THRESHOLD or more times
+with different parameters is flagged as an N+1 pattern; one run more
+than once with the same parameters as a duplicate.
+
+Each process keeps its numbers in memory and a background thread adds
+them to the ViewTiming and QueryPattern tables every
+SOILTRACK_PERF_FLUSH_SECONDS, with one upsert per table, so the tables
+sum up every worker and requests never write them. /metrics and
+``manage.py perf_report`` read them; /metrics adds the serving process's
+numbers not flushed yet, without writing anything itself.
+"""
+import atexit
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, close_old_connections, connection, connections, transaction
+from django.template.backends.django import DjangoTemplates, Template as BackendTemplate
+from django.utils import timezone
+
+from .models import QueryPattern, ViewTiming
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_SECONDS = 30
+MIN_FLUSH_SECONDS = 1
+DEFAULT_REPEAT_THRESHOLD = 5
+
+# Upper bounds of the histogram buckets; one more bucket holds the rest.
+TIME_BOUNDS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)  # ms
+QUERY_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+METRIC_BOUNDS = {
+    "wall": TIME_BOUNDS,
+    "db": TIME_BOUNDS,
+    "render": TIME_BOUNDS,
+    "queries": QUERY_BOUNDS,
+}
+
+# Views that are not measured: scraping the numbers shouldn't skew them.
+IGNORED_VIEWS = {"metrics"}
+
+_VALUES_LIST = re.compile(r"\((?:%s, )*%s\)(?:, \((?:%s, )*%s\))+")
+_IN_LIST = re.compile(r"\((?:%s, )+%s\)")
+
+_profile = ContextVar("tracker_perf_profile", default=None)
+
+
+def is_enabled():
+    return getattr(settings, "SOILTRACK_PERF_ENABLED", True)
+
+
+def get_flush_seconds():
+    return getattr(settings, "SOILTRACK_PERF_FLUSH_SECONDS", DEFAULT_FLUSH_SECONDS)
+
+
+def get_repeat_threshold():
+    return getattr(settings, "SOILTRACK_PERF_REPEAT_THRESHOLD", DEFAULT_REPEAT_THRESHOLD)
+
+
+def bucket_index(bounds, value):
+    for index, bound in enumerate(bounds):
+        if value <= bound:
+            return index
+    return len(bounds)
+
+
+def normalise_sql(sql):
+    """
+    The statement with variable-length parameter lists collapsed, so a
+    lookup for 3 ids and one for 30 count as the same query.
+    """
+    return _IN_LIST.sub("(...)", _VALUES_LIST.sub("(...)", sql))
+
+
+def fingerprint(sql):
+    return hashlib.sha1(sql.encode()).hexdigest()
+
+
+# =========================
+# MEASURING A REQUEST
+# =========================
+class RequestProfile:
+    """
+    What one request spent; also the execute_wrapper that measures it.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        # normalised SQL -> Counter of the parameters it ran with
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            key = normalise_sql(sql)
+            runs = self.statements.get(key)
+            if runs is None:
+                runs = self.statements[key] = Counter()
+            runs[None if many else repr(params)] += 1
+
+    def patterns(self, threshold):
+        """
+        [(kind, sql, executions)] of the statements flagged in this request.
+        """
+        flagged = []
+        for sql, runs in self.statements.items():
+            executions = sum(runs.values())
+            if executions >= threshold and len(runs) > 1:
+                flagged.append(("n_plus_one", sql, executions))
+            repeats = max(runs.values())
+            if repeats > 1:
+                flagged.append(("duplicate", sql, repeats))
+        return flagged
+
+
+def measure_query(execute, sql, params, many, context):
+    """
+    The execute_wrapper on every connection: counts the statement towards
+    the current request's profile, if there is one.
+    """
+    profile = _profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile(execute, sql, params, many, context)
+
+
+def install(connection):
+    # First in the list: connection.execute_wrapper() pops the last one.
+    if measure_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, measure_query)
+
+
+class TimedTemplate(BackendTemplate):
+    def render(self, context=None, request=None):
+        profile = _profile.get()
+        if profile is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.render_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend, adding each top-level render (includes
+    are part of it) to the current request's profile.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+# =========================
+# COLLECTING
+# =========================
+def _upsert(model, conflict, columns, rows, assignments):
+    """
+    INSERT ... ON CONFLICT (``conflict``) DO UPDATE SET ``assignments``
+    (SQLite >= 3.24 and PostgreSQL share this syntax); ``{table}`` and
+    ``{column}`` in an assignment are the quoted table and column.
+    """
+    if not rows:
+        return
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    updates = ", ".join(
+        f"{qn(column)} = " + expression.format(table=table, column=qn(column))
+        for column, expression in assignments.items()
+    )
+    batch_size = max(connection.ops.bulk_batch_size(columns, rows), 1)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            chunk = rows[start:start + batch_size]
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(map(qn, columns))}) "
+                f"VALUES {', '.join([placeholders] * len(chunk))} "
+                f"ON CONFLICT ({', '.join(map(qn, conflict))}) DO UPDATE SET {updates}",
+                [value for row in chunk for value in row],
+            )
+
+
+class PerfRecorder:
+    """
+    This process's histograms and flagged statements since the last flush.
+    The first record() starts the flusher thread; ``background=False``
+    leaves flushing to the caller (tests).
+    """
+
+    def __init__(self, flush_seconds=None, repeat_threshold=None, background=True):
+        self.flush_seconds = get_flush_seconds() if flush_seconds is None else flush_seconds
+        self.repeat_threshold = repeat_threshold or get_repeat_threshold()
+        self.background = background
+        self._lock = threading.Lock()
+        self._timings = {}   # (view, metric, bucket) -> [count, total]
+        self._patterns = {}  # (view, kind, sql) -> [requests, max repeats]
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def record(self, view_name, wall_time, profile):
+        values = {
+            "wall": wall_time * 1000,
+            "db": profile.db_time * 1000,
+            "render": profile.render_time * 1000,
+            "queries": profile.queries,
+        }
+        flagged = profile.patterns(self.repeat_threshold)
+        with self._lock:
+            for metric, value in values.items():
+                key = (view_name, metric, bucket_index(METRIC_BOUNDS[metric], value))
+                slot = self._timings.get(key)
+                if slot is None:
+                    slot = self._timings[key] = [0, 0.0]
+                slot[0] += 1
+                slot[1] += value
+            for kind, sql, repeats in flagged:
+                slot = self._patterns.setdefault((view_name, kind, sql), [0, 0])
+                slot[0] += 1
+                slot[1] = max(slot[1], repeats)
+            if self.background and self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="perf-flusher", daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stopped.wait(max(self.flush_seconds, MIN_FLUSH_SECONDS)):
+            # Long-running: drop connections the database has timed out.
+            close_old_connections()
+            self.try_flush()
+        connections.close_all()
+
+    def stop(self, flush=True):
+        """
+        Stop the flusher thread, writing what is left unless ``flush`` is
+        False. Registered with atexit.
+        """
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stopped.set()
+        thread.join()
+        if flush:
+            self.try_flush()
+
+    def pending(self):
+        """
+        Copies of what was collected since the last flush:
+        ({(view, metric, bucket): [count, total]},
+        {(view, kind, sql): [requests, max repeats]}).
+        """
+        with self._lock:
+            return (
+                {key: list(slot) for key, slot in self._timings.items()},
+                {key: list(slot) for key, slot in self._patterns.items()},
+            )
+
+    def try_flush(self):
+        try:
+            self.flush()
+        except DatabaseError:
+            logger.exception("perf: could not store request timings")
+
+    def flush(self):
+        """
+        Add everything collected so far to the tables. Returns the number
+        of histogram buckets written.
+        """
+        with self._lock:
+            timings, self._timings = self._timings, {}
+            patterns, self._patterns = self._patterns, {}
+
+        now = timezone.now()
+        db_now = ViewTiming._meta.get_field("updated_at").get_db_prep_value(now, connection)
+        added = "{table}.{column} + excluded.{column}"
+        with transaction.atomic():
+            _upsert(
+                ViewTiming,
+                ["view_name", "metric", "bucket"],
+                ["view_name", "metric", "bucket", "count", "total", "updated_at"],
+                [[*key, count, total, db_now] for key, (count, total) in timings.items()],
+                {"count": added, "total": added, "updated_at": "excluded.{column}"},
+            )
+            _upsert(
+                QueryPattern,
+                ["view_name", "kind", "fingerprint"],
+                ["view_name", "kind", "fingerprint", "sql", "requests", "max_repeats", "last_seen"],
+                [
+                    [view_name, kind, fingerprint(sql), sql, requests, repeats, db_now]
+                    for (view_name, kind, sql), (requests, repeats) in patterns.items()
+                ],
+                {
+                    "requests": added,
+                    "max_repeats": (
+                        "CASE WHEN excluded.{column} > {table}.{column} "
+                        "THEN excluded.{column} ELSE {table}.{column} END"
+                    ),
+                    "last_seen": "excluded.{column}",
+                },
+            )
+        return len(timings)
+
+
+_recorder = None
+
+
+def get_recorder():
+    global _recorder
+    if _recorder is None:
+        _recorder = PerfRecorder()
+    return _recorder
+
+
+def reset_recorder():
+    """
+    Drop the process recorder and anything not yet flushed (tests).
+    """
+    global _recorder
+    if _recorder is not None:
+        _recorder.stop(flush=False)
+    _recorder = None
+
+
+class PerfMiddleware:
+    """
+    Profiles each request (see the module docstring). List it first in
+    MIDDLEWARE so the wall time covers the other middleware too; the
+    body of a streaming response is produced after it and not counted.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not is_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        # Connections opened before tracker.signals was connected.
+        for alias in connections:
+            install(connections[alias])
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _profile.reset(token)
+        self.record(request, time.perf_counter() - started, profile)
+        return response
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _profile.reset(token)
+        self.record(request, time.perf_counter() - started, profile)
+        return response
+
+    def record(self, request, wall_time, profile):
+        match = request.resolver_match
+        if match is None or not match.url_name or match.view_name in IGNORED_VIEWS:
+            return
+        get_recorder().record(match.view_name, wall_time, profile)
+
+
+# =========================
+# REPORTING
+# =========================
+def load_histograms(view_name=None, pending=None):
+    """
+    {view: {metric: {"buckets": [count per bucket], "count": n, "sum": total}}}
+    summed over every process that flushed, plus ``pending`` timings
+    (PerfRecorder.pending) if given.
+    """
+    rows = ViewTiming.objects.order_by("view_name", "metric", "bucket")
+    if view_name:
+        rows = rows.filter(view_name=view_name)
+    rows = list(rows.values_list("view_name", "metric", "bucket", "count", "total"))
+    if pending:
+        rows.extend(
+            (*key, count, total) for key, (count, total) in pending.items()
+            if not view_name or key[0] == view_name
+        )
+        rows.sort(key=lambda row: row[:3])
+    histograms = {}
+    for row in rows:
+        name, metric, bucket, count, total = row
+        if metric not in METRIC_BOUNDS:
+            continue
+        histogram = histograms.setdefault(name, {}).setdefault(metric, {
+            "buckets": [0] * (len(METRIC_BOUNDS[metric]) + 1), "count": 0, "sum": 0.0,
+        })
+        histogram["buckets"][min(bucket, len(METRIC_BOUNDS[metric]))] += count
+        histogram["count"] += count
+        histogram["sum"] += total
+    return histograms
+
+
+def quantile(metric, histogram, q):
+    """
+    Upper bound of the bucket holding the ``q`` quantile; None when it
+    falls in the last, unbounded bucket.
+    """
+    bounds = METRIC_BOUNDS[metric]
+    target = q * histogram["count"]
+    seen = 0
+    for index, count in enumerate(histogram["buckets"]):
+        seen += count
+        if count and seen >= target:
+            return bounds[index] if index < len(bounds) else None
+    return None
+
+
+def summarise(histograms):
+    """
+    {view: {"requests": n, metric: {"mean", "p50", "p95"}}} for reports.
+    """
+    summary = {}
+    for name, metrics in histograms.items():
+        view = summary[name] = {"requests": metrics.get("wall", {}).get("count", 0)}
+        for metric, histogram in metrics.items():
+            view[metric] = {
+                "mean": histogram["sum"] / histogram["count"] if histogram["count"] else None,
+                "p50": quantile(metric, histogram, 0.5),
+                "p95": quantile(metric, histogram, 0.95),
+            }
+    return summary
+
+
+def flagged_patterns(view_name=None, pending=None):
+    """
+    Stored QueryPatterns, most frequent first per view. With ``pending``
+    patterns (PerfRecorder.pending) a list that includes them; new ones
+    are unsaved.
+    """
+    patterns = QueryPattern.objects.order_by("view_name", "-requests")
+    if view_name:
+        patterns = patterns.filter(view_name=view_name)
+    if not pending:
+        return patterns
+
+    merged = {(p.view_name, p.kind, p.fingerprint): p for p in patterns}
+    now = timezone.now()
+    for (name, kind, sql), (requests, repeats) in pending.items():
+        if view_name and name != view_name:
+            continue
+        key = (name, kind, fingerprint(sql))
+        pattern = merged.get(key)
+        if pattern is None:
+            merged[key] = QueryPattern(
+                view_name=name, kind=kind, fingerprint=key[2], sql=sql,
+                requests=requests, max_repeats=repeats, last_seen=now,
+            )
+        else:
+            pattern.requests += requests
+            pattern.max_repeats = max(pattern.max_repeats, repeats)
+            pattern.last_seen = now
+    return sorted(merged.values(), key=lambda p: (p.view_name, -p.requests))
+
+
+PROMETHEUS_METRICS = {
+    # metric -> (name, help, scale from the stored unit)
+    "wall": ("soiltrack_view_wall_seconds", "Request wall time by view.", 1000),
+    "db": ("soiltrack_view_db_seconds", "Time spent in SQL queries per request by view.", 1000),
+    "render": ("soiltrack_view_render_seconds", "Template render time per request by view.", 1000),
+    "queries": ("soiltrack_view_queries", "SQL queries per request by view.", 1),
+}
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(histograms, patterns):
+    """
+    The histograms and flagged statements in the Prometheus text format.
+    """
+    lines = []
+    for metric, (name, help_text, scale) in PROMETHEUS_METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        bounds = [f"{bound / scale:g}" for bound in METRIC_BOUNDS[metric]] + ["+Inf"]
+        for view_name, metrics in histograms.items():
+            histogram = metrics.get(metric)
+            if histogram is None:
+                continue
+            view = _label(view_name)
+            cumulative = 0
+            for bound, count in zip(bounds, histogram["buckets"]):
+                cumulative += count
+                lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{view="{view}"}} {histogram["sum"] / scale:g}')
+            lines.append(f'{name}_count{{view="{view}"}} {histogram["count"]}')
+
+    name = "soiltrack_view_query_pattern_requests"
+    lines.append(f"# HELP {name} Requests in which a view repeated a statement, by kind.")
+    lines.append(f"# TYPE {name} counter")
+    for pattern in patterns:
+        lines.append(
+            f'{name}{{view="{_label(pattern.view_name)}",kind="{pattern.kind}",'
+            f'fingerprint="{pattern.fingerprint}"}} {pattern.requests}'
+        )
+    return "\n".join(lines) + "\n"
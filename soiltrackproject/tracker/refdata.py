@@ -0,0 +1,66 @@
+"""
+Cached id/name lists for the filter dropdowns (cooperatives, fields,
+sensors), shared by every view that renders them.
+
+Entries are plain lists of dicts so any cache backend can pickle them
+(locmem, file-based, Redis...). They are dropped by the post_save /
+post_delete receivers in tracker.signals; the TTL only bounds staleness
+when each process has its own locmem cache.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Cooperative, FieldPlot, Sensor
+
+
+DEFAULT_TTL = 300
+
+# kind -> (model, ordering, name column)
+REFERENCE_DATA = {
+    "cooperatives": (Cooperative, "name", "name"),
+    "fields": (FieldPlot, "name", "name"),
+    "sensors": (Sensor, "sensor_id", "sensor_id"),
+}
+
+MODEL_KINDS = {model: kind for kind, (model, _, _) in REFERENCE_DATA.items()}
+
+
+def _cache_key(kind):
+    return f"tracker:refdata:{kind}"
+
+
+def get_ttl():
+    return getattr(settings, "SOILTRACK_REFERENCE_CACHE_TTL", DEFAULT_TTL)
+
+
+def get_reference_list(kind):
+    """
+    [{"id": ..., "name": ...}, ...] for ``kind``, ordered by name.
+    """
+    items = cache.get(_cache_key(kind))
+    if items is None:
+        model, ordering, name = REFERENCE_DATA[kind]
+        items = [
+            {"id": pk, "name": label}
+            for pk, label in model.objects.order_by(ordering).values_list("pk", name)
+        ]
+        cache.set(_cache_key(kind), items, get_ttl())
+    return items
+
+
+def get_cooperatives():
+    return get_reference_list("cooperatives")
+
+
+def get_fields():
+    return get_reference_list("fields")
+
+
+def get_sensors():
+    return get_reference_list("sensors")
+
+
+def invalidate_reference_data(model):
+    kind = MODEL_KINDS.get(model)
+    if kind:
+        cache.delete(_cache_key(kind))
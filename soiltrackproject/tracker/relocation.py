@@ -0,0 +1,66 @@
+"""
+Keeps the denormalized location of readings in step when a sensor moves
+to another field or a field to another cooperative.
+
+Readings, archive segments and field current readings carry the field
+and / or cooperative they were recorded under, copied when they are
+written, so history, exports and analytics filter without joins.
+tracker.signals remembers the stored location before a Sensor or
+FieldPlot is saved and, when it changed, calls sensor_moved() or
+field_moved(): one bulk UPDATE per table, in the save's transaction.
+"""
+from django.db import transaction
+
+from .analytics import invalidate_analytics
+from .current import refresh_field_current
+from .models import ArchiveSegment, FieldCurrentReading, FieldPlot, Sensor, SensorReading
+
+
+# model -> the foreign key that places it
+LOCATION_FIELDS = {
+    Sensor: "field",
+    FieldPlot: "cooperative",
+}
+
+
+def stored_location(instance, update_fields=None):
+    """
+    The primary key instance's location points at in the database, or
+    None when it is new or the save doesn't write the location.
+    """
+    name = LOCATION_FIELDS[type(instance)]
+    if instance._state.adding or instance.pk is None:
+        return None
+    if update_fields is not None and name not in update_fields:
+        return None
+    return (
+        type(instance)._base_manager
+        .filter(pk=instance.pk)
+        .values_list(f"{name}_id", flat=True)
+        .first()
+    )
+
+
+def sensor_moved(sensor, old_field_id):
+    """
+    Move the sensor's readings and archived months to its new field and
+    that field's cooperative; recompute both fields' current readings.
+    """
+    cooperative_id = FieldPlot.objects.values_list("cooperative_id", flat=True).get(pk=sensor.field_id)
+    location = {"field_id": sensor.field_id, "cooperative_id": cooperative_id}
+    with transaction.atomic():
+        SensorReading.objects.filter(sensor=sensor).update(**location)
+        ArchiveSegment.objects.filter(sensor=sensor).update(**location)
+        refresh_field_current([old_field_id, sensor.field_id])
+    transaction.on_commit(lambda: invalidate_analytics("readings"))
+
+
+def field_moved(field):
+    """
+    Move the field's readings, archived months and current reading to
+    its new cooperative.
+    """
+    with transaction.atomic():
+        for model in (SensorReading, ArchiveSegment, FieldCurrentReading):
+            model.objects.filter(field=field).update(cooperative_id=field.cooperative_id)
+    transaction.on_commit(lambda: invalidate_analytics("readings"))
@@ -0,0 +1,133 @@
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from .anomalies import clean_condition, exclude_anomalies
+from .models import ArchiveSegment, SensorReading, SensorRollup
+
+
+MEASUREMENTS = SensorRollup.MEASUREMENTS
+
+ROLLUP_FIELDS = ["reading_count", "last_reading_at", "updated_at"] + [
+    f"{name}_{part}" for name in MEASUREMENTS for part in ("sum", "count")
+]
+
+
+def _batch_deltas(readings):
+    """
+    Fold a list of new SensorReading objects into per-sensor deltas.
+    Values flagged as anomalies are counted in reading_count only.
+    """
+    skip_flagged = exclude_anomalies()
+    bits = {name: SensorReading.anomaly_bit(name) for name in MEASUREMENTS}
+    deltas = {}
+    for reading in readings:
+        delta = deltas.get(reading.sensor_id)
+        if delta is None:
+            delta = deltas[reading.sensor_id] = {
+                "reading_count": 0,
+                "last_reading_at": None,
+                **{f"{name}_{part}": 0 for name in MEASUREMENTS for part in ("sum", "count")},
+            }
+        delta["reading_count"] += 1
+        if delta["last_reading_at"] is None or reading.recorded_at > delta["last_reading_at"]:
+            delta["last_reading_at"] = reading.recorded_at
+        for name in MEASUREMENTS:
+            value = getattr(reading, name)
+            if value is None or (skip_flagged and reading.anomaly_flags & bits[name]):
+                continue
+            delta[f"{name}_sum"] += value
+            delta[f"{name}_count"] += 1
+    return deltas
+
+
+def apply_readings(readings):
+    """
+    Add a batch of freshly written readings to their sensors' rollups.
+    Must run inside the transaction that wrote the readings.
+
+    Costs three queries per batch regardless of how many sensors it touches:
+    create missing rows, lock the rollups, bulk_update them.
+    """
+    deltas = _batch_deltas(readings)
+    if not deltas:
+        return 0
+
+    SensorRollup.objects.bulk_create(
+        [SensorRollup(sensor_id=sensor_id) for sensor_id in deltas],
+        ignore_conflicts=True,
+    )
+    rollups = list(
+        SensorRollup.objects.select_for_update().filter(sensor_id__in=deltas.keys())
+    )
+
+    now = timezone.now()
+    for rollup in rollups:
+        delta = deltas[rollup.sensor_id]
+        rollup.reading_count += delta["reading_count"]
+        if rollup.last_reading_at is None or delta["last_reading_at"] > rollup.last_reading_at:
+            rollup.last_reading_at = delta["last_reading_at"]
+        for name in MEASUREMENTS:
+            for part in ("sum", "count"):
+                key = f"{name}_{part}"
+                setattr(rollup, key, getattr(rollup, key) + delta[key])
+        rollup.updated_at = now
+
+    SensorRollup.objects.bulk_update(rollups, ROLLUP_FIELDS)
+    return len(rollups)
+
+
+def rebuild_rollups(sensor_ids=None):
+    """
+    Recompute rollups from the readings table with one grouped aggregation,
+    plus the stored totals of archived segments.
+
+    Ingest only adds readings to the rollups. The admin rebuilds the
+    sensors whose readings it edits or deletes; any other update or delete
+    of readings (queryset.update(), a data migration, a backfill) must be
+    followed by this, or ``manage.py rebuild_rollups``.
+    """
+    readings = SensorReading.objects.order_by()
+    if sensor_ids is not None:
+        readings = readings.filter(sensor_id__in=sensor_ids)
+
+    aggregates = {
+        "reading_count": Count("id"),
+        "last_reading_at": Max("recorded_at"),
+    }
+    for name in MEASUREMENTS:
+        clean = clean_condition(name) if exclude_anomalies() else None
+        aggregates[f"{name}_sum"] = Sum(name, filter=clean, default=0.0)
+        aggregates[f"{name}_count"] = Count(name, filter=clean)
+
+    now = timezone.now()
+    rollups = {
+        row["sensor_id"]: SensorRollup(updated_at=now, **row)
+        for row in readings.values("sensor_id").annotate(**aggregates)
+    }
+
+    # Archived readings still count; their totals are kept per segment.
+    segments = ArchiveSegment.objects.order_by()
+    if sensor_ids is not None:
+        segments = segments.filter(sensor_id__in=sensor_ids)
+    for sensor_id, count, last, totals in segments.values_list(
+        "sensor_id", "reading_count", "last_recorded_at", "totals"
+    ):
+        rollup = rollups.get(sensor_id)
+        if rollup is None:
+            rollup = rollups[sensor_id] = SensorRollup(sensor_id=sensor_id, updated_at=now)
+        rollup.reading_count += count
+        if rollup.last_reading_at is None or last > rollup.last_reading_at:
+            rollup.last_reading_at = last
+        for name in MEASUREMENTS:
+            total, counted = totals.get(name, (0.0, 0))
+            setattr(rollup, f"{name}_sum", getattr(rollup, f"{name}_sum") + total)
+            setattr(rollup, f"{name}_count", getattr(rollup, f"{name}_count") + counted)
+
+    with transaction.atomic():
+        existing = SensorRollup.objects.all()
+        if sensor_ids is not None:
+            existing = existing.filter(sensor_id__in=sensor_ids)
+        existing.delete()
+        SensorRollup.objects.bulk_create(rollups.values(), batch_size=1000)
+    return len(rollups)
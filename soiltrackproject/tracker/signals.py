@@ -0,0 +1,57 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import perf, relocation
+from .alerts import invalidate_alert_rules
+from .models import AlertRule, FieldPlot, Sensor
+from .refdata import MODEL_KINDS, invalidate_reference_data
+from .stats import COUNTED_MODELS, invalidate_dashboard_stats
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def refresh_dashboard_counters(sender, created=True, **kwargs):
+    # Edits don't change counts; only creations and deletions do.
+    if sender in COUNTED_MODELS.values() and created:
+        invalidate_dashboard_stats()
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def refresh_reference_data(sender, **kwargs):
+    # Any save may rename an entry, so drop the list on every write.
+    if sender in MODEL_KINDS:
+        invalidate_reference_data(sender)
+
+
+@receiver(post_save, sender=AlertRule)
+@receiver(post_delete, sender=AlertRule)
+def refresh_alert_rules(sender, **kwargs):
+    invalidate_alert_rules()
+
+
+@receiver(connection_created)
+def measure_queries(sender, connection, **kwargs):
+    if perf.is_enabled():
+        perf.install(connection)
+
+
+@receiver(pre_save, sender=Sensor)
+@receiver(pre_save, sender=FieldPlot)
+def remember_location(sender, instance, update_fields=None, raw=False, **kwargs):
+    if not raw:
+        instance._stored_location = relocation.stored_location(instance, update_fields)
+
+
+@receiver(post_save, sender=Sensor)
+@receiver(post_save, sender=FieldPlot)
+def move_readings(sender, instance, raw=False, **kwargs):
+    # Readings carry their field and cooperative (tracker.relocation).
+    stored = getattr(instance, "_stored_location", None)
+    if raw or stored is None:
+        return
+    if sender is Sensor and stored != instance.field_id:
+        relocation.sensor_moved(instance, stored)
+    elif sender is FieldPlot and stored != instance.cooperative_id:
+        relocation.field_moved(instance)
@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from .models import (
+    AIInsight,
+    Cooperative,
+    CropRecommendation,
+    Farmer,
+    FieldPlot,
+    Sensor,
+    SensorRollup,
+)
+
+
+CACHE_KEY = "tracker:dashboard-stats"
+
+DEFAULT_TTL = 60
+
+# Context name -> model counted exactly with COUNT(*).
+COUNTED_MODELS = {
+    "total_coops": Cooperative,
+    "total_farmers": Farmer,
+    "total_fields": FieldPlot,
+    "total_sensors": Sensor,
+    "total_insights": AIInsight,
+    "total_recommendations": CropRecommendation,
+}
+
+
+def get_ttl():
+    return getattr(settings, "SOILTRACK_DASHBOARD_STATS_TTL", DEFAULT_TTL)
+
+
+def compute_dashboard_stats():
+    """
+    All dashboard counters in one query.
+
+    The readings total is approximate: it sums the per-sensor rollup
+    counters (kept up to date on ingest) instead of COUNT(*) over the
+    readings table, which is a full scan on SQLite and PostgreSQL.
+    """
+    quote = connection.ops.quote_name
+    selects = [
+        f"(SELECT COUNT(*) FROM {quote(model._meta.db_table)})"
+        for model in COUNTED_MODELS.values()
+    ]
+    selects.append(
+        f"(SELECT COALESCE(SUM({quote('reading_count')}), 0) "
+        f"FROM {quote(SensorRollup._meta.db_table)})"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT " + ", ".join(selects))
+        row = cursor.fetchone()
+
+    stats = dict(zip(COUNTED_MODELS, row))
+    stats["total_readings"] = int(row[-1])
+    stats["readings_approximate"] = True
+    stats["computed_at"] = timezone.now()
+    return stats
+
+
+def get_dashboard_stats():
+    """
+    Cached dashboard counters; recomputed at most once per TTL, or sooner
+    after a counted model is created or deleted (see tracker.signals).
+    """
+    stats = cache.get(CACHE_KEY)
+    if stats is None:
+        stats = compute_dashboard_stats()
+        cache.set(CACHE_KEY, stats, get_ttl())
+    return stats
+
+
+def invalidate_dashboard_stats():
+    cache.delete(CACHE_KEY)
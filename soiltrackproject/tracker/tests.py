@@ -1,3 +1,1571 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .alerts import get_alert_engine, reset_alert_engine
+from .archive import archive_readings, iter_readings
+from .buffer import IngestBuffer
+from .columnstore import ColumnStore
+from .downsampling import choose_resolution, get_series, run_downsampling
+from . import gateway
+from .gateway import (
+    FakeBroker,
+    GatewayListener,
+    decode_payload,
+    encode_payload,
+    sensor_topic,
+    subscriptions,
+    topic_matches,
+)
+from .ingest import IngestResult, ingest_batch
+from . import packed
+from .models import (
+    AlertRule,
+    AIInsight,
+    ArchiveSegment,
+    Cooperative,
+    CropProfile,
+    CropRecommendation,
+    DownsampleState,
+    Farmer,
+    FieldPlot,
+    Notification,
+    QueryPattern,
+    ReadingAggregate,
+    Sensor,
+    SensorHealth,
+    SensorReading,
+    SensorRollup,
+    ViewTiming,
+)
+from . import perf
+from .refdata import get_cooperatives, get_fields
+from .current import field_conditions, rebuild_current
+from .rollups import rebuild_rollups
+from .stats import compute_dashboard_stats, get_dashboard_stats
+
+
+# Request profiling is off except where a test turns it on: the recorder's
+# flusher thread must not write into the test database.
+_perf_disabled = override_settings(SOILTRACK_PERF_ENABLED=False)
+
+
+def setUpModule():
+    _perf_disabled.enable()
+
+
+def tearDownModule():
+    _perf_disabled.disable()
+
+
+def make_field(name="North block", coop=None):
+    coop = coop or Cooperative.objects.create(name="Abahuzamugambi")
+    farmer = Farmer.objects.create(cooperative=coop, full_name="Jean Uwimana", village="Gasabo")
+    return FieldPlot.objects.create(
+        cooperative=coop, farmer=farmer, name=name, code=f"{name[:3].upper()}-{FieldPlot.objects.count() + 1}"
+    )
+
+
+def make_sensor(sensor_id="S-001", field=None, sensor_type="npk"):
+    field = field or make_field()
+    return Sensor.objects.create(field=field, sensor_id=sensor_id, sensor_type=sensor_type)
+
+
+class IngestTests(TestCase):
+    def setUp(self):
+        self.sensor = make_sensor("S-001")
+        self.other = make_sensor("S-002", field=self.sensor.field)
+        # Compile the (empty) alert rules up front so query counts are per batch.
+        reset_alert_engine()
+        get_alert_engine()
+
+    def test_batch_writes_readings_and_updates_sensors(self):
+        now = timezone.now()
+        records = [
+            {"sensor_id": "S-001", "recorded_at": (now - timedelta(minutes=5)).isoformat(), "ph": 6.1},
+            {"sensor_id": "S-001", "recorded_at": now.isoformat(), "ph": 6.3, "battery_level": 80},
+            {"sensor_id": "S-002", "moisture": 31.5},
+        ]
+        with self.assertNumQueries(12):
+            # sensor lookup, savepoint, bulk_create, anomaly baselines,
+            # sensor bulk_update, rollup create/lock/update, sensor and
+            # field current reading upserts, late-reading watermarks, release
+            result = ingest_batch(records)
+
+        self.assertEqual(result.accepted, 3)
+        self.assertEqual(result.rejected, 0)
+        self.assertEqual(SensorReading.objects.count(), 3)
+        self.sensor.refresh_from_db()
+        self.assertEqual(self.sensor.last_seen, now)
+        self.assertEqual(self.sensor.battery_level, 80)
+
+    def test_invalid_records_are_rejected_individually(self):
+        records = [
+            {"sensor_id": "S-001", "ph": "acid"},
+            {"sensor_id": "S-404", "ph": 6.0},
+            {"sensor_id": "S-001"},
+            {"sensor_id": "S-002", "ph": 6.4},
+        ]
+        result = ingest_batch(records)
+        self.assertEqual((result.accepted, result.rejected), (1, 3))
+        self.assertEqual([e["index"] for e in result.errors], [0, 2, 1])
+
+    def test_out_of_range_values_are_rejected(self):
+        records = [
+            {"sensor_id": "S-001", "recorded_at": "2024-02-30T00:00:00", "ph": 6.0},
+            {"sensor_id": "S-001", "recorded_at": 1e20, "ph": 6.0},
+            {"sensor_id": "S-001", "ph": "nan"},
+            {"sensor_id": "S-001", "moisture": float("inf")},
+            {"sensor_id": "S-002", "ph": 6.4},
+        ]
+        result = ingest_batch(records)
+        self.assertEqual((result.accepted, result.rejected), (1, 4))
+        self.assertEqual(sorted(e["index"] for e in result.errors), [0, 1, 2, 3])
+
+    def test_endpoint_reports_counts(self):
+        response = self.client.post(
+            reverse("ingest_readings"),
+            data=json.dumps({"readings": [{"sensor_id": "S-001", "ph": 6.2}, {"sensor_id": "nope", "ph": 6}]}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body["accepted"], body["rejected"]), (1, 1))
+        self.assertEqual(len(body["batches"]), 1)
+        self.assertIn("rows_per_sec", body)
+
+
+class BufferedIngestTests(TestCase):
+    def setUp(self):
+        make_sensor("S-001")
+        # Write from the test thread so the test transaction sees the rows.
+        self.buffer = IngestBuffer(capacity=5, batch_size=1000, max_delay=60, dedicated_thread=False)
+        patcher = mock.patch("tracker.views.get_ingest_buffer", return_value=self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, records):
+        return self.async_client.post(
+            reverse("ingest_readings_buffered"),
+            data=json.dumps(records),
+            content_type="application/json",
+        )
+
+    async def test_readings_are_queued_then_written(self):
+        response = await self.post([
+            {"sensor_id": "S-001", "ph": 6.2},
+            {"sensor_id": "S-001", "ph": "acid"},
+            {"sensor_id": "S-001", "moisture": 30},
+        ])
+        self.assertEqual(response.status_code, 202)
+        body = response.json()
+        self.assertEqual((body["queued"], body["rejected"], body["buffered"]), (2, 1, 2))
+        self.assertEqual(await SensorReading.objects.acount(), 0)
+
+        await self.buffer.close()
+        self.assertEqual(await SensorReading.objects.acount(), 2)
+        self.assertEqual((self.buffer.stats.flushes, self.buffer.stats.written), (1, 2))
+
+    async def test_full_buffer_refuses_with_429(self):
+        response = await self.post([{"sensor_id": "S-001", "ph": 6.0}] * 4)
+        self.assertEqual(response.status_code, 202)
+
+        response = await self.post([{"sensor_id": "S-001", "ph": 6.0}] * 2)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "60")
+        self.assertEqual(len(self.buffer), 4)
+
+        response = await self.post([{"sensor_id": "S-001", "ph": 6.0}] * 6)
+        self.assertEqual(response.status_code, 413)
+
+        await self.buffer.close()
+        self.assertEqual(await SensorReading.objects.acount(), 4)
+
+    async def test_flushes_on_size_and_on_time(self):
+        batches = []
+
+        def writer(batch):
+            batches.append(len(batch))
+            return IngestResult(received=len(batch), accepted=len(batch))
+
+        buffer = IngestBuffer(capacity=10, batch_size=2, max_delay=0.05, writer=writer, dedicated_thread=False)
+        row = (0, "S-001", timezone.now(), {"ph": 6.0}, None)
+        buffer.offer([row] * 3)
+        await asyncio.sleep(0.01)
+        self.assertEqual(batches, [2])
+        self.assertEqual(len(buffer), 1)
+
+        await asyncio.sleep(0.2)
+        self.assertEqual(batches, [2, 1])
+        await buffer.close()
+
+    async def test_transient_write_errors_are_retried(self):
+        batches = []
+        failures = [ValueError("bad batch"), OperationalError("database is locked"), OperationalError("database is locked")]
+
+        def writer(batch):
+            if failures:
+                raise failures.pop()
+            batches.append(len(batch))
+            return IngestResult(received=len(batch), accepted=len(batch))
+
+        buffer = IngestBuffer(
+            capacity=10, batch_size=2, max_delay=60, writer=writer, dedicated_thread=False, retry_min=0.01,
+        )
+        row = (0, "S-001", timezone.now(), {"ph": 6.0}, None)
+        with self.assertLogs("tracker.buffer", "WARNING"):
+            buffer.offer([row] * 2)
+            buffer.offer([row] * 2)
+            await buffer.close()
+
+        # The first batch survives two locked writes, then a bad one drops it.
+        self.assertEqual(batches, [2])
+        self.assertEqual((buffer.stats.retries, buffer.stats.failed, buffer.stats.written), (2, 2, 2))
+        self.assertEqual(len(buffer), 0)
+
+    async def test_retries_are_capped_and_the_batch_dead_lettered(self):
+        attempts = []
+
+        def writer(batch):
+            attempts.append(len(batch))
+            raise OperationalError("database is locked")
+
+        buffer = IngestBuffer(
+            capacity=10, batch_size=2, max_delay=60, writer=writer, dedicated_thread=False,
+            retry_min=0.01, max_retries=2,
+        )
+        row = (0, "S-001", datetime(2024, 5, 1, tzinfo=dt_timezone.utc), {"ph": 6.0}, None)
+        with self.assertLogs("tracker.buffer", "WARNING") as logs:
+            buffer.offer([row] * 2)
+            await buffer.close()
+
+        self.assertEqual(attempts, [2, 2, 2])
+        self.assertEqual((buffer.stats.retries, buffer.stats.failed, buffer.stats.written), (2, 2, 0))
+        self.assertEqual(len(buffer), 0)
+        dead = [r for r in logs.records if r.name == "tracker.buffer.dead_letter"]
+        self.assertEqual(json.loads(dead[0].getMessage()), [
+            {"sensor_id": "S-001", "recorded_at": "2024-05-01T00:00:00+00:00", "battery_level": None, "ph": 6.0},
+        ] * 2)
+
+    def test_wsgi_requests_write_immediately(self):
+        response = self.client.post(
+            reverse("ingest_readings_buffered"),
+            data=json.dumps([{"sensor_id": "S-001", "ph": 6.2}]),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["accepted"], 1)
+        self.assertEqual(SensorReading.objects.count(), 1)
+
+
+class GatewayListenerTests(TestCase):
+    def setUp(self):
+        self.sensor = make_sensor("S-001")
+        self.coop_id = self.sensor.field.cooperative_id
+        self.broker = FakeBroker()
+        self.client = self.broker.client()
+        # A persistent session, as the listener's first connect would make.
+        self.client.connect()
+        self.client.subscribe(subscriptions()[0])
+
+    def publish(self, sensor_id, payload):
+        self.broker.publish(sensor_topic(self.coop_id, sensor_id), payload)
+
+    def test_topics_and_payloads(self):
+        self.assertTrue(topic_matches("soiltrack/+/sensors/+", "soiltrack/4/sensors/S-1"))
+        self.assertFalse(topic_matches("soiltrack/+/sensors/+", "soiltrack/4/sensors"))
+        self.assertTrue(topic_matches("soiltrack/#", "soiltrack/4/sensors/S-1"))
+        self.assertFalse(topic_matches("soiltrack/5/sensors/+", "soiltrack/4/sensors/S-1"))
+
+        payload = encode_payload([{"recorded_at": 1760000000, "ph": 6.4, "moisture": 31.0, "battery_level": 80}])
+        self.assertEqual(payload, b'{"t":1760000000,"ph":6.4,"m":31.0,"b":80}')
+        self.assertEqual(
+            decode_payload(payload),
+            [{"ph": 6.4, "moisture": 31.0, "recorded_at": 1760000000, "battery_level": 80}],
+        )
+
+    def test_listener_writes_batches_and_counts_per_topic(self):
+        self.publish("S-001", b'{"ph":6.1}')
+        self.publish("S-001", b'[{"ph":6.2,"t":1760000000},{"m":30}]')
+        self.publish("S-404", b'{"ph":6.3}')
+        self.publish("S-001", b"not json")
+        self.publish("S-001", packed.encode_block("S-001", [{"recorded_at": 1760000000, "ph": 6.5}]))
+
+        listener = GatewayListener(self.client, subscriptions(), batch_size=2, flush_seconds=60)
+        stats = listener.run(max_messages=5)
+
+        self.assertEqual(SensorReading.objects.count(), 4)
+        self.assertEqual((stats.written, stats.rejected, stats.flushes), (4, 1, 3))
+        topic = stats.topics[f"soiltrack/{self.coop_id}/sensors/+"]
+        self.assertEqual((topic.messages, topic.readings, topic.rejected), (5, 5, 1))
+
+    def test_reconnects_with_backoff_without_losing_messages(self):
+        self.publish("S-001", b'{"ph":6.1}')
+        self.publish("S-001", b'{"ph":6.2}')
+        receive = self.client.receive
+
+        def receive_then_drop(timeout):
+            message = receive(timeout)
+            if message is not None and message.payload == b'{"ph":6.1}':
+                self.broker.drop()
+                self.broker.refuse = 2
+            return message
+
+        sleeps = []
+        self.client.receive = receive_then_drop
+        listener = GatewayListener(self.client, subscriptions(), flush_seconds=60, sleep=sleeps.append)
+        stats = listener.run(max_messages=2)
+
+        self.assertEqual(sleeps, [1.0, 2.0])
+        self.assertEqual((stats.disconnects, stats.connect_failures), (1, 2))
+        self.assertEqual(SensorReading.objects.count(), 2)
+        self.assertEqual(stats.flushes, 2)
+
+    def test_bad_messages_and_failed_writes_do_not_stop_the_listener(self):
+        self.publish("S-001", b'{"t":1e20,"ph":6}')
+        self.publish("S-001", b'{"ph":6.1}')
+        self.publish("S-001", b'{"ph":6.2}')
+        write = gateway.ingest_parsed
+        failures = [OperationalError("database is locked")]
+
+        def flaky_write(batch):
+            if failures:
+                raise failures.pop()
+            return write(batch)
+
+        listener = GatewayListener(self.client, subscriptions(), batch_size=1, flush_seconds=60)
+        with mock.patch.object(gateway, "ingest_parsed", flaky_write), self.assertLogs("tracker.gateway"):
+            stats = listener.run(max_messages=3)
+
+        # The failed batch was kept and written on the final flush.
+        self.assertEqual(SensorReading.objects.count(), 2)
+        self.assertEqual(stats.write_failures, 1)
+        topic = stats.topics[f"soiltrack/{self.coop_id}/sensors/+"]
+        self.assertEqual((topic.messages, topic.readings, topic.rejected), (3, 2, 1))
+
+    def test_gateways_only_report_for_their_own_cooperative(self):
+        other = make_sensor("S-900", field=make_field("Hillside"))
+        self.publish("S-900", b'{"ph":6.1}')
+        self.publish("S-001", packed.encode_records([
+            {"sensor_id": "S-001", "recorded_at": 1760000000, "ph": 6.2},
+            {"sensor_id": "S-900", "recorded_at": 1760000000, "ph": 6.3},
+        ]))
+
+        listener = GatewayListener(self.client, subscriptions(), flush_seconds=60)
+        with self.assertLogs("tracker.gateway", "WARNING"):
+            stats = listener.run(max_messages=2)
+
+        self.assertEqual(list(SensorReading.objects.values_list("sensor__sensor_id", flat=True)), ["S-001"])
+        self.assertFalse(SensorReading.objects.filter(sensor=other).exists())
+        topic = stats.topics[f"soiltrack/{self.coop_id}/sensors/+"]
+        self.assertEqual((topic.messages, topic.readings, topic.rejected), (2, 1, 2))
+
+    def test_pending_readings_are_bounded(self):
+        for value in range(5):
+            self.publish("S-001", encode_payload([{"ph": 6 + value / 10}]))
+        listener = GatewayListener(self.client, subscriptions(), max_pending=3, flush_seconds=60)
+        with mock.patch.object(gateway, "ingest_parsed", side_effect=OperationalError("database is locked")), \
+                self.assertLogs("tracker.gateway"):
+            stats = listener.run(max_messages=5)
+
+        self.assertEqual(stats.dropped, 2)
+        self.assertEqual(len(listener._pending), 3)
+
+
+class PackedPayloadTests(TestCase):
+    def test_round_trip(self):
+        records = [
+            {"sensor_id": "S-001", "recorded_at": 1760000300, "ph": 6.42, "temperature": -3.5},
+            {"sensor_id": "S-001", "recorded_at": 1760000000, "moisture": 31.2, "battery_level": 77},
+            {"sensor_id": "S-002", "recorded_at": 1760000000, "conductivity": 0.815, "nitrogen": None},
+        ]
+        payload = packed.encode_records(records)
+
+        self.assertEqual(payload[:3], b"ST\x01")
+        self.assertEqual(packed.decode(payload), [
+            {"sensor_id": "S-001", "recorded_at": 1760000000, "moisture": 31.2, "battery_level": 77},
+            {"sensor_id": "S-001", "recorded_at": 1760000300, "ph": 6.42, "temperature": -3.5},
+            {"sensor_id": "S-002", "recorded_at": 1760000000, "conductivity": 0.815},
+        ])
+
+    def test_malformed_payloads_are_rejected(self):
+        payload = packed.encode_block("S-001", [{"recorded_at": 1760000000, "ph": 6.4}])
+        with self.assertRaises(packed.PackedError):
+            packed.decode(payload[:-1])
+        with self.assertRaises(packed.PackedError):
+            packed.decode(b"XX" + payload[2:])
+        with self.assertRaises(packed.PackedError):
+            packed.encode_block("S-001", [{"recorded_at": 1760000000, "moisture": 7000}])
+        for bad in (float("nan"), float("inf"), "6.4"):
+            with self.assertRaisesMessage(packed.PackedError, f"ph {bad!r} is not a finite number"):
+                packed.encode_block("S-001", [{"recorded_at": 1760000000, "ph": bad}])
+        for bad in (float("nan"), None, "soon"):
+            with self.assertRaises(packed.PackedError):
+                packed.encode_block("S-001", [{"recorded_at": bad, "ph": 6.4}])
+        with self.assertRaises(packed.PackedError):
+            packed.encode_block("S-001", [{"ph": 6.4}])
+
+    def test_ingest_endpoint_accepts_packed_bodies(self):
+        sensor = make_sensor("S-001")
+        payload = packed.encode_records([
+            {"sensor_id": "S-001", "recorded_at": 1760000000, "ph": 6.1},
+            {"sensor_id": "S-001", "recorded_at": 1760000060, "ph": 6.3, "battery_level": 64},
+            {"sensor_id": "S-404", "recorded_at": 1760000000, "ph": 6.3},
+        ])
+        response = self.client.post(reverse("ingest_readings"), data=payload, content_type=packed.CONTENT_TYPE)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()["accepted"], response.json()["rejected"]), (2, 1))
+        sensor.refresh_from_db()
+        self.assertEqual(sensor.battery_level, 64)
+        self.assertEqual(int(sensor.last_seen.timestamp()), 1760000060)
+
+        response = self.client.post(reverse("ingest_readings"), data=payload[:-2], content_type=packed.CONTENT_TYPE)
+        self.assertEqual(response.status_code, 400)
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.sensor = make_sensor("S-001")
+
+    def test_ingest_maintains_rollup_and_rebuild_matches(self):
+        ingest_batch([{"sensor_id": "S-001", "ph": 6.0, "moisture": 30}])
+        ingest_batch([{"sensor_id": "S-001", "ph": 7.0}])
+
+        rollup = SensorRollup.objects.get(sensor=self.sensor)
+        self.assertEqual(rollup.reading_count, 2)
+        self.assertAlmostEqual(rollup.mean("ph"), 6.5)
+        self.assertAlmostEqual(rollup.mean("moisture"), 30)
+        self.assertIsNone(rollup.mean("nitrogen"))
+
+        rebuild_rollups()
+        rebuilt = SensorRollup.objects.get(sensor=self.sensor)
+        self.assertEqual(rebuilt.reading_count, 2)
+        self.assertEqual(rebuilt.last_reading_at, rollup.last_reading_at)
+        self.assertAlmostEqual(rebuilt.mean("ph"), 6.5)
+
+    def test_edits_outside_ingest_need_a_rebuild_the_admin_does(self):
+        ingest_batch([{"sensor_id": "S-001", "ph": value} for value in (6.0, 7.0, 8.0)])
+
+        # A queryset update bypasses the rollups until they are rebuilt.
+        SensorReading.objects.filter(ph=8.0).update(ph=5.0)
+        self.assertAlmostEqual(SensorRollup.objects.get(sensor=self.sensor).mean("ph"), 7.0)
+        rebuild_rollups([self.sensor.pk])
+        self.assertAlmostEqual(SensorRollup.objects.get(sensor=self.sensor).mean("ph"), 6.0)
+
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pass"))
+        reading = SensorReading.objects.get(ph=5.0)
+        response = self.client.post(reverse("admin:tracker_sensorreading_delete", args=[reading.pk]), {"post": "yes"})
+        self.assertEqual(response.status_code, 302)
+        rollup = SensorRollup.objects.get(sensor=self.sensor)
+        self.assertEqual((rollup.reading_count, rollup.mean("ph")), (2, 6.5))
+
+        response = self.client.post(reverse("admin:tracker_sensorreading_changelist"), {
+            "action": "delete_selected",
+            "_selected_action": list(SensorReading.objects.values_list("pk", flat=True)),
+            "post": "yes",
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(SensorRollup.objects.filter(sensor=self.sensor).exists())
+
+    def test_sensor_page_reads_rollups(self):
+        make_sensor("S-002", field=self.sensor.field)
+        ingest_batch([{"sensor_id": "S-001", "ph": 6.0}, {"sensor_id": "S-001", "ph": 5.0}])
+
+        # The health counts, the sensor count and the page of sensors.
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("sensor"))
+        sensors = list(response.context["sensors"])
+
+        self.assertEqual([s.sensor_id for s in sensors[:1]], ["S-001"])
+        by_id = {s.sensor_id: s for s in sensors}
+        self.assertEqual(by_id["S-001"].reading_count, 2)
+        self.assertAlmostEqual(by_id["S-001"].avg_ph, 5.5)
+        self.assertEqual(by_id["S-002"].reading_count, 0)
+        self.assertIsNone(by_id["S-002"].avg_ph)
+
+
+class CurrentReadingTests(TestCase):
+    def setUp(self):
+        self.sensor = make_sensor("S-001")
+        self.other = make_sensor("S-002", field=self.sensor.field)
+        self.elsewhere = make_sensor("S-003", field=make_field("South block", coop=self.sensor.field.cooperative))
+
+    def test_ingest_keeps_the_newest_reading_per_sensor_and_field(self):
+        ingest_batch([
+            {"sensor_id": "S-001", "recorded_at": "2024-05-01T10:00:00+02:00", "ph": 6.0},
+            {"sensor_id": "S-001", "recorded_at": "2024-05-01T12:00:00+02:00", "ph": 6.2},
+            {"sensor_id": "S-002", "recorded_at": "2024-05-01T11:00:00+02:00", "ph": 5.5},
+            {"sensor_id": "S-003", "recorded_at": "2024-05-01T09:00:00+02:00", "moisture": 30.0},
+        ])
+        # A late reading doesn't replace a newer one; a newer one elsewhere does.
+        ingest_batch([
+            {"sensor_id": "S-001", "recorded_at": "2024-05-01T11:30:00+02:00", "ph": 9.9},
+            {"sensor_id": "S-002", "recorded_at": "2024-05-01T13:00:00+02:00", "ph": 5.8},
+        ])
+
+        self.assertEqual(self.sensor.current_reading.ph, 6.2)
+        conditions = field_conditions(coop_id=self.sensor.field.cooperative_id)
+        self.assertEqual(set(conditions), {self.sensor.field_id, self.elsewhere.field_id})
+        self.assertEqual(conditions[self.sensor.field_id]["sensor"], self.other.pk)
+        self.assertEqual(conditions[self.sensor.field_id]["ph"], 5.8)
+        self.assertEqual(conditions[self.elsewhere.field_id]["moisture"], 30.0)
+
+        rebuild_current()
+        self.assertEqual(field_conditions(), conditions)
+
+    def test_conditions_endpoint_is_one_query(self):
+        ingest_batch([{"sensor_id": sensor_id, "ph": 6.4} for sensor_id in ("S-001", "S-002", "S-003")])
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("current_conditions"), {
+                "field": f"{self.sensor.field_id},{self.elsewhere.field_id}",
+            })
+        fields = response.json()["fields"]
+        self.assertEqual(sorted(fields), sorted(str(pk) for pk in (self.sensor.field_id, self.elsewhere.field_id)))
+
+        response = self.client.get(reverse("current_conditions"), {"sensor": self.other.pk, "field": "x"})
+        self.assertEqual(response.status_code, 400)
+
+
+class RelocationTests(TestCase):
+    def test_moving_a_sensor_or_field_moves_its_readings(self):
+        sensor = make_sensor("S-001")
+        old_field = sensor.field
+        other_coop = Cooperative.objects.create(name="Other coop")
+        new_field = make_field("South block", coop=other_coop)
+        ingest_batch([
+            {"sensor_id": "S-001", "recorded_at": f"2024-01-{day:02d}T08:00:00+02:00", "ph": 6.0}
+            for day in (5, 12)
+        ] + [{"sensor_id": "S-001", "ph": 6.4}])
+        archive_readings(before=timezone.make_aware(datetime(2024, 2, 1)))
+
+        sensor.field = new_field
+        sensor.save()
+
+        response = self.client.get(reverse("history"), {"coop": other_coop.pk})
+        self.assertEqual(len(response.context["readings"]), 1)
+        self.assertEqual(len(list(iter_readings(coop_id=other_coop.pk))), 3)
+        self.assertEqual(list(iter_readings(field_id=old_field.pk)), [])
+        self.assertEqual(set(field_conditions()), {new_field.pk})
+
+        new_field.cooperative = old_field.cooperative
+        new_field.save()
+        self.assertEqual(len(list(iter_readings(coop_id=old_field.cooperative_id))), 3)
+        self.assertEqual(field_conditions(coop_id=old_field.cooperative_id)[new_field.pk]["ph"], 6.4)
+
+        with self.assertNumQueries(2):  # the stored field, the save; nothing moved
+            sensor.save()
+
+
+class DownsamplingTests(TestCase):
+    def setUp(self):
+        self.sensor = make_sensor("S-001")
+        # Monday 2025-10-06 08:00 local time.
+        self.start = timezone.make_aware(datetime(2025, 10, 6, 8, 0))
+        records = []
+        for hour in range(48):
+            for minute in (10, 40):
+                records.append({
+                    "sensor_id": "S-001",
+                    "recorded_at": (self.start + timedelta(hours=hour, minutes=minute)).isoformat(),
+                    "ph": 6.0 if minute == 10 else 7.0,
+                    "moisture": hour,
+                })
+        ingest_batch(records)
+
+    def test_levels_are_built_incrementally(self):
+        now = self.start + timedelta(days=14)
+        written = run_downsampling(now=now)
+        self.assertEqual(written["hour"], 48)
+        self.assertEqual(written["day"], 3)   # Mon (16h), Tue (24h), Wed (8h)
+        self.assertEqual(written["week"], 1)
+
+        day = ReadingAggregate.objects.get(resolution="day", bucket_start=self.start.replace(hour=0) + timedelta(days=1))
+        self.assertEqual(day.reading_count, 48)
+        self.assertAlmostEqual(day.ph_mean, 6.5)
+        self.assertEqual((day.moisture_min, day.moisture_max), (16, 39))
+
+        week = ReadingAggregate.objects.get(resolution="week")
+        self.assertEqual(week.reading_count, 96)
+        self.assertEqual((week.ph_min, week.ph_max), (6.0, 7.0))
+
+        # Nothing new: a second pass writes nothing.
+        self.assertEqual(run_downsampling(now=now), {"hour": 0, "day": 0, "week": 0})
+
+    def test_late_readings_recompute_their_buckets(self):
+        now = self.start + timedelta(days=14)
+        run_downsampling(now=now)
+        late = self.start + timedelta(days=1, hours=3, minutes=50)
+        ingest_batch([{"sensor_id": "S-001", "recorded_at": late.isoformat(), "ph": 6.5, "moisture": 40}])
+        self.assertEqual(DownsampleState.objects.filter(late_since=late).count(), 3)
+
+        written = run_downsampling(now=now)
+
+        # From the late reading's bucket on: Tue 11:00 to Wed 07:00, Tue and Wed, the week.
+        self.assertEqual(written, {"hour": 21, "day": 2, "week": 1})
+        hour = ReadingAggregate.objects.get(resolution="hour", bucket_start=late.replace(minute=0))
+        self.assertEqual((hour.reading_count, hour.moisture_max), (3, 40))
+        day = ReadingAggregate.objects.get(resolution="day", bucket_start=late.replace(hour=0, minute=0))
+        self.assertEqual((day.reading_count, day.moisture_max), (49, 40))
+        self.assertEqual(ReadingAggregate.objects.get(resolution="week").reading_count, 97)
+        self.assertFalse(DownsampleState.objects.filter(late_since__isnull=False).exists())
+        self.assertEqual(run_downsampling(now=now), {"hour": 0, "day": 0, "week": 0})
+
+    def test_series_picks_resolution_for_range(self):
+        run_downsampling(now=self.start + timedelta(days=14))
+        self.assertEqual(choose_resolution(self.start, self.start + timedelta(days=2)), "hour")
+        self.assertEqual(choose_resolution(self.start, self.start + timedelta(days=90)), "day")
+        self.assertEqual(choose_resolution(self.start, self.start + timedelta(days=3650)), "week")
+
+        resolution, series = get_series(self.start, self.start + timedelta(days=90), sensor_ids=[self.sensor.pk])
+        self.assertEqual(resolution, "day")
+        self.assertEqual(series.count(), 3)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.sensor = make_sensor("S-001")
+        self.other = make_sensor("S-002", field=make_field("East block"))
+        moment = timezone.now().replace(microsecond=0)
+        # Pairs of readings share a timestamp so id has to break the tie.
+        ingest_batch([
+            {"sensor_id": "S-001", "recorded_at": (moment - timedelta(minutes=i // 2)).isoformat(), "ph": 6.0}
+            for i in range(25)
+        ] + [{"sensor_id": "S-002", "recorded_at": moment.isoformat(), "ph": 7.0}])
+
+    def _walk(self, **params):
+        ids, cursor = [], None
+        while True:
+            query = dict(params, limit=10)
+            if cursor:
+                query["cursor"] = cursor
+            body = self.client.get(reverse("export_readings"), query).json()
+            ids.extend(row["id"] for row in body["results"])
+            cursor = body["next_cursor"]
+            if not cursor:
+                return ids, body
+
+    def test_pages_cover_filtered_readings_once_in_order(self):
+        ids, last = self._walk(field=self.sensor.field_id)
+        expected = list(
+            SensorReading.objects.filter(sensor=self.sensor)
+            .order_by("-recorded_at", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+        previous = self.client.get(
+            reverse("export_readings"),
+            {"field": self.sensor.field_id, "limit": 10, "cursor": last["previous_cursor"]},
+        ).json()
+        self.assertEqual([row["id"] for row in previous["results"]], expected[10:20])
+
+    def test_bad_cursor_is_rejected(self):
+        response = self.client.get(reverse("export_readings"), {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_history_page_renders_first_page(self):
+        response = self.client.get(reverse("history"), {"coop": self.sensor.field.cooperative_id})
+        self.assertEqual(len(response.context["readings"]), 25)
+        self.assertIsNone(response.context["page"].next_cursor)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.sensor = make_sensor("S-001")
+        ingest_batch([
+            {"sensor_id": "S-001", "recorded_at": f"2025-10-0{day}T08:00:00+02:00", "ph": 6.0 + day / 10}
+            for day in range(1, 6)
+        ])
+
+    def test_csv_download_streams_filtered_rows(self):
+        response = self.client.get(
+            reverse("download_readings"),
+            {"field": self.sensor.field_id, "start": "2025-10-02T00:00:00+02:00"},
+        )
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(",")[:5], ["id", "sensor_id", "field_id", "cooperative_id", "recorded_at"])
+        self.assertEqual(len(lines), 1 + 4)
+        self.assertEqual(lines[1].split(",")[1], "S-001")
+
+    async def test_asgi_download_is_streamed_chunk_by_chunk(self):
+        produced = []
+
+        def chunks(readings, export_format):
+            for chunk in (b"id\n", b"1\n", b"2\n"):
+                produced.append(chunk)
+                yield chunk
+
+        with mock.patch("tracker.views.stream_export", chunks):
+            response = await self.async_client.get(reverse("download_readings"))
+            self.assertTrue(response.is_async)
+            content = response.streaming_content
+            self.assertEqual(await anext(content), b"id\n")
+            self.assertEqual(produced, [b"id\n"])
+            self.assertEqual([chunk async for chunk in content], [b"1\n", b"2\n"])
+
+        response = await self.async_client.get(reverse("download_readings"))
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(body.decode().splitlines()), 1 + 5)
+
+    def test_impossible_dates_are_rejected(self):
+        response = self.client.get(reverse("download_readings"), {"start": "2024-02-30T00:00"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "start must be an ISO datetime"})
+        with self.assertRaisesMessage(CommandError, "--end must be an ISO datetime"):
+            call_command("export_readings", "--end", "2024-02-30T00:00", stdout=io.StringIO())
+
+    def test_unwritable_output_is_a_command_error(self):
+        with self.assertRaisesMessage(CommandError, "cannot write /nonexistent/readings.csv"):
+            call_command("export_readings", "--output", "/nonexistent/readings.csv", stderr=io.StringIO())
+
+    def test_parquet_download_round_trips(self):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            self.skipTest("pyarrow not installed")
+        import io
+
+        response = self.client.get(reverse("download_readings"), {"format": "parquet"})
+        table = pq.read_table(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(table.num_rows, 5)
+        self.assertAlmostEqual(table.column("ph")[0].as_py(), 6.1)
+
+    def test_parquet_without_pyarrow_is_501(self):
+        with mock.patch.dict(sys.modules, {"pyarrow": None, "pyarrow.parquet": None}):
+            response = self.client.get(reverse("download_readings"), {"format": "parquet"})
+            self.assertEqual(response.status_code, 501)
+            self.assertEqual(response.json(), {"error": "Parquet export needs the pyarrow package"})
+            with self.assertRaisesMessage(CommandError, "Parquet export needs the pyarrow package"):
+                call_command("export_readings", "--format", "parquet", "--output", os.devnull)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.sensor = make_sensor("S-001")
+        self.other = make_sensor("S-002", field=self.sensor.field)
+        records = [
+            {"sensor_id": sensor_id, "recorded_at": f"2024-{month:02d}-{day:02d}T{hour:02d}:30:00.250+02:00",
+             "ph": 6.0 + day / 100, "moisture": None if day % 3 else 30.0 + hour}
+            for sensor_id in ("S-001", "S-002")
+            for month in (1, 2)
+            for day in (5, 12, 19)
+            for hour in (6, 18)
+        ]
+        records.append({"sensor_id": "S-001", "ph": 6.6})   # now
+        ingest_batch(records)
+
+    def test_archiving_moves_whole_months_and_keeps_them_readable(self):
+        everything = list(iter_readings())
+        first_sensor = [row for row in everything if row[1] == "S-001"]
+        rollup = SensorRollup.objects.get(sensor=self.sensor)
+
+        run = archive_readings(before=timezone.make_aware(datetime(2024, 2, 1)))
+        self.assertEqual((run.months, run.segments, run.readings), (1, 2, 12))
+        run = archive_readings(now=timezone.now())
+        self.assertEqual((run.months, run.segments, run.readings), (1, 2, 12))
+
+        self.assertEqual(SensorReading.objects.count(), 1)
+        self.assertEqual(ArchiveSegment.objects.count(), 4)
+        self.assertEqual(list(iter_readings()), everything)
+        self.assertEqual(list(iter_readings(sensor_id=self.sensor.pk)), first_sensor)
+
+        start = timezone.make_aware(datetime(2024, 1, 19))
+        end = timezone.make_aware(datetime(2024, 2, 6))
+        self.assertEqual(
+            list(iter_readings(start=start, end=end)),
+            [row for row in everything if start <= row[4] < end],
+        )
+
+        rebuild_rollups()
+        rebuilt = SensorRollup.objects.get(sensor=self.sensor)
+        self.assertEqual(rebuilt.reading_count, rollup.reading_count)
+        self.assertAlmostEqual(rebuilt.mean("ph"), rollup.mean("ph"))
+        self.assertEqual(rebuilt.moisture_count, rollup.moisture_count)
+
+    def test_command_and_download_include_archived_months(self):
+        out = io.StringIO()
+        call_command("archive_readings", "--older-than-days", "0", stdout=out)
+        self.assertIn("Archived 24 readings from 2 months into 4 segments", out.getvalue())
+
+        response = self.client.get(reverse("download_readings"), {"sensor": self.sensor.pk})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 1 + 13)
+        self.assertTrue(lines[1].split(",")[4].startswith("2024-01-05T04:30:00.250000"))
+
+
+class ColumnStoreTests(TestCase):
+    def setUp(self):
+        self.sensor = make_sensor("S-001")
+        self.other = make_sensor("S-002")
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.store = ColumnStore(self.directory.name)
+
+    def ingest(self, month, days, ph=6.0):
+        ingest_batch([
+            {"sensor_id": sensor_id, "recorded_at": f"2024-{month:02d}-{day:02d}T08:00:00+02:00",
+             "ph": ph + day / 10, "moisture": None if day % 2 else 30.0}
+            for day in days
+            for sensor_id in ("S-001", "S-002")
+        ])
+
+    def test_sync_appends_and_answers_from_mapped_slices(self):
+        import numpy as np
+
+        self.ingest(1, (20, 25))
+        self.ingest(2, (1, 2))
+        self.assertEqual(self.store.sync().readings, 8)
+        self.assertEqual(self.store.months(), ["2024-01", "2024-02"])
+
+        # Later readings extend January's run, a late one starts another.
+        self.ingest(1, (28,))
+        self.store.sync()
+        self.ingest(1, (10,))
+        self.assertEqual(self.store.sync().readings, 2)
+        self.assertEqual(self.store.state()["months"]["2024-01"], {"rows": 8, "runs": [0, 6]})
+        self.assertEqual(self.store.sync().readings, 0)
+
+        start = timezone.make_aware(datetime(2024, 1, 22))
+        end = timezone.make_aware(datetime(2024, 2, 2))
+        parts = list(self.store.slices(start, end, ["recorded_at", "ph"]))
+        self.assertTrue(all(isinstance(part["ph"], np.memmap) for part in parts))
+        self.assertEqual(sum(len(part["ph"]) for part in parts), 6)
+
+        expected = [
+            value for value in SensorReading.objects.filter(
+                sensor=self.sensor, recorded_at__gte=start, recorded_at__lt=end
+            ).values_list("ph", flat=True)
+        ]
+        summary = self.store.summary("ph", start, end, percentiles=(50,), sensor_id=self.sensor.pk)
+        self.assertEqual(summary["count"], len(expected))
+        self.assertAlmostEqual(summary["mean"], sum(expected) / len(expected))
+        self.assertAlmostEqual(summary["p50"], float(np.median(expected)))
+        self.assertEqual(self.store.summary("moisture")["count"], 8)
+
+    def test_readings_archived_before_a_sync_are_picked_up(self):
+        self.ingest(1, (2, 3))
+        self.store.sync()
+        self.ingest(1, (4,))
+        ingest_batch([{"sensor_id": "S-001", "ph": 7.0}])
+        archive_readings(before=timezone.make_aware(datetime(2024, 2, 1)))
+
+        run = self.store.sync()
+        self.assertEqual((run.readings, run.archived), (3, 2))
+        self.assertEqual(len(self.store), 7)
+        summary = self.store.summary("ph")
+        self.store.rebuild()
+        self.assertEqual(self.store.summary("ph"), summary)
+
+        out = io.StringIO()
+        with self.settings(SOILTRACK_COLUMN_STORE_DIR=self.directory.name):
+            call_command("sync_column_store", stdout=out)
+        self.assertIn("Synced 0 readings", out.getvalue())
+
+
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.sensor = make_sensor("S-001")
+        ingest_batch([{"sensor_id": "S-001", "ph": 6.0}, {"sensor_id": "S-001", "ph": 6.2}])
+
+    def test_counters_in_one_query(self):
+        with self.assertNumQueries(1):
+            stats = compute_dashboard_stats()
+        self.assertEqual(stats["total_coops"], 1)
+        self.assertEqual(stats["total_sensors"], 1)
+        self.assertEqual(stats["total_readings"], 2)
+
+    def test_snapshot_is_cached_and_invalidated_on_create(self):
+        get_dashboard_stats()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_dashboard_stats()["total_coops"], 1)
+
+        Cooperative.objects.create(name="Twitezimbere")
+        self.assertEqual(get_dashboard_stats()["total_coops"], 2)
+
+    def test_snapshot_is_invalidated_by_ingest(self):
+        # Readings are bulk created, so no model signal fires: ingest
+        # invalidates the snapshot itself once the batch commits.
+        self.assertEqual(get_dashboard_stats()["total_readings"], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_batch([{"sensor_id": "S-001", "ph": 6.4}])
+        self.assertEqual(get_dashboard_stats()["total_readings"], 3)
+
+        from .analysis import generate_insights
+        self.assertEqual(get_dashboard_stats()["total_insights"], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            generate_insights()
+        self.assertEqual(get_dashboard_stats()["total_insights"], 1)
+
+
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.sensor = make_sensor("S-001")
+        self.idle = make_sensor("S-002", field=self.sensor.field)
+        self.coop_id = self.sensor.field.cooperative_id
+        self.other = make_sensor("S-003", field=make_field("Hillside", coop=Cooperative.objects.create(name="Twitezimbere")))
+        # Noon, so both readings of S-001 fall on the same day.
+        yesterday = timezone.localtime().replace(hour=12, minute=0) - timedelta(days=1)
+        ingest_batch([
+            {"sensor_id": "S-001", "recorded_at": yesterday.isoformat(), "ph": 6.0, "moisture": 30},
+            {"sensor_id": "S-001", "recorded_at": (yesterday - timedelta(minutes=10)).isoformat(), "ph": 6.4},
+            {"sensor_id": "S-003", "recorded_at": yesterday.isoformat(), "ph": 5.0},
+            {"sensor_id": "S-003", "recorded_at": (yesterday - timedelta(days=60)).isoformat(), "ph": 5.5},
+        ])
+
+    def test_metrics_are_grouped_queries(self):
+        from .analytics import compute_metric, make_window
+
+        window = make_window(coop=str(self.coop_id), days="30")
+        with self.assertNumQueries(2):  # downsampled buckets, recent readings
+            trends = compute_metric("trends", window)["results"]
+        self.assertEqual(len(trends), 1)
+        self.assertEqual(trends[0]["readings"], 2)
+        self.assertAlmostEqual(trends[0]["ph"], 6.2)
+        self.assertEqual(trends[0]["moisture"], 30)
+
+        with self.assertNumQueries(3):  # as above, plus active sensor totals
+            uptime = compute_metric("uptime", make_window(days="90", bucket="week"))["results"]
+        by_coop = {}
+        for row in uptime:
+            by_coop.setdefault(row["cooperative"], []).append(row)
+        self.assertEqual([(row["reporting"], row["sensors"], row["uptime"]) for row in by_coop[self.coop_id]],
+                         [(1, 2, 0.5)])
+        self.assertEqual(len(by_coop[self.other.field.cooperative_id]), 2)
+
+        AIInsight.objects.bulk_create([
+            AIInsight(field=self.sensor.field, summary="", suitability_score=score, nutrient_score=nutrient)
+            for score, nutrient in ((72, 60), (78, 80), (95, 90))
+        ])
+        with self.assertNumQueries(1):
+            scores = compute_metric("scores", make_window())["results"]
+        self.assertEqual(
+            [(row["band"], row["insights"], row["nutrient"]) for row in scores],
+            [([70, 79], 2, 70), ([90, 99], 1, 90)],
+        )
+
+    def test_closed_buckets_come_from_downsampled_aggregates(self):
+        from .analytics import compute_metric, make_window
+
+        window = make_window(days="90", bucket="week")
+        raw = {name: compute_metric(name, window)["results"] for name in ("trends", "uptime")}
+        run_downsampling()
+        self.assertTrue(ReadingAggregate.objects.filter(resolution="week").exists())
+        for name, results in raw.items():
+            self.assertEqual(compute_metric(name, window)["results"], results)
+
+    def test_api_is_cached_until_new_readings(self):
+        url = reverse("analytics", args=["trends"])
+        first = self.client.get(url, {"coop": self.coop_id}).json()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, {"coop": self.coop_id}).json(), first)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_batch([{"sensor_id": "S-001", "ph": 7.0}])
+        results = self.client.get(url, {"coop": self.coop_id}).json()["results"]
+        self.assertEqual(sum(row["readings"] for row in results), 3)
+
+        self.assertEqual(self.client.get(url, {"days": "0"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"bucket": "month"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("analytics", args=["nope"])).status_code, 400)
+
+
+@override_settings(SOILTRACK_PERF_ENABLED=True)
+class PerfInstrumentationTests(TestCase):
+    def setUp(self):
+        self.recorder = perf._recorder = perf.PerfRecorder(flush_seconds=0, repeat_threshold=5, background=False)
+        self.addCleanup(perf.reset_recorder)
+
+    def test_requests_are_recorded_per_view(self):
+        make_sensor("S-001")
+        self.client.get(reverse("home"))
+        self.client.get(reverse("history"))
+        with self.assertNumQueries(1):  # requests never flush
+            self.client.get(reverse("history"))
+
+        # Nor does /metrics: it reads the stored rows and adds this process's
+        # pending numbers.
+        with self.assertNumQueries(2):
+            data = self.client.get(reverse("metrics"), {"format": "json"}).json()["views"]
+        self.assertEqual(ViewTiming.objects.count(), 0)
+        self.assertEqual(set(data), {"home", "history"})  # /metrics itself isn't measured
+        self.assertEqual(data["history"]["requests"], 2)
+        self.assertGreater(data["home"]["render"]["mean"], 0)
+        self.assertGreater(data["home"]["db"]["mean"], 0)
+        self.assertGreaterEqual(data["home"]["queries"]["mean"], 1)
+
+        self.recorder.flush()
+        self.client.get(reverse("history"))
+        text = self.client.get(reverse("metrics")).content.decode()
+        # Two stored, one pending.
+        self.assertIn('soiltrack_view_wall_seconds_count{view="history"} 3', text)
+        self.assertIn('soiltrack_view_queries_bucket{view="home",le="+Inf"} 1', text)
+
+    async def test_async_requests_are_measured(self):
+        await sync_to_async(make_sensor)("S-001")
+        await self.async_client.get(reverse("history"))
+        await sync_to_async(self.recorder.flush)()
+        queries = await ViewTiming.objects.aget(view_name="history", metric="queries")
+        self.assertEqual(queries.count, 1)
+        self.assertGreater(queries.total, 0)
+
+    def test_flusher_thread_writes_what_is_left_on_stop(self):
+        recorder = perf.PerfRecorder(flush_seconds=3600)
+        with mock.patch.object(recorder, "flush") as flush:
+            recorder.record("home", 0.01, perf.RequestProfile())
+            self.assertTrue(recorder._thread.is_alive())
+            recorder.stop()
+        flush.assert_called_once_with()
+        self.assertIsNone(recorder._thread)
+
+    def test_repeated_statements_are_flagged(self):
+        for i in range(5):
+            make_sensor(f"S-{i}")
+        profile = perf.RequestProfile()
+        with connection.execute_wrapper(profile):
+            for sensor in Sensor.objects.all():
+                sensor.field  # one query per sensor
+            Cooperative.objects.count()
+            Cooperative.objects.count()
+        kinds = {kind: repeats for kind, sql, repeats in profile.patterns(threshold=5)}
+        self.assertEqual(kinds, {"n_plus_one": 5, "duplicate": 2})
+
+        self.recorder.record("sensor", 0.05, profile)
+        self.recorder.record("sensor", 0.02, profile)
+        pending = self.client.get(reverse("metrics"), {"format": "json"}).json()["patterns"]
+        self.assertEqual(
+            {(p["kind"], p["requests"], p["max_repeats"]) for p in pending},
+            {("n_plus_one", 2, 5), ("duplicate", 2, 2)},
+        )
+        self.recorder.flush()
+        n_plus_one = QueryPattern.objects.get(kind="n_plus_one")
+        self.assertEqual((n_plus_one.view_name, n_plus_one.requests, n_plus_one.max_repeats), ("sensor", 2, 5))
+        self.assertEqual(ViewTiming.objects.get(view_name="sensor", metric="queries").count, 2)
+
+        out = io.StringIO()
+        call_command("perf_report", stdout=out)
+        self.assertIn("N+1 query in 2 requests, up to 5x per request", out.getvalue())
+
+
+class ReferenceDataTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.field = make_field("North block")
+
+    def test_lists_are_cached_and_invalidated_by_signals(self):
+        self.assertEqual(get_fields(), [{"id": self.field.pk, "name": "North block"}])
+        with self.assertNumQueries(0):
+            get_fields()
+
+        self.field.name = "Demo plot"
+        self.field.save()
+        self.assertEqual(get_fields()[0]["name"], "Demo plot")
+
+        self.field.cooperative.delete()
+        self.assertEqual(get_cooperatives(), [])
+        self.assertEqual(get_fields(), [])
+
+    def test_filter_views_reuse_cached_lists(self):
+        self.client.get(reverse("history"))
+        with self.assertNumQueries(1):  # only the readings page itself
+            self.client.get(reverse("history"))
+
+
+class CooperativeCountTests(TestCase):
+    def _add_coops(self, count):
+        for i in range(count):
+            coop = Cooperative.objects.create(name=f"Coop {Cooperative.objects.count():02d}")
+            for j in range(3):
+                make_field(f"Plot {i}-{j}", coop=coop)
+
+    def test_counts_match_relations(self):
+        self._add_coops(2)
+        coop = Cooperative.objects.with_counts().order_by("name").first()
+        self.assertEqual((coop.member_count, coop.field_count), (3, 3))
+
+    def test_view_query_count_is_constant(self):
+        for total in (1, 6):
+            self._add_coops(total - Cooperative.objects.count())
+            # first cooperative, cooperative list with counts, farmers, fields,
+            # sensors (none, so no latest readings)
+            with self.assertNumQueries(5):
+                response = self.client.get(reverse("cooperatives"))
+            counts = [(c.member_count, c.field_count) for c in response.context["cooperatives"]]
+            self.assertEqual(counts, [(3, 3)] * total)
+
+    def test_admin_changelist_query_count_is_constant(self):
+        admin_user = User.objects.create_superuser("admin", "admin@example.com", "pass")
+        self.client.force_login(admin_user)
+        url = reverse("admin:tracker_cooperative_changelist")
+
+        queries = []
+        for total in (1, 6):
+            self._add_coops(total - Cooperative.objects.count())
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(url)
+            self.assertContains(response, "Coop 00")
+            queries.append(len(captured))
+        self.assertEqual(queries[0], queries[1])
+
+
+class CooperativeDetailTests(TestCase):
+    def _populate(self, coop, fields):
+        for i in range(fields):
+            field = make_field(f"Plot {coop.pk}-{i}", coop=coop)
+            for j in range(2):
+                make_sensor(f"S-{field.pk}-{j}", field=field)
+        ingest_batch([
+            {"sensor_id": sensor_id, "ph": 6.0 + n / 10}
+            for sensor_id in Sensor.objects.filter(field__cooperative=coop).values_list("sensor_id", flat=True)
+            for n in range(3)
+        ])
+
+    def test_query_count_does_not_grow_with_cooperative_size(self):
+        small = Cooperative.objects.create(name="Small")
+        large = Cooperative.objects.create(name="Large")
+        self._populate(small, 1)
+        self._populate(large, 8)
+
+        for coop in (small, large):
+            # cooperative, selector list, farmers, fields, sensors, latest readings
+            with self.assertNumQueries(6):
+                response = self.client.get(reverse("cooperative_detail", args=[coop.pk]))
+            self.assertEqual(response.context["cooperative"], coop)
+
+        sensors = [s for f in response.context["fields"] for s in f.sensors.all()]
+        self.assertEqual(len(sensors), 16)
+        self.assertTrue(all(s.latest_reading.ph == 6.2 for s in sensors))
+
+    def test_fields_and_members_are_paginated(self):
+        coop = Cooperative.objects.create(name="Large")
+        self._populate(coop, 5)
+
+        with mock.patch("tracker.views.COOPERATIVE_PAGE_SIZE", 2), self.assertNumQueries(6):
+            response = self.client.get(reverse("cooperative_detail", args=[coop.pk]), {"fields": 3})
+
+        fields = response.context["fields"]
+        self.assertEqual([f.name for f in fields], ["Plot %d-4" % coop.pk])
+        self.assertEqual(len(fields[0].sensors.all()), 2)
+        self.assertTrue(all(s.latest_reading.ph == 6.2 for s in fields[0].sensors.all()))
+        self.assertEqual(len(response.context["farmers"]), 2)
+        self.assertContains(response, "Page 3 of 3")
+        self.assertContains(response, "Showing 1–2 of 5 members")
+
+    def test_unknown_cooperative_is_404(self):
+        self.assertEqual(self.client.get(reverse("cooperative_detail", args=[999])).status_code, 404)
+
+
+class InsightEngineTests(TestCase):
+    def test_scores_good_and_poor_fields(self):
+        from .analysis import generate_insights
+
+        good = make_sensor("S-GOOD")
+        poor = make_sensor("S-POOR", field=make_field("Swamp"))
+        make_field("No sensors")
+        ingest_batch([
+            {"sensor_id": "S-GOOD", "ph": 6.5, "moisture": 32 + i % 3, "nitrogen": 120,
+             "phosphorus": 40, "potassium": 170, "conductivity": 0.4}
+            for i in range(10)
+        ] + [
+            {"sensor_id": "S-POOR", "ph": 4.6, "moisture": 55, "nitrogen": 30,
+             "phosphorus": 8, "potassium": 60, "conductivity": 2.4}
+            for i in range(10)
+        ])
+
+        run = generate_insights()
+        self.assertEqual((run.fields_considered, run.insights_created), (3, 2))
+
+        good_insight = AIInsight.objects.get(field=good.field)
+        poor_insight = AIInsight.objects.get(field=poor.field)
+        self.assertEqual(good_insight.suitability_score, 100)
+        self.assertEqual(good_insight.nutrient_score, 100)
+        self.assertLess(poor_insight.suitability_score, 30)
+        self.assertIn("improve drainage", poor_insight.summary)
+
+
+class CropMatchingTests(TestCase):
+    def test_recommendations_replaced_and_linked(self):
+        from .analysis import generate_insights
+
+        sensor = make_sensor("S-MAIZE")
+        CropRecommendation.objects.create(field=sensor.field, crop_name="Hand-entered")
+        ingest_batch([
+            {"sensor_id": "S-MAIZE", "ph": 6.5, "moisture": 32, "temperature": 24,
+             "nitrogen": 150, "phosphorus": 40, "potassium": 180}
+            for _ in range(5)
+        ])
+
+        run = generate_insights(top_k=2)
+
+        insight = AIInsight.objects.get(field=sensor.field)
+        recommendations = CropRecommendation.objects.filter(field=sensor.field)
+        self.assertEqual(run.recommendations_created, recommendations.count())
+        self.assertFalse(recommendations.filter(crop_name="Hand-entered").exists())
+        self.assertTrue(all(rec.ai_insight_id == insight.pk for rec in recommendations))
+
+        season_a = recommendations.filter(season="Season A").order_by("-suitability_score")
+        self.assertEqual(season_a.count(), 2)
+        self.assertEqual(season_a[0].crop_name, "Maize")
+        self.assertEqual(season_a[0].suitability_score, 100)
+        self.assertEqual(
+            list(season_a.values_list("is_top_choice", flat=True)), [True, False]
+        )
+
+    def test_score_matrix_ignores_missing_measurements(self):
+        import numpy as np
+
+        from .matching import build_crop_index, score_matrix
+
+        profile = CropProfile(
+            name="Test", ph_min=6, ph_max=7, moisture_min=20, moisture_max=30,
+            temperature_min=15, temperature_max=25, nitrogen_min=100, nitrogen_max=150,
+            phosphorus_min=20, phosphorus_max=40, potassium_min=150, potassium_max=200,
+        )
+        vectors = np.array([
+            [6.5, 25, np.nan, np.nan, np.nan, np.nan],
+            [7.5, 25, 20, 125, 30, 175],
+            [np.nan] * 6,
+        ])
+        scores = score_matrix(vectors, build_crop_index([profile]))[:, 0]
+        self.assertEqual(scores[0], 100)
+        self.assertAlmostEqual(scores[1], 87.5)
+        self.assertTrue(np.isnan(scores[2]))
+
+
+class IncrementalInsightTests(TestCase):
+    def test_only_fields_with_new_readings_are_recomputed(self):
+        from .analysis import generate_insights
+
+        make_sensor("S-1")
+        quiet = make_sensor("S-2", field=make_field("Quiet"))
+        ingest_batch([
+            {"sensor_id": sensor_id, "ph": 6.5, "moisture": 30}
+            for sensor_id in ("S-1", "S-2")
+        ])
+
+        first = generate_insights(recommend=False)
+        self.assertEqual((first.fields_recomputed, first.fields_skipped), (2, 0))
+
+        second = generate_insights(recommend=False)
+        self.assertEqual((second.fields_recomputed, second.fields_skipped), (0, 2))
+        self.assertEqual(second.insights_created, 0)
+
+        ingest_batch([{"sensor_id": "S-1", "ph": 6.0, "moisture": 28}])
+        third = generate_insights(recommend=False)
+        self.assertEqual((third.fields_recomputed, third.fields_skipped), (1, 1))
+        self.assertEqual(AIInsight.objects.filter(field=quiet.field).count(), 1)
+
+        full = generate_insights(recommend=False, incremental=False)
+        self.assertEqual((full.fields_recomputed, full.fields_skipped), (2, 0))
+
+
+def _kill_first_worker(cooperative_id, field_ids, options):
+    # Module level so pool workers can unpickle it; the marker file tells
+    # a fresh worker whether one already died.
+    if not os.path.exists(options["marker"]):
+        open(options["marker"], "w").close()
+        os._exit(1)
+    from .parallel import ShardResult
+    return ShardResult(cooperative_id, len(field_ids), len(field_ids), 0, 0, 0.0)
+
+
+class ParallelAnalysisTests(TestCase):
+    def test_shards_by_cooperative_and_retries_failures(self):
+
+        from . import parallel
+
+        other = Cooperative.objects.create(name="Other coop")
+        make_sensor("S-A")
+        make_sensor("S-B", field=make_field("Other field", coop=other))
+        ingest_batch([{"sensor_id": sensor_id, "ph": 6.5} for sensor_id in ("S-A", "S-B")])
+
+        shards, skipped = parallel.plan_shards()
+        self.assertEqual(len(shards), 2)
+        self.assertEqual(skipped, 0)
+
+        real = parallel.analyse_shard
+        calls = []
+
+        def flaky(coop_id, field_ids, options):
+            calls.append(coop_id)
+            if coop_id == other.pk and calls.count(coop_id) == 1:
+                raise RuntimeError("worker died")
+            return real(coop_id, field_ids, options)
+
+        events = []
+        with mock.patch.object(parallel, "analyse_shard", flaky):
+            run = parallel.run_parallel(
+                workers=2, recommend=False, progress=lambda event, *args: events.append(event)
+            )
+
+        self.assertEqual(run.retries, 1)
+        self.assertEqual(run.failed, {})
+        self.assertEqual(run.insights_created, 2)
+        self.assertEqual(sorted(events), ["done", "done", "retry"])
+
+        with mock.patch.object(parallel, "analyse_shard", side_effect=RuntimeError("down")):
+            run = parallel.run_parallel(incremental=False, retries=1, recommend=False)
+        self.assertEqual(set(run.failed), {coop_id for coop_id, _ in shards})
+        self.assertEqual(run.retries, 2)
+        self.assertEqual(run.fields_recomputed, 0)
+
+    def test_dead_worker_restarts_the_pool(self):
+        from . import parallel
+
+        other = Cooperative.objects.create(name="Other coop")
+        make_field("North block")
+        make_field("Other field", coop=other)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        marker = os.path.join(directory.name, "died")
+        # Real worker processes; the shards don't touch the database.
+        with mock.patch.object(parallel, "_in_memory_database", return_value=False), \
+                mock.patch.object(parallel, "analyse_shard", _kill_first_worker):
+            run = parallel.run_parallel(workers=2, incremental=False, retries=1, marker=marker)
+
+        self.assertEqual(run.pool_restarts, 1)
+        self.assertEqual(run.failed, {})
+        self.assertEqual(run.insights_created, 2)
+
+
+class SensorHealthTests(TestCase):
+    def test_classifies_sensors_in_constant_queries(self):
+        from .health import evaluate_sensor_health
+
+        now = timezone.now()
+        online = make_sensor("S-ONLINE")
+        ingest_batch([
+            {"sensor_id": "S-ONLINE", "recorded_at": (now - timedelta(hours=h)).isoformat(), "ph": 6.5}
+            for h in range(8)
+        ])
+        Sensor.objects.filter(pk=online.pk).update(last_seen=now - timedelta(minutes=5))
+        make_sensor("S-RARE")
+        Sensor.objects.filter(sensor_id="S-RARE").update(last_seen=now - timedelta(minutes=5))
+        make_sensor("S-LATE")
+        Sensor.objects.filter(sensor_id="S-LATE").update(last_seen=now - timedelta(hours=5))
+        make_sensor("S-SILENT")
+        make_sensor("S-BATTERY")
+        Sensor.objects.filter(sensor_id="S-BATTERY").update(last_seen=now, battery_level=8)
+        retired = make_sensor("S-RETIRED")
+
+        evaluate_sensor_health(now=now)
+        Sensor.objects.filter(pk=retired.pk).update(is_active=False)
+        # Upsert, cleanup and counts, plus the savepoint pair of the test
+        # transaction.
+        with self.assertNumQueries(5):
+            run = evaluate_sensor_health(now=now)
+
+        statuses = dict(SensorHealth.objects.values_list("sensor__sensor_id", "status"))
+        self.assertEqual(statuses, {
+            "S-ONLINE": "online",
+            "S-RARE": "stale",
+            "S-LATE": "stale",
+            "S-SILENT": "offline",
+            "S-BATTERY": "low_battery",
+        })
+        self.assertEqual(run.counts, {"online": 1, "stale": 2, "offline": 1, "low_battery": 1})
+        self.assertEqual(SensorHealth.objects.get(sensor=online).recent_readings, 8)
+
+    def test_pages_render_health(self):
+        from .health import evaluate_sensor_health
+
+        make_sensor("S-1")
+        make_sensor("S-2")
+        evaluate_sensor_health()
+
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("sensor"))
+        self.assertContains(response, '<span class="badge-low">Offline</span>', count=2)
+
+        make_sensor("S-3")
+        with mock.patch("tracker.views.SENSOR_PAGE_SIZE", 2), self.assertNumQueries(3):
+            response = self.client.get(reverse("sensor"), {"page": 2})
+        self.assertEqual([s.sensor_id for s in response.context["sensors"]], ["S-3"])
+        self.assertContains(response, "Page 2 of 2")
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("admin_sensors"))
+        self.assertContains(response, "S-1")
+        self.assertContains(response, "S-2")
+
+
+class AlertTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_alert_engine()
+        self.sensor = make_sensor("S-001")
+        self.other = make_sensor("S-002", field=make_field("South block"))
+        self.start = timezone.now() - timedelta(hours=1)
+
+    def tearDown(self):
+        reset_alert_engine()
+
+    def ingest(self, sensor_id, values, measurement="moisture"):
+        # Streaks advance when the batch commits.
+        with self.captureOnCommitCallbacks(execute=True):
+            return ingest_batch([
+                {
+                    "sensor_id": sensor_id,
+                    "recorded_at": (self.start + timedelta(minutes=i)).isoformat(),
+                    measurement: value,
+                }
+                for i, value in enumerate(values)
+            ])
+
+    def test_consecutive_rule_fires_once_per_streak(self):
+        AlertRule.objects.create(
+            name="Dry soil", measurement="moisture", operator="below", threshold=20,
+            consecutive_readings=3, field=self.sensor.field,
+        )
+
+        result = self.ingest("S-001", [15, 14, 25, 12, 11])
+        self.assertEqual(result.alerts, 0)
+        # The streak carries over into the next batch without re-reading history.
+        self.start += timedelta(minutes=10)
+        result = self.ingest("S-001", [10, 9, 8])
+        self.assertEqual(result.alerts, 1)
+        # Out of scope: another field.
+        self.assertEqual(self.ingest("S-002", [5, 5, 5]).alerts, 0)
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.sensor, self.sensor)
+        self.assertEqual(notification.field, self.sensor.field)
+        self.assertEqual(notification.value, 10)
+        self.assertIn("moisture < 20 for 3 consecutive readings", notification.message)
+
+    def test_streaks_of_a_rolled_back_batch_are_discarded(self):
+        from django.db import transaction
+
+        AlertRule.objects.create(
+            name="Dry soil", measurement="moisture", operator="below", threshold=20,
+            consecutive_readings=3, field=self.sensor.field,
+        )
+        with self.assertRaises(OperationalError), transaction.atomic():
+            ingest_batch([{"sensor_id": "S-001", "moisture": value} for value in (15, 14)])
+            raise OperationalError("database is locked")
+        # Retried: two breaches, not four.
+        self.assertEqual(self.ingest("S-001", [15, 14]).alerts, 0)
+        self.start += timedelta(minutes=10)
+        self.assertEqual(self.ingest("S-001", [13]).alerts, 1)
+
+    def test_flagged_readings_do_not_feed_streaks(self):
+        AlertRule.objects.create(
+            name="Waterlogged", measurement="moisture", operator="above", threshold=90,
+            consecutive_readings=2, field=self.sensor.field,
+        )
+        # 150% is beyond the physical limit: flagged, and neither a breach nor a reset.
+        result = self.ingest("S-001", [95, 150, 20])
+        self.assertEqual((result.anomalies, result.alerts), (1, 0))
+        self.start += timedelta(minutes=10)
+        self.assertEqual(self.ingest("S-001", [95, 150, 96]).alerts, 1)
+
+        with override_settings(SOILTRACK_EXCLUDE_ANOMALIES=False):
+            self.start += timedelta(minutes=10)
+            self.assertEqual(self.ingest("S-002", [150, 150]).alerts, 0)  # another field
+            self.assertEqual(self.ingest("S-001", [20, 150, 150]).alerts, 1)
+
+    def test_outside_rule_needs_upper_threshold(self):
+        from django.core.exceptions import ValidationError
+        from django.db import IntegrityError, transaction
+
+        from .alerts import AlertEngine
+
+        rule = AlertRule(name="pH", measurement="ph", operator="outside", threshold=5.5)
+        with self.assertRaises(ValidationError):
+            rule.full_clean()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            rule.save()
+
+        # A rule that got past both is skipped rather than failing ingest.
+        valid = AlertRule(pk=2, name="Wet", measurement="moisture", operator="above", threshold=40)
+        with self.assertLogs("tracker.alerts", "WARNING"):
+            engine = AlertEngine([
+                AlertRule(pk=1, name="pH", measurement="ph", operator="outside", threshold=5.5),
+                valid,
+            ])
+        self.assertEqual([r.rule_id for rules in engine.by_scope.values() for r in rules], [2])
+        self.assertEqual(rule.describe(), "ph outside 5.5–?")
+
+    def test_range_rule_and_rule_changes(self):
+        rule = AlertRule.objects.create(
+            name="pH out of range", measurement="ph", operator="outside",
+            threshold=5.5, upper_threshold=7.5, severity="critical",
+        )
+        result = self.ingest("S-001", [6.0, 4.9, 8.2, 6.5, 8.0], measurement="ph")
+        self.assertEqual(result.alerts, 2)
+
+        rule.is_active = False
+        rule.save()
+        self.assertEqual(self.ingest("S-002", [3.0], measurement="ph").alerts, 0)
+
+        response = self.client.get(reverse("admin_notifications"))
+        self.assertContains(response, "pH out of range", count=2 + 2)  # pinned cards + rows
+        self.assertEqual(response.context["unresolved_count"], 2)
+
+
+class AnomalyTests(TestCase):
+    def setUp(self):
+        self.sensor = make_sensor("S-001")
+        self.start = timezone.now() - timedelta(hours=2)
+
+    def ingest(self, values):
+        return ingest_batch([
+            {
+                "sensor_id": "S-001",
+                "recorded_at": (self.start + timedelta(minutes=i)).isoformat(),
+                "ph": ph,
+                "moisture": moisture,
+            }
+            for i, (ph, moisture) in enumerate(values)
+        ])
+
+    def test_spikes_flagged_and_left_out_of_aggregates(self):
+        steady = [(6.4 + 0.05 * (i % 3), 30 + i % 4) for i in range(20)]
+        self.assertEqual(self.ingest(steady).anomalies, 0)
+
+        # The baseline persists, so a later batch is judged against it.
+        self.start += timedelta(minutes=30)
+        result = self.ingest([(0.0, 31), (6.5, 150), (6.4, 30)])
+        self.assertEqual(result.anomalies, 2)
+
+        ph_zero, moisture_spike, normal = SensorReading.objects.order_by("recorded_at")[20:]
+        self.assertTrue(ph_zero.is_flagged("ph"))
+        self.assertFalse(ph_zero.is_flagged("moisture"))
+        self.assertTrue(moisture_spike.is_flagged("moisture"))
+        self.assertEqual(normal.anomaly_flags, 0)
+        self.assertEqual(SensorReading.objects.filter(anomaly_flags=0).count(), 21)
+
+        rollup = SensorRollup.objects.get(sensor=self.sensor)
+        self.assertEqual(rollup.reading_count, 23)
+        self.assertEqual(rollup.ph_count, 22)
+        self.assertGreater(rollup.mean("ph"), 6.3)
+        self.assertLess(rollup.mean("moisture"), 33)
+
+        rebuild_rollups()
+        rebuilt = SensorRollup.objects.get(sensor=self.sensor)
+        self.assertEqual((rebuilt.ph_count, rebuilt.moisture_count), (22, 22))
+        self.assertAlmostEqual(rebuilt.mean("ph"), rollup.mean("ph"))
+
+    def test_level_shift_becomes_new_baseline(self):
+        from .anomalies import RESET_AFTER
+
+        readings = [(6.5, 30)] * 15 + [(6.5, 60)] * (RESET_AFTER + 3)
+        result = self.ingest(readings)
+        self.assertEqual(result.anomalies, RESET_AFTER - 1)
@@ -1,10 +1,39 @@
-from django.shortcuts import render
-from django.db.models import Count, Max, Avg
+import json
+import math
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.paginator import Paginator
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render
+from django.db.models import Case, F, Prefetch, When
+from django.db.models.functions import Coalesce, NullIf
+from django.views.decorators.csrf import csrf_exempt
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_POST
+
+from . import packed, perf
+from .analytics import AnalyticsError, get_metric, make_window
+from .archive import iter_readings
+from .exports import FORMATS, ExportUnavailable, stream_export
+from .health import health_counts
+from .buffer import get_ingest_buffer
+from .current import field_conditions, sensor_conditions
+from .ingest import IngestResult, ingest_records, parse_records, write_readings
+from .pagination import InvalidCursor, keyset_paginate
+from .refdata import get_cooperatives, get_fields, get_sensors
+from .stats import get_dashboard_stats
 from .models import (
     Cooperative,
     Farmer,
     FieldPlot,
+    Notification,
     Sensor,
+    SensorCurrentReading,
+    SensorHealth,
     SensorReading,
     AIInsight,
     CropRecommendation,
@@ -18,33 +47,23 @@ def home(request):
     """
     Main dashboard page.
     Shows high-level statistics about the system + latest field reading.
+    Counters come from the cached snapshot in tracker.stats; the latest
+    reading from the per-sensor current readings (tracker.current).
     """
 
-    total_coops = Cooperative.objects.count()
-    total_farmers = Farmer.objects.count()
-    total_fields = FieldPlot.objects.count()
-    total_sensors = Sensor.objects.count()
-    total_readings = SensorReading.objects.count()
-    total_insights = AIInsight.objects.count()
-    total_recommendations = CropRecommendation.objects.count()
+    stats = get_dashboard_stats()
 
-    fields = FieldPlot.objects.all().order_by("name")
+    fields = get_fields()
 
     latest_reading = (
-        SensorReading.objects
+        SensorCurrentReading.objects
         .select_related("sensor", "sensor__field", "sensor__field__cooperative")
         .order_by("-recorded_at")
         .first()
     )
 
     context = {
-        "total_coops": total_coops,
-        "total_farmers": total_farmers,
-        "total_fields": total_fields,
-        "total_sensors": total_sensors,
-        "total_readings": total_readings,
-        "total_insights": total_insights,
-        "total_recommendations": total_recommendations,
+        **stats,
         "fields": fields,
         "latest_reading": latest_reading,
     }
@@ -90,8 +109,8 @@ def ai_insights(request):
     context = {
         "insights": insights_qs,
         "recommendations": recommendations_qs,
-        "cooperatives": Cooperative.objects.all().order_by("name"),
-        "fields": FieldPlot.objects.all().order_by("name"),
+        "cooperatives": get_cooperatives(),
+        "fields": get_fields(),
         "selected_coop_id": coop_id,
         "selected_field_id": field_id,
     }
@@ -101,37 +120,112 @@ def ai_insights(request):
 # =========================
 # SENSORS PAGE
 # =========================
+SENSOR_PAGE_SIZE = 50
+
+
+def _rollup_mean(name):
+    return F(f"rollup__{name}_sum") / NullIf(F(f"rollup__{name}_count"), 0)
+
+
 def sensor_page(request):
     """
-    Sensors page – summary per sensor using readings reverse relation.
+    Sensors page – summary per sensor, read from the maintained SensorRollup
+    rows (see tracker.rollups) instead of aggregating every reading.
+    The table is paginated (?page=<n>): three queries per page, the
+    health counts, the sensor count and the page itself.
     """
 
     sensors = (
         Sensor.objects
         .select_related("field", "field__cooperative")
         .annotate(
-            reading_count=Count("readings"),                  # how many readings
-            last_seen_at=Max("readings__recorded_at"),        # last reading time
-            avg_ph=Avg("readings__ph"),                       # average pH
-            avg_moisture=Avg("readings__moisture"),           # average moisture
-            avg_temperature=Avg("readings__temperature"),     # average temperature
+            reading_count=Coalesce(F("rollup__reading_count"), 0),  # how many readings
+            last_seen_at=F("rollup__last_reading_at"),               # last reading time
+            avg_ph=_rollup_mean("ph"),                               # average pH
+            avg_moisture=_rollup_mean("moisture"),                   # average moisture
+            avg_temperature=_rollup_mean("temperature"),             # average temperature
+            health_status=F("health__status"),                       # from evaluate_sensor_health
         )
-        .order_by("-last_seen_at")
+        .order_by(F("last_seen_at").desc(nulls_last=True), "sensor_id")
     )
+    page = Paginator(sensors, SENSOR_PAGE_SIZE).get_page(request.GET.get("page"))
 
     context = {
-        "sensors": sensors,
+        "sensors": page.object_list,
+        "page": page,
+        "health_counts": health_counts(),
     }
     return render(request, "tracker/sensors.html", context)
 
 
+# =========================
+# ADMIN PORTAL – SENSOR NETWORK
+# =========================
+ATTENTION_LIST_SIZE = 100
+
+
+def admin_sensor_network(request):
+    """
+    Health overview for the admin portal: counts per status plus the
+    sensors that need attention, worst first. Two queries however many
+    sensors there are.
+    """
+    attention = (
+        SensorHealth.objects
+        .exclude(status="online")
+        .select_related("sensor", "sensor__field")
+        .order_by(
+            Case(
+                When(status="offline", then=0),
+                When(status="low_battery", then=1),
+                default=2,
+            ),
+            F("last_seen").asc(nulls_first=True),
+        )[:ATTENTION_LIST_SIZE]
+    )
+
+    context = {
+        "health_counts": health_counts(),
+        "attention": attention,
+    }
+    return render(request, "tracker/admin_sensor_network.html", context)
+
+
+# =========================
+# ADMIN PORTAL – NOTIFICATIONS
+# =========================
+NOTIFICATION_LIST_SIZE = 50
+
+
+def admin_notifications(request):
+    """
+    Latest alerts, with the unresolved critical ones pinned on top.
+    """
+    recent = Notification.objects.select_related("rule", "sensor", "field")
+    notifications = list(recent[:NOTIFICATION_LIST_SIZE])
+
+    context = {
+        "notifications": notifications,
+        "pinned": [
+            n for n in notifications if n.severity == "critical" and not n.is_resolved
+        ][:3],
+        "unresolved_count": Notification.objects.filter(is_resolved=False).count(),
+    }
+    return render(request, "tracker/admin_notifications.html", context)
+
+
 # =========================
 # HISTORY PAGE
 # =========================
+HISTORY_PAGE_SIZE = 50
+EXPORT_MAX_LIMIT = 1000
+
+
 def history(request):
     """
     Historical data page.
-    Shows recent sensor readings, with optional filters.
+    Shows sensor readings newest first, with optional filters and keyset
+    pagination: ?coop=<id>&field=<id>&sensor=<id>&cursor=<token>
     """
 
     coop_id = request.GET.get("coop")
@@ -140,26 +234,26 @@ def history(request):
 
     readings_qs = (
         SensorReading.objects
+        .for_scope(coop_id, field_id, sensor_id)
         .select_related("sensor", "sensor__field", "sensor__field__cooperative")
-        .order_by("-recorded_at")
     )
 
-    if coop_id:
-        readings_qs = readings_qs.filter(sensor__field__cooperative_id=coop_id)
+    try:
+        page = keyset_paginate(readings_qs, request.GET.get("cursor"), HISTORY_PAGE_SIZE)
+    except InvalidCursor:
+        page = keyset_paginate(readings_qs, None, HISTORY_PAGE_SIZE)
 
-    if field_id:
-        readings_qs = readings_qs.filter(sensor__field_id=field_id)
-
-    if sensor_id:
-        readings_qs = readings_qs.filter(sensor_id=sensor_id)
-
-    readings_qs = readings_qs[:200]
+    # Cursor links keep the current filters.
+    params = request.GET.copy()
+    params.pop("cursor", None)
 
     context = {
-        "readings": readings_qs,
-        "cooperatives": Cooperative.objects.all().order_by("name"),
-        "fields": FieldPlot.objects.all().order_by("name"),
-        "sensors": Sensor.objects.all().order_by("sensor_id"),
+        "readings": page.items,
+        "page": page,
+        "filter_query": params.urlencode(),
+        "cooperatives": get_cooperatives(),
+        "fields": get_fields(),
+        "sensors": get_sensors(),
         "selected_coop_id": coop_id,
         "selected_field_id": field_id,
         "selected_sensor_id": sensor_id,
@@ -200,8 +294,8 @@ def crops(request):
     context = {
         "recommendations": recs_qs,
         "top_choices": top_choices,
-        "cooperatives": Cooperative.objects.all().order_by("name"),
-        "fields": FieldPlot.objects.all().order_by("name"),
+        "cooperatives": get_cooperatives(),
+        "fields": get_fields(),
         "selected_coop_id": coop_id,
         "selected_field_id": field_id,
         "selected_season": season,
@@ -212,33 +306,405 @@ def crops(request):
 # =========================
 # COOPERATIVES PAGE
 # =========================
+COOPERATIVE_PAGE_SIZE = 50
+
+
+def _counted_page(request, queryset, param, count):
+    paginator = Paginator(queryset, COOPERATIVE_PAGE_SIZE)
+    # Counted already by Cooperative.with_counts: spare the paginator its COUNT.
+    paginator.count = count
+    return paginator.get_page(request.GET.get(param))
+
+
+def _render_cooperative(request, coop_qs, current_coop):
+    """
+    One page of members (?members=<n>) and one of fields (?fields=<n>),
+    with each field's sensors and each sensor's latest reading, in a fixed
+    number of queries however big the cooperative is.
+    """
+
+    farmers_page = fields_page = None
+    farmers = []
+    fields = []
+    if current_coop:
+        farmers_page = _counted_page(
+            request,
+            Farmer.objects.filter(cooperative=current_coop).order_by("full_name", "id"),
+            "members",
+            current_coop.member_count,
+        )
+        farmers = list(farmers_page.object_list)
+        fields_page = _counted_page(
+            request,
+            FieldPlot.objects
+            .filter(cooperative=current_coop)
+            .select_related("farmer")
+            .prefetch_related(Prefetch("sensors", queryset=Sensor.objects.order_by("sensor_id")))
+            .order_by("name", "id"),
+            "fields",
+            current_coop.field_count,
+        )
+        # The prefetch runs for the fields of this page only.
+        fields = list(fields_page.object_list)
+
+        # The page's sensors' latest readings in one query on the current
+        # readings kept up to date by ingest.
+        sensors = [sensor for field in fields for sensor in field.sensors.all()]
+        latest = {
+            current.sensor_id: current
+            for current in SensorCurrentReading.objects.filter(sensor__in=[sensor.pk for sensor in sensors])
+        }
+        for sensor in sensors:
+            sensor.latest_reading = latest.get(sensor.pk)
+
+    context = {
+        "cooperatives": coop_qs,
+        "cooperative": current_coop,
+        "farmers": farmers,
+        "farmers_page": farmers_page,
+        "fields": fields,
+        "fields_page": fields_page,
+    }
+    return render(request, "tracker/cooperatives.html", context)
+
+
 def cooperatives(request):
     """
     Cooperative overview page.
     Uses the special cooperative template (its own navbar, not base.html).
+    Shows the first cooperative; /cooperatives/<id>/ selects another.
     """
 
     coop_qs = (
         Cooperative.objects
-        .annotate(
-            farmer_count=Count("farmer"),
-            field_count=Count("fieldplot"),
-        )
+        .with_counts()          # member / field counts as subqueries, one query
         .order_by("name")
     )
+    return _render_cooperative(request, coop_qs, coop_qs.first())
 
-    current_coop = coop_qs.first()
 
-    members = Farmer.objects.none()
-    fields = FieldPlot.objects.none()
-    if current_coop:
-        members = Farmer.objects.filter(cooperative=current_coop).order_by("full_name")
-        fields = FieldPlot.objects.filter(cooperative=current_coop).order_by("name")
+def cooperative_detail(request, coop_id):
+    """
+    One cooperative's members, fields and sensor conditions.
+    """
 
-    context = {
-        "cooperatives": coop_qs,
-        "current_coop": current_coop,
-        "members": members,
-        "fields": fields,
+    coop_qs = Cooperative.objects.with_counts().order_by("name")
+    current_coop = get_object_or_404(coop_qs, pk=coop_id)
+    return _render_cooperative(request, coop_qs, current_coop)
+
+
+# =========================
+# INGESTION API
+# =========================
+def _ingest_payload(request):
+    """
+    Check the ingest token and decode the body (JSON, or the packed
+    binary format from tracker.packed) into a list of records. Returns
+    (records, None) or (None, error response).
+    """
+    token = getattr(settings, "SOILTRACK_INGEST_TOKEN", "")
+    if token and request.headers.get("X-Ingest-Token") != token:
+        return None, JsonResponse({"error": "invalid ingest token"}, status=403)
+
+    if request.content_type == packed.CONTENT_TYPE:
+        try:
+            return packed.decode(request.body), None
+        except packed.PackedError as exc:
+            return None, JsonResponse({"error": str(exc)}, status=400)
+
+    try:
+        payload = json.loads(request.body)
+    except (ValueError, UnicodeDecodeError):
+        return None, JsonResponse({"error": "body must be valid JSON"}, status=400)
+
+    if isinstance(payload, dict):
+        payload = payload.get("readings")
+    if not isinstance(payload, list):
+        return None, JsonResponse({"error": "expected a list of readings"}, status=400)
+    return payload, None
+
+
+@csrf_exempt
+@require_POST
+def ingest_readings(request):
+    """
+    Bulk reading ingestion for gateways.
+    Body: a JSON list of readings, or {"readings": [...]}, each with a
+    sensor_id, optional recorded_at / battery_level and measurement fields;
+    or a packed binary payload (Content-Type application/vnd.soiltrack.packed).
+    """
+
+    payload, error = _ingest_payload(request)
+    if error:
+        return error
+
+    total, batches = ingest_records(payload)
+
+    data = total.as_dict()
+    data["batches"] = [
+        {key: value for key, value in batch.as_dict().items() if key != "errors"}
+        for batch in batches
+    ]
+    return JsonResponse(data)
+
+
+@csrf_exempt
+@require_POST
+async def ingest_readings_buffered(request):
+    """
+    Async ingestion for gateways, served over ASGI. Same body as
+    ingest_readings; readings are validated and queued in the write buffer
+    (tracker.buffer) and written in batches a moment later.
+    Answers 202 with the validation counts, or 429 with Retry-After when
+    the buffer is full (nothing from the request is queued then).
+    Served over WSGI it writes synchronously and answers like
+    ingest_readings.
+    """
+
+    records, error = _ingest_payload(request)
+    if error:
+        return error
+
+    buffer = get_ingest_buffer()
+    if len(records) > buffer.capacity:
+        return JsonResponse(
+            {"error": f"at most {buffer.capacity} readings per request"}, status=413
+        )
+
+    result = IngestResult(received=len(records))
+    parsed = parse_records(records, result)
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI each request gets a throwaway event loop, so there is
+        # nowhere for the writer to live; write straight away instead.
+        started = time.perf_counter()
+        await sync_to_async(write_readings)(parsed, result)
+        result.elapsed = time.perf_counter() - started
+        return JsonResponse(result.as_dict())
+
+    if not buffer.offer(parsed):
+        response = JsonResponse({"error": "ingest buffer full, retry later"}, status=429)
+        response["Retry-After"] = str(max(math.ceil(buffer.max_delay), 1))
+        return response
+
+    return JsonResponse({
+        "received": result.received,
+        "queued": len(parsed),
+        "rejected": result.rejected,
+        "errors": result.errors,
+        "buffered": len(buffer),
+    }, status=202)
+
+
+# =========================
+# READINGS EXPORT API
+# =========================
+def _scope_params(request):
+    """
+    The history filters for the JSON / file APIs, validated as ids.
+    """
+    filters = {}
+    for name in ("coop", "field", "sensor"):
+        value = request.GET.get(name)
+        if value and not value.isdigit():
+            raise ValueError(f"{name} must be an id")
+        filters[name] = value
+    return filters
+
+
+def export_readings(request):
+    """
+    Readings as JSON, newest first, one keyset page at a time.
+    Same filters as the history page, plus ?cursor=<token>&limit=<n>.
+    """
+
+    try:
+        filters = _scope_params(request)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+
+    try:
+        limit = min(int(request.GET.get("limit", HISTORY_PAGE_SIZE)), EXPORT_MAX_LIMIT)
+    except ValueError:
+        return JsonResponse({"error": "limit must be a number"}, status=400)
+    if limit < 1:
+        return JsonResponse({"error": "limit must be positive"}, status=400)
+
+    readings_qs = (
+        SensorReading.objects
+        .for_scope(filters["coop"], filters["field"], filters["sensor"])
+        .select_related("sensor")
+    )
+
+    try:
+        page = keyset_paginate(readings_qs, request.GET.get("cursor"), limit)
+    except InvalidCursor as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+
+    results = [
+        {
+            "id": reading.pk,
+            "sensor_id": reading.sensor.sensor_id,
+            "field_id": reading.field_id,
+            "cooperative_id": reading.cooperative_id,
+            "recorded_at": reading.recorded_at.isoformat(),
+            **{name: getattr(reading, name) for name in SensorReading.MEASUREMENTS},
+        }
+        for reading in page.items
+    ]
+    return JsonResponse({
+        "results": results,
+        "next_cursor": page.next_cursor,
+        "previous_cursor": page.previous_cursor,
+    })
+
+
+async def _pull_in_sync_thread(chunks):
+    """
+    An async iterator over a sync generator, each chunk produced in the
+    sync thread the view's queries run in. Handed a sync generator, an
+    ASGI StreamingHttpResponse collects it into a list before sending.
+    """
+    pull = sync_to_async(next)
+    try:
+        while True:
+            chunk = await pull(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()
+
+
+def download_readings(request):
+    """
+    Streamed file export of readings, oldest first.
+    ?format=csv|parquet plus the history filters and optional
+    ?start=<iso datetime>&end=<iso datetime>.
+    """
+
+    export_format = request.GET.get("format", "csv")
+    if export_format not in FORMATS:
+        return JsonResponse({"error": f"format must be one of {', '.join(FORMATS)}"}, status=400)
+
+    try:
+        filters = _scope_params(request)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+
+    bounds = {}
+    for name in ("start", "end"):
+        value = request.GET.get(name)
+        if value:
+            try:
+                moment = parse_datetime(value)
+            except ValueError:  # well-formed but not a date, e.g. February 30th
+                moment = None
+            if moment is None:
+                return JsonResponse({"error": f"{name} must be an ISO datetime"}, status=400)
+            bounds[name] = moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+
+    # Archived months included.
+    readings = iter_readings(filters["coop"], filters["field"], filters["sensor"], **bounds)
+    try:
+        chunks = stream_export(readings, export_format)
+    except ExportUnavailable as exc:
+        return JsonResponse({"error": str(exc)}, status=501)
+
+    if isinstance(request, ASGIRequest):
+        chunks = _pull_in_sync_thread(chunks)
+    content_type, extension = FORMATS[export_format]
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="readings.{extension}"'
+    return response
+
+
+def _id_list(request, name):
+    """
+    Ids from a repeatable and/or comma-separated query parameter.
+    """
+    ids = [value for raw in request.GET.getlist(name) for value in raw.split(",") if value]
+    if not all(value.isdigit() for value in ids):
+        raise ValueError(f"{name} must be a list of ids")
+    return [int(value) for value in ids]
+
+
+def current_conditions(request):
+    """
+    Current conditions (the newest reading) of fields as JSON, one query
+    however many fields: ?field=<id>[,<id>...] and/or ?coop=<id>, every
+    field when neither is given; ?sensor=<id>[,...] adds those sensors.
+    """
+
+    try:
+        field_ids = _id_list(request, "field")
+        sensor_ids = _id_list(request, "sensor")
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    coop_id = request.GET.get("coop")
+    if coop_id and not coop_id.isdigit():
+        return JsonResponse({"error": "coop must be an id"}, status=400)
+
+    data = {
+        "fields": field_conditions(field_ids or None, coop_id or None),
     }
-    return render(request, "tracker/cooperatives.html", context)
\ No newline at end of file
+    if sensor_ids:
+        data["sensors"] = sensor_conditions(sensor_ids)
+    return JsonResponse(data)
+
+
+# =========================
+# ANALYTICS API
+# =========================
+def analytics(request, metric):
+    """
+    One admin analytics metric (tracker.analytics) as JSON, cached:
+    trends, uptime or scores, over ?days=<n> ending now, in ?bucket=day|week
+    buckets, for one ?coop=<id> or every cooperative.
+    """
+
+    try:
+        window = make_window(request.GET.get("coop"), request.GET.get("days"), request.GET.get("bucket"))
+        data = get_metric(metric, window)
+    except AnalyticsError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    return JsonResponse(data)
+
+
+# =========================
+# METRICS
+# =========================
+def metrics(request):
+    """
+    Per-view request histograms and flagged query patterns (tracker.perf)
+    in the Prometheus text format, or as JSON with ?format=json. The
+    stored numbers plus this process's unflushed ones; storing them is
+    left to the recorder's flusher thread, so a scrape writes nothing.
+    """
+
+    token = getattr(settings, "SOILTRACK_METRICS_TOKEN", "")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return JsonResponse({"error": "invalid metrics token"}, status=403)
+
+    timings, pending_patterns = perf.get_recorder().pending()
+    histograms = perf.load_histograms(pending=timings)
+    patterns = perf.flagged_patterns(pending=pending_patterns)
+
+    if request.GET.get("format") == "json":
+        return JsonResponse({
+            "views": perf.summarise(histograms),
+            "patterns": [
+                {
+                    "view": pattern.view_name,
+                    "kind": pattern.kind,
+                    "sql": pattern.sql,
+                    "requests": pattern.requests,
+                    "max_repeats": pattern.max_repeats,
+                    "last_seen": pattern.last_seen.isoformat(),
+                }
+                for pattern in patterns
+            ],
+        })
+    return HttpResponse(
+        perf.render_prometheus(histograms, patterns),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )